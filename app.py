@@ -9,7 +9,8 @@ import extra_streamlit_components as stx
 
 from htmlTemplates import css
 
-from src import config, editor_config, data_utils, control_widgets as cw, co_occurrences as coo
+from src import config, editor_config, data_utils, control_widgets as cw, co_occurrences as coo, navigator, \
+    neighborhood_statistics, highlighter, corrections_overlay, jobs
 
 
 def next_hood():
@@ -17,8 +18,8 @@ def next_hood():
     Increments the index (hoods_count) of the currently displayed neighborhood.
     Wraps around to the first neighborhood if the end is reached.
     """
-    st.session_state.hoods_count = (st.session_state.hoods_count + 1) % len(
-        st.session_state.hoods_docs[st.session_state.filtered_keys[st.session_state.docs_count]]['neighborhoods'])
+    st.session_state.hoods_count = (st.session_state.hoods_count + 1) % st.session_state.navigator.neighborhoods_count(
+        st.session_state.docs_count)
 
 
 def previous_hood():
@@ -26,8 +27,8 @@ def previous_hood():
     Decrements the index (hoods_count) of the currently displayed neighborhood.
     Wraps around to the last neighborhood if the beginning is reached.
     """
-    st.session_state.hoods_count = (st.session_state.hoods_count - 1) % len(
-        st.session_state.hoods_docs[st.session_state.filtered_keys[st.session_state.docs_count]]['neighborhoods'])
+    st.session_state.hoods_count = (st.session_state.hoods_count - 1) % st.session_state.navigator.neighborhoods_count(
+        st.session_state.docs_count)
 
 
 def next_doc():
@@ -39,7 +40,7 @@ def next_doc():
     # Enable widgets related to neighborhoods' navigation and editing
     cw.enable_neighborhoods_widgets()
 
-    st.session_state.docs_count = (st.session_state.docs_count + 1) % len(st.session_state.filtered_docs)
+    st.session_state.docs_count = (st.session_state.docs_count + 1) % len(st.session_state.navigator)
     st.session_state.hoods_count = 0
     st.session_state.doc_selectbox = None  # Reset the selectbox
 
@@ -57,7 +58,7 @@ def previous_doc():
     # Enable widgets related to neighborhoods' navigation and editing
     cw.enable_neighborhoods_widgets()
 
-    st.session_state.docs_count = (st.session_state.docs_count - 1) % len(st.session_state.filtered_docs)
+    st.session_state.docs_count = (st.session_state.docs_count - 1) % len(st.session_state.navigator)
     st.session_state.hoods_count = 0
     st.session_state.doc_selectbox = None  # Reset the selectbox
 
@@ -71,14 +72,14 @@ def clear_filters():
     Clears all applied filters and resets the session variables related to document and neighborhood indices,
     selected filters, and filtered documents.
     """
-    if 'hoods_docs' in st.session_state:
+    if 'collection_navigator' in st.session_state:
         st.session_state.docs_count = 0
         st.session_state.hoods_count = 0
         st.session_state.selected_nacionalidad = []
         st.session_state.selected_entidad_territorial = []
         st.session_state.selected_periodo = []
-        st.session_state.filtered_docs = st.session_state.hoods_docs.copy()
-        st.session_state.filtered_keys = list(st.session_state.filtered_docs.keys())
+        st.session_state.navigator = st.session_state.collection_navigator
+        st.session_state.filtered_keys = st.session_state.navigator.document_ids
         st.session_state.filters = {}
         if st.session_state.disabled_neighborhoods:
             cw.enable_neighborhoods_widgets()
@@ -118,74 +119,27 @@ def open_pdf_button():
             st.warning(f"PDF file not found: {pdf_file_path}")
 
 
-def colorize_word(word, color):
-    return f'<span style="color: {color}; font-weight: bold;">{word}</span>'
-
-
-def count_and_color_text(text_to_display):
-    # Tokenize the text
-    tokenized_text = data_utils.tokenize(text_to_display)
-    # Colored Tokenized text
-    colored_tokenized_text = tokenized_text.copy()
-
-    # Initialize a dictionary to store counts and colored text
-    terms_counts = {}
-
-    # Flag to control if term is a whole word
-    ww_flag = False
-
-    # Get neighborhoods terms and filter term, if any, together
-    all_terms = st.session_state.hoods_term.copy()
-    filter_by_term_list = []
-    if st.session_state.filter_by_term != "":
-        filter_by_term_list = st.session_state.filter_by_term.split(',')
-        all_terms.extend(filter_by_term_list)
+def highlighted_terms():
+    """
+    Get the terms to highlight in the displayed texts: the terms of the neighborhoods, in red, and the filter terms,
+    in blue.
 
-    # Loop through each term in all_term
-    for term in all_terms:
-        count = 0
+    Returns:
+    - tuple: Terms to highlight, as (term, color, whole_word) tuples.
+    """
+    filter_by_term_list = [term.strip() for term in st.session_state.filter_by_term.split(',') if term.strip()]
+    filter_terms = {term.lower() for term in filter_by_term_list}
 
-        # Check if the term is a whole word indicator
+    terms = []
+    whole_word = False
+    for term in st.session_state.hoods_term + filter_by_term_list:
+        # Check if the term is a whole word indicator for the next term
         if term.lower() == 'ww':
-            ww_flag = True
+            whole_word = True
             continue
-
-        # Colorize the term. Different colors if the term is of the neighborhoods or a filter term
-        color = 'red'
-        if filter_by_term_list:
-            for filter_term in filter_by_term_list:
-                if filter_term.lower() == term.lower():
-                    color = 'blue'
-                    break
-
-        # Count the term
-        for i, word in enumerate(tokenized_text):
-
-            if ww_flag:
-                # Check if the term is a whole word and increment count
-                if term.lower() == word.lower():
-                    count += 1
-
-                    # Colorize the entire word in the text
-                    colored_tokenized_text[i] = colorize_word(word.lower(), color)
-
-                # Set whole word flag back to False
-                ww_flag = False
-
-            else:
-                # Check if the term is a substring of the word and increment count
-                if term.lower() in word.lower():
-                    count += 1
-
-                    # Colorize the specific sequence within the text
-                    colored_tokenized_text[i] = word.lower().replace(term.lower(), colorize_word(term.lower(), color))
-
-        # Store the count in the terms_counts dictionary
-        terms_counts[term.lower()] = count
-
-    colored_text = ' '.join(colored_tokenized_text)
-
-    return terms_counts, colored_text
+        terms.append((term, 'blue' if term.lower() in filter_terms else 'red', whole_word))
+        whole_word = False
+    return tuple(terms)
 
 
 def display_complete_text(text_area_container):
@@ -201,18 +155,28 @@ def display_complete_text(text_area_container):
 
     # Checks if the document exists.
     if document:
-        # Extracts the text to be displayed
+        # The editor gets the text as it is in the corpus, so saving it doesn't write the corrections not yet
+        # materialized into this document alone
         text_to_display = document.get("text", "")
 
         # Displays the complete text within a Streamlit text area.
         with text_area_container:
-            terms_counts, colored_text = count_and_color_text(text_to_display)
+            terms_counts, colored_text = highlighter.count_and_color_text(text_to_display, highlighted_terms())
             summary_string = "Amount of terms found in the text: "
             for term, count in terms_counts.items():
                 summary_string += f"{term} {count} "
             st.write(f"Complete text from document {document_id} on collection **{config.mongo_collection}**. "
                      f"{summary_string}.")
+            # The editor renders the escaped HTML and returns its plain text, so the saved text has no entities
             st.session_state.editor_content = st_quill(colored_text, toolbar=editor_config.toolbar)
+
+            # The corrections not yet materialized are only shown, in a view that can't be edited
+            overlay = corrections_overlay.get_corrections_overlay()
+            corrected_text = overlay.correct_text(text_to_display) if overlay else text_to_display
+            if corrected_text != text_to_display:
+                with st.expander("Text with the corrections not yet materialized in the corpus"):
+                    _, colored_corrected_text = highlighter.count_and_color_text(corrected_text, highlighted_terms())
+                    st.html(f'<div style="white-space: pre-wrap">{colored_corrected_text}</div>')
     else:
         # If the document does not exist, displays a message indicating that the document was not found.
         # This should never happen
@@ -233,7 +197,7 @@ def display_collection_hoods(text_area_container, selected_collection):
     if 'filtered_keys' in st.session_state and st.session_state.filtered_keys:
         # Retrieve information about the current document and neighborhood
         current_document_id = st.session_state.filtered_keys[st.session_state.docs_count]
-        current_document = st.session_state.filtered_docs[current_document_id]
+        current_document = st.session_state.navigator.document(st.session_state.docs_count)
         current_metadata = current_document['metadata']
         current_hood = current_document['neighborhoods'][st.session_state.hoods_count]
 
@@ -276,12 +240,15 @@ def display_collection_hoods(text_area_container, selected_collection):
                      f'on collection **{selected_collection}**. '
                      f'Manually edited (not yet updated in corpus): **{"Yes" if edited else "No"}**. '
                      f'Aprox. page # the neighborhood is at: **{aprox_page_hood + 1}**.')
-            terms_counts, colored_text = count_and_color_text(text)
+            terms_counts, colored_text = highlighter.count_and_color_text(text, highlighted_terms())
             st.session_state.editor_content = st_quill(colored_text, toolbar=editor_config.toolbar)
             # Display summary information
-            st.write(f'Total documents: {len(st.session_state.filtered_keys)}. Total neighborhoods: '
-                     f'{sum(len(value['neighborhoods']) if isinstance(value['neighborhoods'], list) else 0
-                            for value in st.session_state.filtered_docs.values())}. '
+            # The counts come from the statistics of the collection unless the filters are too specific for them
+            statistics = data_utils.get_neighborhood_statistics(selected_collection)
+            counts = neighborhood_statistics.filtered_counts(statistics, st.session_state.filters)
+            if counts is None:
+                counts = len(st.session_state.filtered_keys), st.session_state.navigator.total_neighborhoods()
+            st.write(f'Total documents: {counts[0]}. Total neighborhoods: {counts[1]}. '
                      f'Applied filters: {
                      '; '.join([f'{k}: {','.join(v)}' for k, v in st.session_state.filters.items()])}')
     else:
@@ -356,33 +323,42 @@ def initialize_session_variables():
 
     # Co-occurrences class
     if 'coo' not in st.session_state:
-        st.session_state.coo = coo.CoOccurrences()
+        st.session_state.coo = coo.get_co_occurrences()
 
     # The dataframe with the general corrections
     if 'corrections_df' not in st.session_state:
         st.session_state.corrections_df = data_utils.get_corrections_from_mongo()
 
+    # The types of the jobs queued from this session and not yet finished, by job ID
+    if 'jobs' not in st.session_state:
+        st.session_state.jobs = {}
+
+    # The last finished jobs of this session, to show their results
+    if 'finished_jobs' not in st.session_state:
+        st.session_state.finished_jobs = []
 
-def populate_session_document_variables(selected_collection):
+
+def populate_session_document_variables(selected_collection, refresh=False):
     """
         Populates session variables related to the documents and neighborhoods of the selected collection.
 
         Parameters:
         - selected_collection (str): The name of the selected collection.
+        - refresh (bool): Read the documents of the collection again even if it was already selected.
     """
-    # Retrieve documents from MongoDB for the selected collection
-    st.session_state.hoods_docs = data_utils.get_documents_from_collection(selected_collection)
-
-    # Sort the documents alphabetically by keys
-    st.session_state.hoods_docs = dict(sorted(st.session_state.hoods_docs.items(), key=lambda x: x[0]))
+    # Only the ordered document IDs and neighborhood counts of the collection are retrieved from MongoDB, the
+    # documents themselves are fetched by the navigator as they are displayed
+    if (refresh or 'collection_navigator' not in st.session_state
+            or st.session_state.collection_navigator.collection_name != selected_collection):
+        st.session_state.collection_navigator = navigator.NeighborhoodsNavigator.from_collection(selected_collection)
 
-    # Make a copy of the entire neighborhoods corpus because the filtered might change. We mostly use filtered
-    # and only use hoods_docs for when we need to reset the filters.
-    st.session_state.filtered_docs = st.session_state.hoods_docs.copy()
+    # Navigate the entire collection because the filters might change. We mostly use navigator
+    # and only use collection_navigator for when we need to reset the filters.
+    st.session_state.navigator = st.session_state.collection_navigator
 
     # Extract the terms from the collection's name and create a list of filtered keys
     st.session_state.hoods_term = [term.strip() for term in selected_collection.split('_')[:-1]]
-    st.session_state.filtered_keys = list(st.session_state.filtered_docs.keys())
+    st.session_state.filtered_keys = st.session_state.navigator.document_ids
 
     # Enable all interface widgets in case they were disabled
     cw.enable_all_widgets()
@@ -457,29 +433,17 @@ def generate_co_occurrences_interface_controls(selected_collection):
         if st.session_state.co_occurrence_size == "":
             st.session_state.co_occurrence_size = config.co_occurrence_neighborhood_size
 
-        # Streamlit spinner while processing the generation of co-occurrences
-        with st.spinner(f'Generating co-occurrences. '
-                        f'This might take a while. Please wait...'):
-
-            # Collects the neighborhoods based on the specified sequences
-            # and returns the name of the created collection
-            co_occurrence_matrix, vocabulary = st.session_state.coo.generate_co_occurrences_matrix(
-                st.session_state.filtered_docs, st.session_state.co_occurrence_size)
-
-            # Get the top co-occurrences from the co-occurrences matrix
-            top_co_occurrences = coo.get_top_co_occurrences(
-                co_occurrence_matrix, vocabulary, st.session_state.hoods_term)
-
-            # Store the new co-occurrence collection
-            st.session_state.coo.store_top_co_occurrences_in_mongodb(top_co_occurrences,
-                                                                     st.session_state.co_occurrence_size,
-                                                                     st.session_state.filters,
-                                                                     st.session_state.hoods_term)
-
-            # Fetch all co-occurrences collections
-            st.session_state.top_co_occurrences = st.session_state.coo.fetch_top_co_occurrences_from_mongodb()
-
-            st.success("Co-occurrences generated successfully.")
+        # The co-occurrences are generated by a worker, for the neighborhoods as they are filtered now
+        metadata_filters = {field: st.session_state.filters.get(filter_name, [])
+                            for field, filter_name in neighborhood_statistics.FACETS.items()}
+        submit_job('generate_co_occurrences',
+                   {'collection_name': selected_collection,
+                    'metadata_filters': metadata_filters,
+                    'term': st.session_state.navigator.term,
+                    'window_size': int(st.session_state.co_occurrence_size),
+                    'filters': st.session_state.filters,
+                    'target_words': st.session_state.hoods_term},
+                   f'Generating co-occurrences for {selected_collection}')
 
 
 def collect_neighborhoods_interface_controls(selected_collection):
@@ -507,8 +471,7 @@ def collect_neighborhoods_interface_controls(selected_collection):
                                             f"(default {config.neighborhoods_size}):", value=config.neighborhoods_size,
                                             step=1, disabled=st.session_state.disabled_collect)
     # Generate New Neighborhoods Button
-    collect_neighborhoods_button = st.button("Collect Neighborhoods", on_click=cw.disable_widgets_without_collect,
-                                             disabled=st.session_state.disabled_collect)
+    collect_neighborhoods_button = st.button("Collect Neighborhoods", disabled=st.session_state.disabled_collect)
 
     # If the Collect Neighborhoods button is pressed
     if collect_neighborhoods_button:
@@ -523,29 +486,9 @@ def collect_neighborhoods_interface_controls(selected_collection):
             # Get the string sequences to collect the neighborhoods
             sequences = create_hood_term.split(',')
 
-            # Streamlit spinner while processing the collecting of neighborhoods
-            with st.spinner(f'Collecting neighborhoods for terms "{create_hood_term}". '
-                            f'This might take a while. Please wait...'):
-
-                # Collects the neighborhoods based on the specified sequences
-                # and returns the name of the created collection
-                collection_name = data_utils.collect_neighborhoods_mongo_parallel(sequences_list=sequences,
-                                                                                  size=create_hood_size)
-                st.success("Neighborhoods collected successfully.")
-
-                # Once we are sure we have at least a collection of neighborhoods,
-                # enable the remaining widgets if they were disabled
-                cw.enable_widgets_without_collect()
-
-                # Reset docs_count and hoods_count to 0 to avoid index out of bounds errors
-                st.session_state.docs_count = 0
-                st.session_state.hoods_count = 0
-
-                # Set the selected collection to the newly created one
-                st.session_state.selected_collection = collection_name
-
-                # Rerun to see changes in the interface
-                st.rerun()
+            # The neighborhoods are collected by a worker, and the collection is selected once it finishes
+            submit_job('collect_neighborhoods', {'sequences': sequences, 'size': int(create_hood_size)},
+                       f'Collecting neighborhoods for terms "{create_hood_term}"')
 
 
 def filters_interface_controls(selected_collection):
@@ -565,20 +508,15 @@ def filters_interface_controls(selected_collection):
     unique_nacionalidad_values = set()
     unique_entidad_territorial_values = set()
 
-    # If there is a collection of documents and a collection has been selected
-    if 'hoods_docs' not in st.session_state and selected_collection:
-        # Retrieve documents from MongoDB
-        st.session_state.hoods_docs = data_utils.get_documents_from_collection(selected_collection)
-
     # If selected collection exists
-    if selected_collection:
+    if selected_collection and selected_collection != 'No Neighborhoods':
 
-        # Get the required metadata fields for each document from the collection and add them to the set variables
-        for doc in st.session_state.hoods_docs.values():
-            metadata = doc.get('metadata', {})
-            unique_periodo_values.add(metadata.get('periodo', ''))
-            unique_nacionalidad_values.add(metadata.get('nacionalidad', ''))
-            unique_entidad_territorial_values.add(metadata.get('entidad territorial', ''))
+        # Get the distinct values of the required metadata fields from the statistics of the collection
+        statistics = data_utils.get_neighborhood_statistics(selected_collection)
+        unique_periodo_values.update(neighborhood_statistics.facet_values(statistics, 'periodo'))
+        unique_nacionalidad_values.update(neighborhood_statistics.facet_values(statistics, 'nacionalidad'))
+        unique_entidad_territorial_values.update(neighborhood_statistics.facet_values(statistics,
+                                                                                      'entidad territorial'))
 
     # Add multiselect filters using the set variables
     st.session_state.selected_periodo = st.multiselect("Select Periodo",
@@ -730,19 +668,31 @@ def complete_text_interface_controls(text_area_container):
 
         st.button(f"Save Text from {st.session_state.complete_file_to_display}",
                   disabled=st.session_state.disabled_complete_text_save,
-                  on_click=data_utils.save_complete_text_to_mongo)
+                  on_click=save_complete_text)
 
     else:
         cw.disable_complete_text_widgets()
         cw.disable_neighborhoods_widgets()
 
 
+def save_complete_text():
+    """
+    Queues saving the complete text in the editor to its document.
+    """
+    submit_job('save_complete_text', {'document_id': st.session_state.complete_file_to_display,
+                                      'text': st.session_state.editor_content},
+               f'Saving the text of {st.session_state.complete_file_to_display}')
+
+
+def save_edited_neighborhoods():
+    """
+    Queues saving the edited neighborhoods to the texts of their documents.
+    """
+    submit_job('save_edited_neighborhoods', description='Updating the edited neighborhoods in the corpus')
+
+
 def call_to_apply_corrections():
-    cw.disable_all_widgets()
-    with st.spinner("Applying corrections. Please wait..."):
-        data_utils.apply_corrections_all_collections_mongo_parallel(st.session_state.corrections_df)
-        print("Corrections applied successfully.")
-        st.success("Corrections applied successfully.")
+    submit_job('apply_corrections', description='Applying corrections')
 
 
 def neighborhoods_editing_interface_controls(selected_collection):
@@ -784,15 +734,8 @@ def neighborhoods_editing_interface_controls(selected_collection):
                 # Display table
                 st.dataframe(not_updated_hoods_df, height=300)
 
-                update_neighborhoods_in_corpus_button = st.button(f"Update edited neighborhoods in corpus",
-                                                                  on_click=cw.disable_all_widgets,
-                                                                  disabled=st.session_state.disabled_neighborhoods)
-
-                if update_neighborhoods_in_corpus_button:
-                    data_utils.save_edited_neighborhoods_to_corpus_mongo(st.session_state.selected_collection)
-                    st.session_state.updated = True
-                    cw.enable_all_widgets()
-                    st.rerun()
+                st.button(f"Update edited neighborhoods in corpus", on_click=save_edited_neighborhoods,
+                          disabled=st.session_state.disabled_neighborhoods)
 
     with st.session_state.col6:
 
@@ -801,17 +744,11 @@ def neighborhoods_editing_interface_controls(selected_collection):
         # Display table below the textarea
         st.dataframe(st.session_state.corrections_df, height=300)
 
-        apply_corrections_button = st.button("Apply corrections to the entire corpus and neighborhoods",
-                                             key="apply_corrections_button", on_click=call_to_apply_corrections,
-                                             disabled=st.session_state.disabled)
-
-        if apply_corrections_button:
-            # Recollect all neighborhoods and apply filters
-            populate_session_document_variables(selected_collection)
-            data_utils.apply_filters_to_neighborhoods()
-
-            cw.enable_all_widgets()
-            st.rerun()
+        # With the corrections applied as an overlay they are already shown, and only need to be written to the corpus
+        apply_corrections_label = "Materialize corrections in the entire corpus and neighborhoods" \
+            if config.corrections_mode == 'overlay' else "Apply corrections to the entire corpus and neighborhoods"
+        st.button(apply_corrections_label, key="apply_corrections_button", on_click=call_to_apply_corrections,
+                  disabled=st.session_state.disabled)
 
 
 def edition_interface(selected_collection):
@@ -1030,6 +967,118 @@ def vectors_interface(selected_collection):
     pass
 
 
+def submit_job(job_type, parameters=None, description=None):
+    """
+    Queues a job and keeps track of it in the session.
+
+    Parameters:
+    - job_type (str): Type of the job.
+    - parameters (dict, optional): Parameters of the job.
+    - description (str, optional): Description of the job shown to the user.
+    """
+    job_id = jobs.submit(job_type, parameters, description)
+    st.session_state.jobs[job_id] = job_type
+
+
+def job_finished(job, selected_collection):
+    """
+    Updates the session with the results of a finished job.
+
+    Parameters:
+    - job (dict): The finished job.
+    - selected_collection (str): The selected neighborhood collection.
+    """
+    if job['status'] != jobs.DONE:
+        return
+
+    if job['type'] == 'collect_neighborhoods' and job.get('result'):
+        # Once we are sure we have at least a collection of neighborhoods,
+        # enable the remaining widgets if they were disabled
+        cw.enable_widgets_without_collect()
+        # Reset docs_count and hoods_count to 0 to avoid index out of bounds errors
+        st.session_state.docs_count = 0
+        st.session_state.hoods_count = 0
+        # The collection might have been collected again with the same name
+        st.session_state.pop('collection_navigator', None)
+        # Set the selected collection to the newly created one
+        st.session_state.selected_collection = job['result']
+    elif job['type'] in ('apply_corrections', 'save_complete_text', 'save_edited_neighborhoods'):
+        # The texts of the neighborhoods changed
+        if selected_collection and selected_collection != 'No Neighborhoods':
+            populate_session_document_variables(selected_collection, refresh=True)
+            if st.session_state.filters:
+                data_utils.apply_filters_to_neighborhoods()
+        data_utils.find_edited_neighborhoods()
+        if job['type'] == 'save_edited_neighborhoods':
+            st.session_state.updated = True
+    elif job['type'] == 'generate_co_occurrences':
+        st.session_state.top_co_occurrences = st.session_state.coo.fetch_top_co_occurrences_from_mongodb()
+
+
+def update_jobs():
+    """
+    Reads the status of the jobs of this session, updating the session with the results of the finished ones.
+
+    Returns:
+    - dict: The unfinished jobs by ID.
+    """
+    if not st.session_state.jobs:
+        return {}
+    current_jobs = jobs.get_jobs(list(st.session_state.jobs))
+    for job_id in list(st.session_state.jobs):
+        job = current_jobs.get(job_id)
+        if job is None or job['status'] in (jobs.DONE, jobs.FAILED):
+            del st.session_state.jobs[job_id]
+            if job is not None:
+                job_finished(job, st.session_state.selected_collection)
+                st.session_state.finished_jobs = ([job] + st.session_state.finished_jobs)[:5]
+    return {job_id: job for job_id, job in current_jobs.items() if job_id in st.session_state.jobs}
+
+
+def jobs_interface_controls(running_jobs):
+    """
+    Shows the progress of the unfinished jobs of this session and the results of the last finished ones.
+
+    Parameters:
+    - running_jobs (dict): The unfinished jobs by ID.
+    """
+    if not running_jobs and not st.session_state.finished_jobs:
+        return
+
+    st.write("**JOBS:**")
+    for job in running_jobs.values():
+        job_progress = job.get('progress', {})
+        status = f"{job['description']}: {job_progress.get('stage') or job['status']}"
+        if job_progress.get('total'):
+            status += (f" ({job_progress['processed']}/{job_progress['total']}, "
+                       f"{job_progress.get('rate', 0):.1f}/s")
+            if job_progress.get('eta_seconds') is not None:
+                status += f", {job_progress['eta_seconds']:.0f} s left"
+            status += ")"
+            st.progress(min(job_progress['processed'] / job_progress['total'], 1.0), text=status)
+        else:
+            st.info(status)
+
+    for job in st.session_state.finished_jobs:
+        if job['status'] == jobs.DONE:
+            st.success(f"{job['description']}: finished in {job.get('seconds', 0):.1f} seconds.")
+        else:
+            error_lines = job.get('error', '').strip().splitlines()
+            st.error(f"{job['description']}: failed. {error_lines[-1] if error_lines else ''}")
+
+
+def jobs_status():
+    """
+    Shows the status of the jobs of this session. While jobs are running only this part of the page is run again to
+    poll them, and the whole page once one of them finishes, so its results are applied to the widgets.
+    """
+    unfinished_jobs_count = len(st.session_state.jobs)
+    running_jobs = update_jobs()
+    if len(running_jobs) < unfinished_jobs_count:
+        st.rerun()
+    jobs_interface_controls(running_jobs)
+
+
 def main():
     st.set_page_config(layout="wide", page_title='Explore And Manage Your Corpus', page_icon=':books:')
     st.write(css, unsafe_allow_html=True)
@@ -1037,6 +1086,9 @@ def main():
 
     initialize_session_variables()
 
+    # The results of the jobs that finished since the last run are applied before the widgets are shown
+    update_jobs()
+
     # tab1, tab2 = st.tabs(["Edition", "Co-occurrences", ])
     st.session_state.chosen_tab_id = stx.tab_bar(data=[
         stx.TabBarItemData(id=1, title="Edit the corpus", description=""),
@@ -1046,8 +1098,12 @@ def main():
 
     selected_collection = sidebar_interface_controls()
 
-    # Populate or repopulate the neighborhoods if there are no filtered options and there's a selected collection
-    # TODO: this can be more efficient. If no filters, just re-copy hoods. If selection changes do the whole thing??
+    with st.sidebar:
+        # Filled at the end of the run, once the jobs queued during it are known
+        jobs_container = st.container()
+
+    # Populate or repopulate the neighborhoods if there are no filtered options and there's a selected collection.
+    # The collection is only read again when the selected collection changes.
     if (not st.session_state.filters and selected_collection and selected_collection != 'No Neighborhoods'
             and not st.session_state.disabled_neighborhoods):
         populate_session_document_variables(selected_collection)
@@ -1071,6 +1127,10 @@ def main():
     if st.session_state.chosen_tab_id == '3':
         vectors_interface(selected_collection)
 
+    # Poll the status of the unfinished jobs, including those queued during this run
+    with jobs_container:
+        st.fragment(jobs_status, run_every=config.jobs_poll_seconds if st.session_state.jobs else None)()
+
 
 if __name__ == '__main__':
     main()
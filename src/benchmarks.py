@@ -0,0 +1,278 @@
+import concurrent.futures
+import random
+import time
+
+import src.config as config
+import src.data_utils as data_utils
+import src.db as db
+import src.sequence_matcher as sequence_matcher
+import src.spanish_stopwords as spanish_stopwords
+import src.text_normalization as text_normalization
+import src.token_store as token_store
+import src.tokenizers as tokenizers
+import src.utils as utils
+import src.worker_pool as worker_pool
+
+
+def sample_corpus_tokens(max_tokens=1_000_000, seed=0):
+    """
+    Get tokens to run the benchmarks on, from the token store if it has been built or random words otherwise.
+
+    Parameters:
+    - max_tokens (int): Maximum number of tokens.
+    - seed (int): Seed for the random words.
+
+    Returns:
+    - list: List of tokens.
+    """
+    store = token_store.get_token_store()
+    tokens = []
+    for document_id in store.document_ids():
+        tokens.extend(store.get_tokens(document_id, 0, max_tokens - len(tokens)))
+        if len(tokens) >= max_tokens:
+            return tokens
+    if tokens:
+        return tokens
+
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyzáéíóúñ'
+    words = [''.join(rng.choice(letters) for _ in range(rng.randint(2, 12))) for _ in range(20_000)]
+    words += [',', '.', ';', '(', ')', '``', "''"]
+    return [rng.choice(words) for _ in range(min(max_tokens, 200_000))]
+
+
+def sample_corpus_texts(max_bytes=50_000_000):
+    """
+    Get texts of the corpus to run the benchmarks on.
+
+    Parameters:
+    - max_bytes (int, optional): Maximum size of the texts in UTF-8, None for the whole corpus.
+
+    Returns:
+    - list: (document ID, text) tuples.
+    """
+    texts = []
+    size = 0
+    for document in db.corpus_collection().find({'text': {'$exists': True}}, {'text': 1}).sort('_id', 1):
+        texts.append((document['_id'], document['text']))
+        size += len(document['text'].encode('utf-8'))
+        if max_bytes is not None and size >= max_bytes:
+            break
+    return texts
+
+
+def benchmark_sequences_matcher(tokens, terms_counts=(1, 2, 4, 6, 8, 12), seed=0):
+    """
+    Compare the compiled sequences matcher against the per-token loop of data_utils.term_matches_sequences as the
+    number of terms grows, checking that both give the same results.
+
+    Parameters:
+    - tokens (list): Tokens to match.
+    - terms_counts (tuple): Numbers of terms to benchmark.
+    - seed (int): Seed used to pick the terms.
+
+    Returns:
+    - list: Dictionaries with the timings for every number of terms.
+    """
+    rng = random.Random(seed)
+    candidates = sorted({token.lower() for token in tokens if token.isalpha() and len(token) > 3})
+    results = []
+
+    for terms_count in terms_counts:
+        terms = [term[:rng.randint(3, len(term))] for term in rng.sample(candidates, min(terms_count, len(candidates)))]
+        # Half of the terms as whole words, like '"agua"' in the interface
+        sequences = [f'"{term}"' if i % 2 else term for i, term in enumerate(terms)]
+
+        start_time = time.perf_counter()
+        expected = [data_utils.term_matches_sequences(token, sequences) for token in tokens]
+        loop_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        matcher = sequence_matcher.SequencesMatcher(sequences, max_cache_size=0)
+        unmemoized = [matcher._match(token) for token in tokens]
+        automaton_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        matcher = sequence_matcher.SequencesMatcher(sequences)
+        memoized = [matcher(token) for token in tokens]
+        matcher_time = time.perf_counter() - start_time
+
+        assert expected == unmemoized == memoized, f"Matcher results differ for sequences {sequences}"
+
+        results.append({'terms': terms_count, 'tokens': len(tokens), 'matches': sum(expected),
+                        'loop_seconds': loop_time, 'automaton_seconds': automaton_time,
+                        'matcher_seconds': matcher_time, 'speedup': loop_time / matcher_time})
+    return results
+
+
+def clean_tokenize_neighborhood_per_text(neighborhood, stop_words):
+    """
+    Clean a neighborhood for the co-occurrences the way it was done before the text normalizer: removing the stopwords,
+    accents and non-letters from the whole text and tokenizing it again after every step.
+
+    Parameters:
+    - neighborhood (str): Text of the neighborhood.
+    - stop_words (StopWords): The stopwords.
+
+    Returns:
+    - list: The normalized words.
+    """
+    neighborhood_no_stopwords = stop_words.remove_stopwords(neighborhood.lower())
+    neighborhood_no_stopwords_filtered = utils.remove_accents(neighborhood_no_stopwords)
+    neighborhood_no_stopwords_filtered = utils.remove_non_letters(neighborhood_no_stopwords_filtered)
+    neighborhood_no_stopwords_filtered = stop_words.remove_stopwords(neighborhood_no_stopwords_filtered)
+    return [word for word in tokenizers.tokenize(neighborhood_no_stopwords_filtered) if len(word) >= 3]
+
+
+def benchmark_text_normalization(tokens, neighborhood_size=config.neighborhoods_size, max_neighborhoods=2000):
+    """
+    Compare the type-level text normalizer against cleaning every neighborhood text as a whole, checking that both
+    give the same words.
+
+    Parameters:
+    - tokens (list): Tokens the neighborhoods are made of.
+    - neighborhood_size (int): Number of tokens of every neighborhood.
+    - max_neighborhoods (int): Maximum number of neighborhoods.
+
+    Returns:
+    - list: Dictionaries with the timings of the normalizer with an empty and with a filled memo table.
+    """
+    neighborhoods = [' '.join(tokens[start:start + neighborhood_size])
+                     for start in range(0, len(tokens), neighborhood_size)][:max_neighborhoods]
+    neighborhoods_tokens = sum(len(neighborhood.split()) for neighborhood in neighborhoods)
+    stop_words = spanish_stopwords.StopWords()
+
+    start_time = time.perf_counter()
+    expected = [clean_tokenize_neighborhood_per_text(neighborhood, stop_words) for neighborhood in neighborhoods]
+    per_text_time = time.perf_counter() - start_time
+
+    normalizer = text_normalization.TextNormalizer(stop_words.get_stopwords())
+    results = []
+    for memo in ('empty', 'filled'):
+        start_time = time.perf_counter()
+        normalized = normalizer.normalize_many(neighborhoods)
+        normalizer_time = time.perf_counter() - start_time
+
+        assert expected == normalized, "Normalized words differ from the cleaned neighborhoods"
+
+        results.append({'memo': memo, 'neighborhoods': len(neighborhoods), 'tokens': neighborhoods_tokens,
+                        'token_types': len(normalizer.cache),
+                        'per_text_us_per_token': per_text_time / max(neighborhoods_tokens, 1) * 1e6,
+                        'normalizer_us_per_token': normalizer_time / max(neighborhoods_tokens, 1) * 1e6,
+                        'speedup': per_text_time / normalizer_time})
+    return results
+
+
+def benchmark_worker_pool(tokens, operations=5, texts_count=64, text_tokens=2_000):
+    """
+    Compare tokenizing texts with a new pool of processes for every operation, as every operation used to create,
+    against the shared worker pool. The time the processes of the shared pool took to start and to load the
+    tokenizer, stopwords and corrections is reported apart from the time of the operations.
+
+    Parameters:
+    - tokens (list): Tokens the texts are made of.
+    - operations (int): Number of operations.
+    - texts_count (int): Number of texts tokenized by every operation.
+    - text_tokens (int): Number of tokens of every text.
+
+    Returns:
+    - list: Dictionaries with the timings of the new pools and the shared pool.
+    """
+    texts = [' '.join(tokens[start:start + text_tokens])
+             for start in range(0, min(len(tokens), texts_count * text_tokens), text_tokens)]
+
+    start_time = time.perf_counter()
+    for _ in range(operations):
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            list(executor.map(tokenizers.tokenize, texts, chunksize=4))
+    new_pools_time = time.perf_counter() - start_time
+
+    pool = worker_pool.WorkerPool(config.worker_pool_size, config.worker_pool_max_tasks_per_child,
+                                  config.worker_pool_start_method)
+    try:
+        warm_up_time = pool.warm_up()
+        start_time = time.perf_counter()
+        for _ in range(operations):
+            list(pool.map(tokenizers.tokenize, texts, chunksize=4))
+        shared_pool_time = time.perf_counter() - start_time
+        statistics = pool.statistics()
+    finally:
+        pool.shutdown()
+
+    return [{'pool': 'new per operation', 'processes': None, 'warm_up_s': None, 'startup_cpu_s': None,
+             'preload_s': None, 'operation_s': new_pools_time / operations},
+            {'pool': 'shared', 'processes': statistics['processes'], 'warm_up_s': warm_up_time,
+             'startup_cpu_s': statistics['startup_seconds'], 'preload_s': statistics['preload_seconds'],
+             'operation_s': shared_pool_time / operations}]
+
+
+def benchmark_tokenizers(texts, reference='nltk', max_differences=5):
+    """
+    Measure the throughput of every tokenizer backend on the same texts, checking that they give the same tokens
+    as the reference backend. The first differences found are printed.
+
+    Parameters:
+    - texts (list): (document ID, text) tuples, for example from sample_corpus_texts.
+    - reference (str): Name of the backend the others are compared against.
+    - max_differences (int): Maximum number of differences printed for every backend.
+
+    Returns:
+    - list: Dictionaries with the throughput of every backend and the number of texts whose tokens differ from the
+            reference.
+    """
+    size = sum(len(text.encode('utf-8')) for _, text in texts)
+    tokens = {}
+    results = []
+    for name in [reference] + [name for name in tokenizers.TOKENIZERS if name != reference]:
+        tokenizer = tokenizers.TOKENIZERS[name]()
+        start_time = time.perf_counter()
+        tokens[name] = [tokenizer.tokenize(text) for _, text in texts]
+        elapsed_time = time.perf_counter() - start_time
+
+        different_texts = 0
+        for (document_id, _), expected, result in zip(texts, tokens[reference], tokens[name]):
+            if expected == result:
+                continue
+            different_texts += 1
+            if different_texts <= max_differences:
+                position = next((index for index, (expected_token, token) in enumerate(zip(expected, result))
+                                 if expected_token != token), min(len(expected), len(result)))
+                print(f"Tokens of {document_id} with {name} differ at token {position}: "
+                      f"{expected[position:position + 5]} instead of {result[position:position + 5]}.")
+
+        results.append({'tokenizer': name, 'texts': len(texts), 'megabytes': size / 1e6,
+                        'megabytes_per_second': size / 1e6 / max(elapsed_time, 1e-9),
+                        'speedup': None if name == reference else results[0]['seconds'] / max(elapsed_time, 1e-9),
+                        'different_texts': different_texts, 'seconds': elapsed_time})
+    return results
+
+
+def print_results(title, results):
+    """
+    Print the results of a benchmark as a table.
+
+    Parameters:
+    - title (str): Title of the benchmark.
+    - results (list): Dictionaries with the same keys.
+    """
+    print(title)
+    if not results:
+        return
+    columns = list(results[0].keys())
+    print(' | '.join(columns))
+    for result in results:
+        print(' | '.join(f'{value:.4f}' if isinstance(value, float) else str(value) for value in result.values()))
+    print()
+
+
+def main():
+    tokens = sample_corpus_tokens()
+    print_results('Sequences matcher', benchmark_sequences_matcher(tokens))
+    print_results('Text normalization', benchmark_text_normalization(tokens))
+    print_results('Worker pool', benchmark_worker_pool(tokens))
+    texts = sample_corpus_texts() or [('sample', ' '.join(tokens))]
+    print_results('Tokenizers', benchmark_tokenizers(texts))
+
+
+if __name__ == '__main__':
+    main()
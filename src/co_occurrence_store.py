@@ -0,0 +1,335 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.sparse import csr_matrix, load_npz, save_npz
+
+import src.config as config
+import src.co_occurrences as co_occurrences
+import src.file_lock as file_lock
+
+
+def artifact_key(collection_name, window_size, filters):
+    """
+    Compute the key of the co-occurrence matrix of a neighborhoods' collection for a window size and some filters.
+
+    Parameters:
+    - collection_name (str): Name of the neighborhoods' collection.
+    - window_size (int): Size of the co-occurrence window.
+    - filters (dict): Filters applied to the neighborhoods.
+
+    Returns:
+    - str: Key of the artifact.
+    """
+    description = json.dumps({'collection': collection_name, 'window_size': int(window_size),
+                              'filters': {k: sorted(v) for k, v in (filters or {}).items()}}, sort_keys=True)
+    return hashlib.blake2b(description.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def pad_matrix(matrix, size):
+    """
+    Extend a square CSR matrix with empty rows and columns, without copying its indices or data.
+
+    Parameters:
+    - matrix (scipy.sparse.csr_matrix): The matrix.
+    - size (int): The new number of rows and columns.
+
+    Returns:
+    - scipy.sparse.csr_matrix: The padded matrix.
+    """
+    rows = matrix.shape[0]
+    if rows == size:
+        return matrix
+    indptr = np.concatenate((matrix.indptr, np.full(size - rows, matrix.indptr[-1], dtype=matrix.indptr.dtype)))
+    return csr_matrix((matrix.data, matrix.indices, indptr), shape=(size, size), copy=False)
+
+
+def _write_vocabulary(path, vocabulary):
+    """
+    Write a vocabulary as the list of its words in index order.
+
+    Parameters:
+    - path (Path): Path of the vocabulary file.
+    - vocabulary (dict): Mapping of words to their row/column index in the matrix.
+    """
+    words = [None] * len(vocabulary)
+    for word, index in vocabulary.items():
+        words[index] = word
+    temporary_path = path.with_name(path.name + '.tmp')
+    with open(temporary_path, 'w', encoding='utf-8') as vocabulary_file:
+        json.dump(words, vocabulary_file, ensure_ascii=False)
+    os.replace(temporary_path, path)
+
+
+def _write_meta(path, meta):
+    """
+    Write the meta file of an artifact, replacing the previous version only once it is completely written.
+
+    Parameters:
+    - path (Path): Path of the meta file.
+    - meta (dict): The metadata.
+    """
+    temporary_path = path.with_name(path.name + '.tmp')
+    with open(temporary_path, 'w', encoding='utf-8') as meta_file:
+        json.dump(meta, meta_file, ensure_ascii=False)
+    os.replace(temporary_path, path)
+
+
+class CoOccurrenceArtifacts:
+    """
+    On-disk store of complete co-occurrence matrices, saved as CSR arrays (indptr, indices and data) next to their
+    vocabulary and opened memory-mapped on demand.
+
+    Opened matrices are kept in an in-process LRU cache bounded by a byte budget, so they stay loaded across
+    Streamlit reruns and sessions of the same server. Since the job worker and the Streamlit process both write the
+    artifacts, a cached matrix is only used while its meta file is the one it was opened from, and every read and
+    write holds a lock on the directory shared by the processes.
+
+    Incremental changes are kept in a small delta matrix next to the base matrix, so updating an artifact costs time
+    proportional to the change. The delta is merged into the base once it grows past a share of it.
+    """
+
+    ARRAYS = ('indptr', 'indices', 'data')
+    VOCABULARY_FILE_NAME = 'vocabulary.json'
+    META_FILE_NAME = 'meta.json'
+    DELTA_FILE_NAME = 'delta.npz'
+
+    def __init__(self, directory=config.CO_OCCURRENCES_DIR, cache_bytes=config.co_occurrences_cache_bytes):
+        self.directory = directory
+        self.cache_bytes = cache_bytes
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+        self.lock = file_lock.FileLock(directory)
+
+    def artifact_path(self, key):
+        """
+        Returns:
+        - Path: Directory of the artifact with the given key.
+        """
+        return self.directory / key
+
+    def exists(self, collection_name, window_size, filters):
+        """
+        Check if a valid artifact exists for a collection, window size and filters.
+
+        Returns:
+        - bool: True if the artifact exists.
+        """
+        key = artifact_key(collection_name, window_size, filters)
+        return (self.artifact_path(key) / self.META_FILE_NAME).is_file()
+
+    def save(self, collection_name, window_size, filters, co_occurrence_matrix, vocabulary, target_words=None):
+        """
+        Save a co-occurrence matrix and its vocabulary. The artifact is written to a temporary directory and moved
+        into place once complete, the meta file marking it as valid.
+
+        Parameters:
+        - collection_name (str): Name of the neighborhoods' collection.
+        - window_size (int): Size of the co-occurrence window.
+        - filters (dict): Filters applied to the neighborhoods.
+        - co_occurrence_matrix (scipy.sparse matrix): The co-occurrence matrix.
+        - vocabulary (dict): Mapping of words to their row/column index in the matrix.
+        - target_words (list, optional): Target words the top co-occurrences were stored for.
+
+        Returns:
+        - CoOccurrencesQueryEngine: Query engine over the saved matrix.
+        """
+        key = artifact_key(collection_name, window_size, filters)
+        co_occurrence_matrix = co_occurrence_matrix.tocsr()
+
+        with self.lock:
+            path = self.artifact_path(key)
+            temporary_path = path.with_name(path.name + '.tmp')
+            shutil.rmtree(temporary_path, ignore_errors=True)
+            temporary_path.mkdir(parents=True)
+
+            np.save(temporary_path / 'indptr.npy', co_occurrence_matrix.indptr)
+            np.save(temporary_path / 'indices.npy', co_occurrence_matrix.indices)
+            np.save(temporary_path / 'data.npy', co_occurrence_matrix.data)
+
+            _write_vocabulary(temporary_path / self.VOCABULARY_FILE_NAME, vocabulary)
+            _write_meta(temporary_path / self.META_FILE_NAME,
+                        {'collection': collection_name, 'window_size': int(window_size), 'filters': filters or {},
+                         'target_words': target_words, 'shape': list(co_occurrence_matrix.shape),
+                         'nnz': int(co_occurrence_matrix.nnz), 'delta_nnz': 0})
+
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(temporary_path, path)
+
+            self._evict(key)
+            return self.load(collection_name, window_size, filters)
+
+    def load(self, collection_name, window_size, filters):
+        """
+        Open the co-occurrence matrix of a collection, window size and filters.
+
+        Returns:
+        - CoOccurrencesQueryEngine or None: Query engine over the matrix, or None if there is no valid artifact.
+        """
+        key = artifact_key(collection_name, window_size, filters)
+        with self.lock:
+            path = self.artifact_path(key)
+            try:
+                # The meta file is replaced by every write, so its inode, modification time and size identify
+                # the version
+                meta_stat = os.stat(path / self.META_FILE_NAME)
+            except FileNotFoundError:
+                self._evict(key)
+                return None
+            version = (meta_stat.st_ino, meta_stat.st_mtime_ns, meta_stat.st_size)
+
+            if key in self.cache:
+                if self.cache[key][2] == version:
+                    self.cache.move_to_end(key)
+                    return self.cache[key][0]
+                # Another process changed the artifact since it was opened
+                self._evict(key)
+
+            with open(path / self.META_FILE_NAME, 'r', encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+            with open(path / self.VOCABULARY_FILE_NAME, 'r', encoding='utf-8') as vocabulary_file:
+                words = json.load(vocabulary_file)
+
+            # Empty arrays can't be memory-mapped
+            mmap_mode = 'r' if meta['nnz'] else None
+            arrays = {name: np.load(path / f'{name}.npy', mmap_mode=mmap_mode) for name in self.ARRAYS}
+            co_occurrence_matrix = csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                                              shape=tuple(meta['shape']), copy=False)
+            co_occurrence_matrix = pad_matrix(co_occurrence_matrix, len(words))
+            vocabulary = {word: index for index, word in enumerate(words)}
+
+            delta_matrix = None
+            nbytes = sum(array.nbytes for array in arrays.values()) + sum(len(word) + 64 for word in words) * 2
+            if meta.get('delta_nnz'):
+                delta_matrix = pad_matrix(load_npz(path / self.DELTA_FILE_NAME).tocsr(), len(words))
+                nbytes += delta_matrix.data.nbytes + delta_matrix.indices.nbytes + delta_matrix.indptr.nbytes
+
+            query_engine = co_occurrences.CoOccurrencesQueryEngine(co_occurrence_matrix, vocabulary, delta_matrix)
+            self.cache[key] = (query_engine, nbytes, version)
+            self.cached_bytes += nbytes
+            while self.cached_bytes > self.cache_bytes and len(self.cache) > 1:
+                self._evict(next(iter(self.cache)))
+
+            return query_engine
+
+    def update(self, collection_name, window_size, filters, delta_matrix, vocabulary):
+        """
+        Add a change to a saved co-occurrence matrix.
+
+        Parameters:
+        - collection_name (str): Name of the neighborhoods' collection.
+        - window_size (int): Size of the co-occurrence window.
+        - filters (dict): Filters applied to the neighborhoods.
+        - delta_matrix (scipy.sparse matrix): Counts to add (negative to subtract), indexed with the new vocabulary.
+        - vocabulary (dict): The vocabulary of the artifact, extended with any new words at the end.
+
+        Returns:
+        - CoOccurrencesQueryEngine or None: Query engine over the updated matrix, or None if there is no artifact.
+        """
+        with self.lock:
+            query_engine = self.load(collection_name, window_size, filters)
+            if query_engine is None:
+                return None
+
+            key = artifact_key(collection_name, window_size, filters)
+            path = self.artifact_path(key)
+            with open(path / self.META_FILE_NAME, 'r', encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+
+            size = len(vocabulary)
+            delta_matrix = pad_matrix(delta_matrix.tocsr(), size)
+            if query_engine.delta_matrix is not None:
+                delta_matrix = delta_matrix + pad_matrix(query_engine.delta_matrix, size)
+            delta_matrix = delta_matrix.tocsr()
+            delta_matrix.eliminate_zeros()
+
+            # Merge the delta into the base matrix once it is no longer small compared to it
+            if delta_matrix.nnz > config.co_occurrences_delta_ratio * max(1, meta['nnz']):
+                co_occurrence_matrix = pad_matrix(query_engine.co_occurrence_matrix, size) + delta_matrix
+                co_occurrence_matrix.eliminate_zeros()
+                self._evict(key)
+                return self.save(collection_name, window_size, filters, co_occurrence_matrix, vocabulary,
+                                 meta['target_words'])
+
+            # save_npz adds the .npz suffix to paths without it
+            temporary_path = path / 'delta.tmp.npz'
+            save_npz(temporary_path, delta_matrix)
+            os.replace(temporary_path, path / self.DELTA_FILE_NAME)
+            if size != len(query_engine.vocabulary):
+                _write_vocabulary(path / self.VOCABULARY_FILE_NAME, vocabulary)
+            meta['delta_nnz'] = int(delta_matrix.nnz)
+            _write_meta(path / self.META_FILE_NAME, meta)
+
+            self._evict(key)
+            return self.load(collection_name, window_size, filters)
+
+    def metadata(self, collection_name=None):
+        """
+        Get the metadata of the saved artifacts.
+
+        Parameters:
+        - collection_name (str, optional): Only return the artifacts of this neighborhoods' collection.
+
+        Returns:
+        - dict: Metadata of every artifact by key.
+        """
+        artifacts = {}
+        if not self.directory.is_dir():
+            return artifacts
+        for path in self.directory.iterdir():
+            meta_path = path / self.META_FILE_NAME
+            if path.suffix == '.tmp' or not meta_path.is_file():
+                continue
+            with open(meta_path, 'r', encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+            if collection_name is None or meta['collection'] == collection_name:
+                artifacts[path.name] = meta
+        return artifacts
+
+    def invalidate_collection(self, collection_name):
+        """
+        Remove the artifacts of a neighborhoods' collection, for example after its neighborhoods were collected again.
+
+        Parameters:
+        - collection_name (str): Name of the neighborhoods' collection.
+        """
+        with self.lock:
+            for key in self.metadata(collection_name):
+                self._evict(key)
+                shutil.rmtree(self.artifact_path(key), ignore_errors=True)
+
+    def invalidate_all(self):
+        """
+        Remove the artifacts of all the neighborhoods' collections, for example after the corrections applied to
+        their neighborhoods changed.
+        """
+        with self.lock:
+            for collection_name in {meta['collection'] for meta in self.metadata().values()}:
+                self.invalidate_collection(collection_name)
+
+    def _evict(self, key):
+        if key in self.cache:
+            _, nbytes, _ = self.cache.pop(key)
+            self.cached_bytes -= nbytes
+
+
+_co_occurrence_artifacts = None
+_co_occurrence_artifacts_lock = threading.Lock()
+
+
+def get_co_occurrence_artifacts():
+    """
+    Get the co-occurrence artifacts store of this process, shared by all the sessions.
+
+    Returns:
+    - CoOccurrenceArtifacts: The artifacts store.
+    """
+    global _co_occurrence_artifacts
+    with _co_occurrence_artifacts_lock:
+        if _co_occurrence_artifacts is None:
+            _co_occurrence_artifacts = CoOccurrenceArtifacts()
+        return _co_occurrence_artifacts
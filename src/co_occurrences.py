@@ -1,129 +1,250 @@
-import src.utils as utils
+import src.text_normalization as text_normalization
 import src.data_utils as data_utils
 import src.spanish_stopwords as stopwords
 import src.config as config
-from scipy.sparse import coo_matrix
-from pymongo import MongoClient
+import src.co_occurrence_store as co_occurrence_store
+import src.corrections_overlay as corrections_overlay
+import src.db as db
+import src.progress as progress
+from scipy.sparse import coo_matrix, csr_matrix
 import numpy as np
-import concurrent.futures
-from functools import partial
 
-import time
 
+class CoOccurrencesQueryEngine:
+    """
+    Answers top co-occurrences queries against one co-occurrence matrix.
 
-def process_context_word(context_word_index, vocabulary, row):
-    local_context_word_sum = {}
-    context_word = next((k for k, v in vocabulary.items() if v == context_word_index), None)
+    The rows of all the target words of a query are summed with a single sparse product, the top counts are picked
+    with argpartition and the words are read from an inverse vocabulary array, so queries take milliseconds even for
+    large vocabularies. Many target sets can be answered against the same matrix at once.
+    """
 
-    if context_word is not None:
-        # Use direct indexing of the row
-        value = int(row[0, context_word_index])
+    def __init__(self, co_occurrence_matrix, vocabulary, delta_matrix=None):
+        self.co_occurrence_matrix = co_occurrence_matrix.tocsr()
+        self.vocabulary = vocabulary
 
-        # Check if the context word already has a sum
-        if context_word in local_context_word_sum:
-            local_context_word_sum[context_word] += value
-        else:
-            local_context_word_sum[context_word] = value
-
-    return local_context_word_sum
-
-
-def get_top_co_occurrences(co_occurrence_matrix, vocabulary, target_words, maximum_co_occurrences=5000):
-    context_word_sum = {}
-    ww_flag = False
-    indices_subset = []
-    extended_target_words = set()
-    for target_word in target_words:
-        # If the next target word is a whole word set the flag and move to next word
-        if target_word == 'ww':
-            ww_flag = True
-            continue
-        # Check if the target word is a whole word in the vocabulary
-        if ww_flag:
-            # If it's a whole word then it's only one case
-            indices_subset.append(vocabulary[target_word])
-            extended_target_words.add(target_word)
-            ww_flag = False
-        else:
-            # If not a whole word, find all words in the vocabulary that include the target word
-            prefix_matches = []
-            for k, v in vocabulary.items():
-                if target_word in k and k not in extended_target_words:
-                    prefix_matches.append(v)
-                    extended_target_words.add(k)
-            indices_subset.extend(prefix_matches)
-
-    print(extended_target_words)
-
-    print(indices_subset)
-
-    co_occurrence_matrix_subset = co_occurrence_matrix.tocsr()[indices_subset][:, :]
-
-    print(co_occurrence_matrix_subset)
+        # Changes not yet merged into the main matrix, added to it at query time
+        self.delta_matrix = delta_matrix.tocsr() if delta_matrix is not None else None
 
-    # Sort target words by overall frequency
-    extended_target_words = list(extended_target_words)
-    print(extended_target_words)
-    sum_sorted_cm = -np.sum(co_occurrence_matrix_subset, axis=1)
-    print(sum_sorted_cm)
-    sorted_indices = np.argsort(sum_sorted_cm, axis=0)
-    print(sorted_indices)
-    sorted_target_words = [extended_target_words[int(i)] for i in sorted_indices]
+        # Inverse vocabulary: word of every row/column index
+        self.words = np.empty(len(vocabulary), dtype=object)
+        for word, index in vocabulary.items():
+            self.words[index] = word
 
-    # Find the top N co-occurrences for each word
-    print(sorted_target_words)
-    for i, word in enumerate(sorted_target_words):
-        print(i, word)
-        row = co_occurrence_matrix_subset.getrow(sorted_indices[i])
-        nonzero_indices = row.nonzero()[1]
+    def target_indices(self, target_words):
+        """
+        Find the vocabulary indices of the target words. A target word preceded by 'ww' only matches that exact
+        word, any other target word matches all the words in the vocabulary that contain it.
 
-        start_time = time.time()
+        Parameters:
+        - target_words (list): The target words, with 'ww' before whole words.
 
-        # Use ProcessPoolExecutor for parallel processing
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-
-            process_partial = partial(process_context_word, vocabulary=vocabulary, row=row)
-
-            # Map the function to each non-zero index
-            results = executor.map(process_partial, nonzero_indices)
-
-        # Combine the results from each process into a single dictionary
-        for result in results:
-            for k, v in result.items():
-                if k in context_word_sum:
-                    context_word_sum[k] += v
-                else:
-                    context_word_sum[k] = v
-
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-
-        print(f"Time taken: {elapsed_time} seconds")
-
-    top_co_occurrences = []
-    # Convert the summed co-occurrences back to the required format
-    for context_word, sum_value in context_word_sum.items():
-        co_occurrence = {"word": context_word, "count": sum_value}
-        top_co_occurrences.append(co_occurrence)
-
-    # Sort the co-occurrences by count from higher to lower
-    top_co_occurrences.sort(key=lambda x: x["count"], reverse=True)
+        Returns:
+        - numpy.ndarray: Sorted unique indices of the extended target words.
+        """
+        indices = set()
+        ww_flag = False
+        for target_word in target_words:
+            # If the next target word is a whole word set the flag and move to next word
+            if target_word == 'ww':
+                ww_flag = True
+                continue
+            if ww_flag:
+                # If it's a whole word then it's only one case
+                if target_word in self.vocabulary:
+                    indices.add(self.vocabulary[target_word])
+                ww_flag = False
+            else:
+                # If not a whole word, find all words in the vocabulary that include the target word
+                indices.update(index for index, word in enumerate(self.words) if target_word in word)
+        return np.array(sorted(indices), dtype=np.int32)
+
+    def top_co_occurrences(self, target_words, maximum_co_occurrences=5000):
+        """
+        Get the context words that co-occur the most with the target words.
+
+        Parameters:
+        - target_words (list): The target words, with 'ww' before whole words.
+        - maximum_co_occurrences (int): Maximum number of context words to return.
+
+        Returns:
+        - list: Dictionaries with the 'word' and its 'count', from higher to lower count.
+        """
+        return self.top_co_occurrences_many([target_words], maximum_co_occurrences)[0]
+
+    def top_co_occurrences_many(self, target_words_sets, maximum_co_occurrences=5000):
+        """
+        Get the top co-occurrences of several sets of target words against the same matrix.
+
+        Parameters:
+        - target_words_sets (list): Lists of target words.
+        - maximum_co_occurrences (int): Maximum number of context words to return for each set.
+
+        Returns:
+        - list: One list of top co-occurrences for every set of target words.
+        """
+        vocabulary_size = len(self.words)
+        rows, columns = [], []
+        for set_index, target_words in enumerate(target_words_sets):
+            indices = self.target_indices(target_words)
+            rows.append(np.full(len(indices), set_index, dtype=np.int32))
+            columns.append(indices)
+
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+        columns = np.concatenate(columns) if columns else np.empty(0, dtype=np.int32)
+        selection = csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)),
+                               shape=(len(target_words_sets), vocabulary_size))
+
+        # Sum the rows of the target words of every set in one sparse product
+        summed_rows = selection @ self.co_occurrence_matrix
+        if self.delta_matrix is not None:
+            summed_rows = summed_rows + selection @ self.delta_matrix
+        summed_rows = summed_rows.tocsr()
+        summed_rows.eliminate_zeros()
+
+        results = []
+        for set_index in range(len(target_words_sets)):
+            start, end = summed_rows.indptr[set_index], summed_rows.indptr[set_index + 1]
+            counts = summed_rows.data[start:end]
+            indices = summed_rows.indices[start:end]
+
+            if len(counts) > maximum_co_occurrences:
+                top = np.argpartition(-counts, maximum_co_occurrences - 1)[:maximum_co_occurrences]
+                counts, indices = counts[top], indices[top]
+
+            # Sort the co-occurrences by count from higher to lower, ties in vocabulary order
+            order = np.lexsort((indices, -counts))
+            results.append([{"word": self.words[index], "count": int(count)}
+                            for index, count in zip(indices[order], counts[order])])
+        return results
 
-    # Limit the number of top co-occurrences to a maximum
-    top_co_occurrences = top_co_occurrences[:maximum_co_occurrences]
 
-    return top_co_occurrences
+def get_top_co_occurrences(co_occurrence_matrix, vocabulary, target_words, maximum_co_occurrences=5000):
+    """
+    Get the context words that co-occur the most with the target words.
+
+    Parameters:
+    - co_occurrence_matrix (scipy.sparse matrix): The co-occurrence matrix.
+    - vocabulary (dict): Mapping of words to their row/column index in the matrix.
+    - target_words (list): The target words, with 'ww' before whole words.
+    - maximum_co_occurrences (int): Maximum number of context words to return.
+
+    Returns:
+    - list: Dictionaries with the 'word' and its 'count', from higher to lower count.
+    """
+    query_engine = CoOccurrencesQueryEngine(co_occurrence_matrix, vocabulary)
+    return query_engine.top_co_occurrences(target_words, maximum_co_occurrences)
+
+
+def build_co_occurrences_matrix(token_ids_list, vocabulary_size, window_size):
+    """
+    Build the co-occurrence matrix of tokens already mapped to vocabulary ids.
+
+    All the neighborhoods are concatenated in a single array and, for every offset inside the window, the
+    (target, context) pairs are taken by shifting the array against itself, keeping only the pairs whose two tokens
+    belong to the same neighborhood. Duplicate pairs are summed into a CSR matrix with int32 indices and counts.
+
+    Parameters:
+    - token_ids_list (list): One int32 array of token ids per neighborhood.
+    - vocabulary_size (int): Size of the vocabulary.
+    - window_size (int): Number of tokens at each side of the target word counted as context.
+
+    Returns:
+    - scipy.sparse.csr_matrix: Co-occurrence matrix of shape (vocabulary_size, vocabulary_size).
+    """
+    shape = (vocabulary_size, vocabulary_size)
+    co_occurrence_matrix = csr_matrix(shape, dtype=np.int32)
+    if not token_ids_list:
+        return co_occurrence_matrix
+
+    token_ids = np.concatenate(token_ids_list).astype(np.int32, copy=False)
+    lengths = np.array([len(neighborhood_ids) for neighborhood_ids in token_ids_list])
+    neighborhood_of_token = np.repeat(np.arange(len(token_ids_list), dtype=np.int32), lengths)
+
+    for offset in range(1, min(window_size, len(token_ids) - 1) + 1):
+        same_neighborhood = neighborhood_of_token[offset:] == neighborhood_of_token[:-offset]
+        targets = token_ids[:-offset][same_neighborhood]
+        contexts = token_ids[offset:][same_neighborhood]
+        if not len(targets):
+            break
+
+        # Every pair is counted in both directions, as target and as context
+        rows = np.concatenate((targets, contexts))
+        columns = np.concatenate((contexts, targets))
+        counts = np.ones(len(rows), dtype=np.int32)
+        co_occurrence_matrix = co_occurrence_matrix + coo_matrix((counts, (rows, columns)), shape=shape).tocsr()
+
+    co_occurrence_matrix.sum_duplicates()
+    return co_occurrence_matrix
+
+
+def encode_tokens(tokens, vocabulary):
+    """
+    Map tokens to their vocabulary ids, adding the new tokens at the end of the vocabulary.
+
+    Parameters:
+    - tokens (list): The tokens.
+    - vocabulary (dict): Mapping of words to their row/column index in the matrix, extended in place.
+
+    Returns:
+    - numpy.ndarray: int32 array of token ids.
+    """
+    token_ids = np.empty(len(tokens), dtype=np.int32)
+    for i, token in enumerate(tokens):
+        token_id = vocabulary.get(token)
+        if token_id is None:
+            token_id = vocabulary[token] = len(vocabulary)
+        token_ids[i] = token_id
+    return token_ids
+
+
+# Metadata field checked by every metadata filter of the interface
+FILTERS_METADATA_FIELDS = {'Periodos': 'periodo', 'Entidad Territorial': 'entidad territorial',
+                           'Nacionalidad': 'nacionalidad'}
+
+
+def neighborhood_passes_filters(metadata, neighborhood, filters):
+    """
+    Check if a neighborhood is kept by the filters of the interface, following
+    data_utils.apply_filters_to_neighborhoods.
+
+    Parameters:
+    - metadata (dict): Metadata of the document of the neighborhood.
+    - neighborhood (str): Text of the neighborhood.
+    - filters (dict): Filters applied to the neighborhoods.
+
+    Returns:
+    - bool: True if the neighborhood passes all the filters.
+    """
+    for filter_name, values in (filters or {}).items():
+        if filter_name == 'Terms':
+            if ','.join(values) not in neighborhood:
+                return False
+        elif metadata.get(FILTERS_METADATA_FIELDS.get(filter_name, filter_name)) not in values:
+            return False
+    return True
+
+
+def iter_neighborhoods(neighborhoods_documents):
+    """
+    Iterate over the neighborhoods of some documents.
+
+    Parameters:
+    - neighborhoods_documents (dict or iterable): Documents with their neighborhoods, as a dictionary by document
+                                                  key or as any iterable of documents (for example a navigator's).
+
+    Returns:
+    - iterator: The neighborhoods' dictionaries.
+    """
+    if isinstance(neighborhoods_documents, dict):
+        neighborhoods_documents = neighborhoods_documents.values()
+    for content in neighborhoods_documents:
+        yield from content.get('neighborhoods', [])
 
 
 def extract_neighborhoods(filtered_neighborhoods_dictionary):
-    # Getting the neighborhoods data
-    neighborhoods_list = [content['neighborhoods'] for doc, content in filtered_neighborhoods_dictionary.items()]
-
-    # Flattening the neighborhoods list to a single list of dictionaries
-    neighborhoods = [neighborhood for neighborhoods_sublist in neighborhoods_list for neighborhood in
-                     neighborhoods_sublist]
-
-    return neighborhoods
+    # Flattening the neighborhoods of the documents to a single list of dictionaries
+    return list(iter_neighborhoods(filtered_neighborhoods_dictionary))
 
 
 class CoOccurrences:
@@ -131,9 +252,7 @@ class CoOccurrences:
     def __init__(self):
         self.StopWords = stopwords.StopWords()
         self.StopWords.set_stopwords()
-        client = MongoClient(config.mongo_connection)
-        self.db = client[config.mongo_database]
-
+        self.text_normalizer = text_normalization.TextNormalizer(self.StopWords.get_stopwords())
         self.context_word_sum = {}
 
     def fetch_top_co_occurrences_from_mongodb(self):
@@ -141,12 +260,11 @@ class CoOccurrences:
         co_occurrences_data_dict = {}
 
         # Iterate over collections whose names end with "co_occurrences"
-        for collection_name in self.db.list_collection_names():
-            if collection_name.endswith("_co_occurrences"):
-                co_occurrences_collection = self.db[collection_name]
-                # Assuming there is only one document in each collection
-                co_occurrences_data = co_occurrences_collection.find_one()
-                co_occurrences_data_dict[collection_name] = co_occurrences_data
+        for collection_name in db.co_occurrences_collection_names():
+            co_occurrences_collection = db.co_occurrences_collection(collection_name)
+            # Assuming there is only one document in each collection
+            co_occurrences_data = co_occurrences_collection.find_one()
+            co_occurrences_data_dict[collection_name] = co_occurrences_data
 
         # Check if any matching collections were found
         if co_occurrences_data_dict:
@@ -177,7 +295,7 @@ class CoOccurrences:
         if filters:
             co_occurrences_collection_name += '_' + '_'.join(['_'.join(v) for k, v in filters.items()])
         co_occurrences_collection_name += '_co_occurrences'
-        co_occurrences_collection = self.db[co_occurrences_collection_name]
+        co_occurrences_collection = db.co_occurrences_collection(co_occurrences_collection_name)
 
         # Drop the existing collection if it exists for replacement
         co_occurrences_collection.drop()
@@ -192,50 +310,142 @@ class CoOccurrences:
         co_occurrences_collection.insert_one(co_occurrences_data)
 
     def clean_tokenize_neighborhood(self, neighborhood):
-        neighborhood_lowercase = neighborhood.lower()
-        neighborhood_no_stopwords = self.StopWords.remove_stopwords(neighborhood_lowercase)
-        neighborhood_no_stopwords_filtered = utils.remove_accents(neighborhood_no_stopwords)
-        neighborhood_no_stopwords_filtered = utils.remove_non_letters(neighborhood_no_stopwords_filtered)
-        neighborhood_no_stopwords_filtered = self.StopWords.remove_stopwords(neighborhood_no_stopwords_filtered)
-
-        # Tokenize and remove words smaller than 3 letters
-        tokenized_neighborhood = [word for word in data_utils.tokenize(neighborhood_no_stopwords_filtered) if
-                                  len(word) >= 3]
-
-        return tokenized_neighborhood
-
-    def generate_co_occurrences_matrix(self, neighborhoods_dict, window_size=config.co_occurrence_neighborhood_size):
+        """
+        Get the words of a neighborhood counted in the co-occurrences.
+
+        Parameters:
+        - neighborhood (str): Text of the neighborhood, as read by the navigator with the corrections applied.
+
+        Returns:
+        - list: The lowercase words without accents, stopwords, non-letters or less than 3 letters.
+        """
+        return self.text_normalizer.normalize(neighborhood)
+
+    def get_co_occurrences_query_engine(self, collection_name, neighborhoods_documents,
+                                        window_size=config.co_occurrence_neighborhood_size, filters=None,
+                                        target_words=None):
+        """
+        Get a query engine over the co-occurrence matrix of a collection for a window size and some filters. The
+        matrix is only generated from the neighborhoods if no valid artifact has been saved for it.
+
+        Parameters:
+        - collection_name (str): Name of the neighborhoods' collection.
+        - neighborhoods_documents (dict or iterable): The (filtered) documents with their neighborhoods, only read
+                                                      when the matrix has to be generated.
+        - window_size (int): Size of the co-occurrence window.
+        - filters (dict, optional): Filters applied to the neighborhoods.
+        - target_words (list, optional): Target words the matrix is generated for.
+
+        Returns:
+        - CoOccurrencesQueryEngine: Query engine over the co-occurrence matrix.
+        """
+        artifacts = co_occurrence_store.get_co_occurrence_artifacts()
+        query_engine = artifacts.load(collection_name, window_size, filters)
+        if query_engine is None:
+            co_occurrence_matrix, vocabulary = self.generate_co_occurrences_matrix(neighborhoods_documents,
+                                                                                   window_size)
+            query_engine = artifacts.save(collection_name, window_size, filters, co_occurrence_matrix, vocabulary,
+                                          target_words)
+        return query_engine
+
+    def generate_co_occurrences_matrix(self, neighborhoods_documents,
+                                       window_size=config.co_occurrence_neighborhood_size):
 
         vocabulary = {}
 
-        neighborhoods = extract_neighborhoods(neighborhoods_dict)
-        print(len(neighborhoods))
-
-        row_indices, col_indices, data = [], [], []
+        window_size = int(window_size)
+        token_ids_list = []
+        neighborhoods_count = 0
 
-        for neighborhood_data in neighborhoods:
+        # The neighborhoods are read one document at a time
+        for neighborhood_data in iter_neighborhoods(neighborhoods_documents):
+            neighborhoods_count += 1
+            progress.advance()
             neighborhood = neighborhood_data.get('neighborhood', '')  # Extracting the 'neighborhood' field
             tokens = self.clean_tokenize_neighborhood(neighborhood)
 
-            for i, target_word in enumerate(tokens):
-                for j in range(max(0, i - window_size), min(len(tokens), i + window_size + 1)):
-                    if i != j:
-                        context_word = tokens[j]
-
-                        if target_word not in vocabulary:
-                            vocabulary[target_word] = len(vocabulary)
-
-                        if context_word not in vocabulary:
-                            vocabulary[context_word] = len(vocabulary)
-
-                        target_idx = vocabulary[target_word]
-                        context_idx = vocabulary[context_word]
+            # Only tokens that have some context word enter the vocabulary, in order of appearance
+            if window_size < 1 or len(tokens) < 2:
+                continue
 
-                        row_indices.append(target_idx)
-                        col_indices.append(context_idx)
-                        data.append(1)
+            token_ids_list.append(encode_tokens(tokens, vocabulary))
 
-        co_occurrence_matrix = coo_matrix((data, (row_indices, col_indices)),
-                                          shape=(len(vocabulary), len(vocabulary)))
+        print(f"Counted the co-occurrences of {neighborhoods_count} neighborhoods with {len(vocabulary)} words.")
+        co_occurrence_matrix = build_co_occurrences_matrix(token_ids_list, len(vocabulary), window_size)
 
         return co_occurrence_matrix, vocabulary
+
+    def update_co_occurrences(self, collection_name, removed_neighborhoods, added_neighborhoods):
+        """
+        Update the saved co-occurrence matrices of a collection after some of its neighborhoods changed, without
+        generating them again. Only the changed neighborhoods are tokenized: the counts of the removed ones are
+        subtracted and the counts of the added ones summed, for every window size and filters with a saved matrix.
+        The stored top co-occurrences of the matrices are refreshed too.
+
+        Parameters:
+        - collection_name (str): Name of the neighborhoods' collection.
+        - removed_neighborhoods (list): (metadata, neighborhood text) pairs of the old neighborhoods.
+        - added_neighborhoods (list): (metadata, neighborhood text) pairs of the new neighborhoods.
+        """
+        artifacts = co_occurrence_store.get_co_occurrence_artifacts()
+        artifacts_metadata = artifacts.metadata(collection_name)
+        if not artifacts_metadata or not (removed_neighborhoods or added_neighborhoods):
+            return
+
+        # Every neighborhood is tokenized once for all the matrices
+        neighborhoods_texts = list(dict.fromkeys(neighborhood for _, neighborhood in
+                                                 removed_neighborhoods + added_neighborhoods))
+        # The texts come from the stored neighborhoods, which keep the original tokens
+        overlay = corrections_overlay.get_corrections_overlay()
+        if overlay:
+            corrected_texts = [overlay.correct_text(text) for text in neighborhoods_texts]
+        else:
+            corrected_texts = neighborhoods_texts
+        tokenized = dict(zip(neighborhoods_texts, self.text_normalizer.normalize_many(corrected_texts)))
+
+        for meta in artifacts_metadata.values():
+            window_size, filters = meta['window_size'], meta['filters']
+            # The vocabulary is extended from the saved one, which no other process may change meanwhile
+            with artifacts.lock:
+                query_engine = artifacts.load(collection_name, window_size, filters)
+                if query_engine is None:
+                    continue
+                vocabulary = dict(query_engine.vocabulary)
+
+                token_ids_lists = []
+                for neighborhoods in (removed_neighborhoods, added_neighborhoods):
+                    token_ids_list = []
+                    for metadata, neighborhood in neighborhoods:
+                        tokens = tokenized[neighborhood]
+                        if window_size < 1 or len(tokens) < 2 or \
+                                not neighborhood_passes_filters(metadata, neighborhood, filters):
+                            continue
+                        token_ids_list.append(encode_tokens(tokens, vocabulary))
+                    token_ids_lists.append(token_ids_list)
+
+                removed_ids_list, added_ids_list = token_ids_lists
+                if not removed_ids_list and not added_ids_list:
+                    continue
+                delta_matrix = (build_co_occurrences_matrix(added_ids_list, len(vocabulary), window_size) -
+                                build_co_occurrences_matrix(removed_ids_list, len(vocabulary), window_size))
+
+                query_engine = artifacts.update(collection_name, window_size, filters, delta_matrix, vocabulary)
+            if query_engine is not None and meta['target_words']:
+                self.store_top_co_occurrences_in_mongodb(query_engine.top_co_occurrences(meta['target_words']),
+                                                         window_size, filters, meta['target_words'])
+
+
+_co_occurrences = None
+
+
+def get_co_occurrences():
+    """
+    Get the CoOccurrences instance of this process, used to maintain the saved co-occurrence matrices.
+
+    Returns:
+    - CoOccurrences: The shared instance.
+    """
+    global _co_occurrences
+    if _co_occurrences is None:
+        _co_occurrences = CoOccurrences()
+    return _co_occurrences
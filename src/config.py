@@ -4,13 +4,115 @@ NEIGHBORHOODS_DIR = Path("json/neighborhoods")
 JSON_DIR = Path("json/")
 CSV_DIR = Path("csv/")
 PDF_DIR = Path("/home/odrec/Documents/Korpus PDFs/")
+TOKEN_STORE_DIR = Path("token_store/")
+INVERTED_INDEX_DIR = Path("token_store/inverted_index/")
+CO_OCCURRENCES_DIR = Path("co_occurrences/")
 
 mongo_connection = 'mongodb://localhost:27017/'
 mongo_database = 'deeplecture'
 mongo_collection = 'corrected_all_text_data'
 corrections_collection_name = 'corrections'
+# Corrections already applied to the corpus, so applying the corrections again only applies the new ones
+applied_corrections_collection_name = 'applied_corrections'
+# 'overlay' applies the corrections while the corpus is read, until they are materialized in it, and 'rewrite' only
+# shows them once they have been applied to the texts of the corpus
+corrections_mode = 'overlay'
+# Seconds between checks for changes in the corrections applied as an overlay
+corrections_overlay_refresh_seconds = 5
+# Counts of documents and neighborhoods of every neighborhoods' collection, by metadata value
+neighborhood_statistics_collection_name = 'neighborhood_statistics'
+# Edits of neighborhoods not yet saved to the corpus, one entry per edited neighborhood
+edit_journal_collection_name = 'edit_journal'
+# Long operations queued by the interface and run by a worker process (python -m src.jobs)
+jobs_collection_name = 'jobs'
+# Start a worker process from the interface when jobs are queued and it has none running
+jobs_start_worker = True
+# Seconds between checks of the worker for queued jobs, and of the interface for the status of its jobs
+jobs_poll_seconds = 2
+# Minimum seconds between writes of the progress of a running job
+jobs_progress_interval_seconds = 1
+# Running jobs whose progress wasn't written for this long are considered abandoned and queued again
+jobs_stale_seconds = 600
+# Abandoned jobs that were already started this many times are marked as failed instead, so a job that kills its
+# worker isn't run forever
+jobs_max_attempts = 3
+# Connection pool and timeouts of the MongoDB client shared by the whole process
+mongo_max_pool_size = 50
+mongo_min_pool_size = 0
+mongo_max_idle_time_ms = 300_000
+mongo_connect_timeout_ms = 10_000
+mongo_server_selection_timeout_ms = 10_000
+mongo_socket_timeout_ms = None
+# MongoDB commands taking at least this long are printed
+mongo_slow_command_ms = 1000
+# Maximum number of operations sent to MongoDB in a single bulk write
+bulk_write_batch_size = 1000
 
 neighborhoods_size = 100
 co_occurrence_neighborhood_size = 11
 
+# Processes of the worker pool shared by the corpus operations, None for one per CPU
+worker_pool_size = None
+# Tasks after which a process of the worker pool is replaced by a new one, None to keep them
+worker_pool_max_tasks_per_child = None
+# Start method of the processes of the worker pool ('fork', 'forkserver' or 'spawn'), None for the default
+worker_pool_start_method = None
+# Maximum seconds to wait for the processes of the worker pool to start when warming it up
+worker_pool_warm_up_timeout_seconds = 60
 
+# Number of documents of a neighborhoods' collection kept in memory by each navigator of the interface
+navigator_cache_size = 16
+# Threads fetching the documents next to the displayed ones in the background
+navigator_prefetch_workers = 2
+# Number of documents read at once when all the documents of a navigator are needed
+navigator_batch_size = 500
+# Number of displayed texts whose highlighted terms and counts are kept
+highlighter_cache_size = 32
+# Number of sets of highlighted terms whose compiled highlighters are kept
+highlighter_terms_cache_size = 32
+# Number of tokens at each side of a term in keyword-in-context queries
+keyword_in_context_size = 10
+
+# Tokenizer of the texts: 'nltk' runs nltk.word_tokenize for Spanish and 'regex' gives the same tokens applying its
+# rules once to the whole text instead of once per sentence (see src/tokenizers.py). The rules of 'regex' are the ones
+# of nltk 3.8, so it stays opt-in until its tokens are checked against the installed nltk
+tokenizer_backend = 'nltk'
+# Read the tokens of the corpus documents from the token store instead of tokenizing them again
+use_token_store = True
+
+# Find the neighborhoods through the positional inverted index instead of scanning every document. The pipeline of
+# stream_neighborhoods below only applies when it is disabled
+use_inverted_index = True
+# Share of the corpus tokens that must have changed before the main segment of the inverted index is rebuilt
+inverted_index_rebuild_ratio = 0.1
+# Maximum number of tokens read at once from the token store while the main segment of the inverted index is built
+inverted_index_build_chunk_tokens = 10_000_000
+# Number of sequences (or terms) whose matching vocabulary terms are kept, so only the terms added to the vocabulary
+# since the last query are matched again
+inverted_index_matches_cache_size = 64
+
+# Collect the neighborhoods of a corpus scan as a pipeline (reading, processing and writing batches of documents at
+# the same time) so the memory used depends on the batch size and not on the size of the corpus. With the inverted
+# index, full rebuilds are written in batches of neighborhoods_batch_size documents instead
+stream_neighborhoods = True
+# Number of documents in every batch of the pipeline
+neighborhoods_batch_size = 200
+# Number of batches that can wait between two stages of the pipeline
+neighborhoods_queue_size = 4
+# Only send the IDs of every batch of documents to the worker processes, which read the documents and write their
+# results themselves, so the work of this process doesn't depend on the size of the documents. With the inverted
+# index, the positions of the hits of every batch are sent instead, and the workers slice the neighborhoods from the
+# token store
+workers_read_documents = True
+
+# Number of distinct tokens whose normalized words are kept when cleaning neighborhoods for the co-occurrences
+text_normalization_cache_size = 1_000_000
+
+# Number of corpus documents sent at once to the processes applying the corrections
+corrections_chunk_size = 200
+
+# Memory budget of the co-occurrence matrices kept loaded by the server
+co_occurrences_cache_bytes = 2 * 1024 ** 3
+
+# Share of the nonzero counts of a saved co-occurrence matrix its pending changes can reach before being merged into it
+co_occurrences_delta_ratio = 0.05
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import re
+import threading
+import time
+
+import src.config as config
+import src.db as db
+
+
+def corrections_version(corrections_dict):
+    """
+    Compute the version of a set of corrections.
+
+    Parameters:
+    - corrections_dict (dict): Dictionary mapping original terms to corrected terms.
+
+    Returns:
+    - str: Hexadecimal digest of the corrections.
+    """
+    description = json.dumps(sorted(corrections_dict.items()), ensure_ascii=False)
+    return hashlib.blake2b(description.encode('utf-8'), digest_size=12).hexdigest()
+
+
+class CorrectionsOverlay:
+    """
+    Corrections applied while the corpus is read, instead of rewriting the texts of the corpus.
+
+    Tokens are corrected with a dictionary lookup and texts with a single regular expression matching the original
+    terms as whole tokens. Tokens are matched as they are once corrected, but the neighborhoods keep the original
+    tokens and are corrected when they are read, so every text is corrected once.
+    """
+
+    def __init__(self, corrections_dict):
+        self.corrections = {original_term: corrected_term for original_term, corrected_term in corrections_dict.items()
+                            if original_term and original_term != corrected_term}
+        self.version = corrections_version(self.corrections)
+
+        # Longest terms first, so they are preferred where several terms start at the same position
+        alternatives = []
+        for original_term in sorted(self.corrections, key=len, reverse=True):
+            pattern = re.escape(original_term)
+            if re.match(r'\w', original_term):
+                pattern = r'(?<!\w)' + pattern
+            if re.search(r'\w$', original_term):
+                pattern += r'(?!\w)'
+            alternatives.append(pattern)
+        self.pattern = re.compile('|'.join(alternatives)) if alternatives else None
+
+    def __bool__(self):
+        return bool(self.corrections)
+
+    def correct_token(self, token):
+        """
+        Parameters:
+        - token (str): A token.
+
+        Returns:
+        - str: The corrected token.
+        """
+        return self.corrections.get(token, token)
+
+    def correct_text(self, text):
+        """
+        Parameters:
+        - text (str): A text, such as a document or a neighborhood.
+
+        Returns:
+        - str: The text with the original terms replaced by the corrected terms.
+        """
+        if self.pattern is None:
+            return text
+        corrections = self.corrections
+        return self.pattern.sub(lambda match: corrections[match.group()], text)
+
+
+_corrections_overlay = None
+_corrections_overlay_checked_at = 0.0
+_corrections_overlay_lock = threading.Lock()
+
+
+def get_corrections_overlay(refresh=False):
+    """
+    Get the corrections overlay of this process when the corrections are applied while reading
+    (config.corrections_mode is 'overlay'). The corrections are read again every
+    config.corrections_overlay_refresh_seconds, and the overlay is only compiled again if they changed.
+
+    Parameters:
+    - refresh (bool): Read the corrections now, for example right after they changed.
+
+    Returns:
+    - CorrectionsOverlay or None: The overlay, or None if the corrections are applied by rewriting the corpus.
+    """
+    global _corrections_overlay, _corrections_overlay_checked_at
+    if config.corrections_mode != 'overlay':
+        return None
+    with _corrections_overlay_lock:
+        now = time.monotonic()
+        if refresh or _corrections_overlay is None or \
+                now - _corrections_overlay_checked_at > config.corrections_overlay_refresh_seconds:
+            corrections_dict = {entry['Original term']: entry['Correct term']
+                                for entry in db.corrections_collection().find({}, {'_id': 0})}
+            corrections_dict = {original_term: corrected_term for original_term, corrected_term
+                                in corrections_dict.items() if original_term and original_term != corrected_term}
+            if _corrections_overlay is None or _corrections_overlay.version != corrections_version(corrections_dict):
+                _corrections_overlay = CorrectionsOverlay(corrections_dict)
+            _corrections_overlay_checked_at = now
+        return _corrections_overlay
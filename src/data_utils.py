@@ -1,27 +1,50 @@
-import nltk
 from pathlib import Path
-from src.config import mongo_connection, mongo_database, mongo_collection, corrections_collection_name
 import src.config as config
+import numpy as np
 import pandas as pd
 import src.control_widgets as cw
+import src.token_store as token_store
+import src.tokenizers as tokenizers
+import src.inverted_index as inverted_index
+import src.sequence_matcher as sequence_matcher
+import src.co_occurrence_store as co_occurrence_store
+import src.co_occurrences as co_occurrences
+import src.corrections_overlay as corrections_overlay
+import src.db as db
+import src.edit_journal as edit_journal
+import src.navigator as navigator
+import src.neighborhood_statistics as neighborhood_statistics
+import src.piece_table as piece_table
+import src.progress as progress
+import src.worker_pool as worker_pool
 import concurrent.futures
+import datetime
+import os
+import queue
+import threading
+import time
+from collections import deque
 from tqdm import tqdm
-from pymongo import MongoClient
+from pymongo import DeleteOne, InsertOne, UpdateOne
 import streamlit as st
 import re
 
 
-def tokenize(text):
+def tokenize_document(text):
     """
-        Tokenize the input text using NLTK's word_tokenize for the Spanish language.
+    Tokenize the text of a document, reading the tokens from the token store when it already holds that text.
 
-        Parameters:
-        - text (str): Input text.
+    Parameters:
+    - text (str): Text of the document.
 
-        Returns:
-        - list: List of tokens.
+    Returns:
+    - list: List of tokens.
     """
-    return nltk.word_tokenize(text, language='spanish')
+    if config.use_token_store:
+        tokens = token_store.get_token_store().lookup(text)
+        if tokens is not None:
+            return tokens
+    return tokenizers.tokenize(text)
 
 
 def keep_corrections_csv_clean(corrections_file_name='corrections.csv'):
@@ -62,43 +85,41 @@ def keep_corrections_csv_clean(corrections_file_name='corrections.csv'):
     return corrections_file_path
 
 
+def metadata_query(metadata_filters):
+    """
+    Build the query on the documents of a neighborhoods' collection for some metadata filters, answered with the
+    indexes on the metadata fields.
+
+    Parameters:
+    - metadata_filters (dict): Selected values by metadata field. Fields without values aren't filtered.
+
+    Returns:
+    - dict: The MongoDB query.
+    """
+    return {f'metadata.{field}': {'$in': list(values)} for field, values in metadata_filters.items() if values}
+
+
 def apply_filters_to_neighborhoods():
     """
     Apply metadata and term filters to the documents and update the session state accordingly.
     """
     cw.enable_neighborhoods_widgets()
 
-    # Apply metadata filters to the documents
-    st.session_state.filtered_docs = {}
-    for doc_id, doc in st.session_state.hoods_docs.items():
-        metadata = doc.get('metadata', {})
-        if (not st.session_state.selected_nacionalidad or metadata.get(
-                'nacionalidad') in st.session_state.selected_nacionalidad) and \
-                (not st.session_state.selected_entidad_territorial or metadata.get(
-                    'entidad territorial') in st.session_state.selected_entidad_territorial) and \
-                (not st.session_state.selected_periodo or metadata.get('periodo') in st.session_state.selected_periodo):
-            st.session_state.filtered_docs[doc_id] = doc
+    query = metadata_query({'nacionalidad': st.session_state.selected_nacionalidad,
+                            'entidad territorial': st.session_state.selected_entidad_territorial,
+                            'periodo': st.session_state.selected_periodo})
 
     st.session_state.filters = {}
 
-    # Apply term filter do the documents
+    # Apply the filters in MongoDB, which also filters the neighborhoods of every document by the term
     # TODO: manage whole words and multiple filter words
-    if st.session_state.filter_by_term != "":
-        filtered_by_term_dict = {}
-        for doc_id, doc in st.session_state.filtered_docs.items():
-            for hood in doc.get('neighborhoods', []):
-                if st.session_state.filter_by_term in hood['neighborhood']:
-                    if doc_id not in filtered_by_term_dict:
-                        filtered_by_term_dict[doc_id] = {'neighborhoods': [], 'unique_terms': doc['unique_terms'],
-                                                         'metadata': doc['metadata'],
-                                                         'hoods_sequences': doc['hoods_sequences'],
-                                                         'hoods:size': doc['hoods_size']}
-                    filtered_by_term_dict[doc_id]['neighborhoods'].append(hood)
-
-        st.session_state.filtered_docs = filtered_by_term_dict
-        st.session_state.filters['Terms'] = st.session_state.filter_by_term.split(',')
-
-    st.session_state.filtered_keys = list(st.session_state.filtered_docs.keys())
+    term = st.session_state.filter_by_term
+    st.session_state.navigator = navigator.NeighborhoodsNavigator.from_collection(
+        st.session_state.selected_collection, query, term)
+    if term != "":
+        st.session_state.filters['Terms'] = term.split(',')
+
+    st.session_state.filtered_keys = st.session_state.navigator.document_ids
     st.session_state.docs_count = 0
     st.session_state.hoods_count = 0
 
@@ -110,13 +131,47 @@ def apply_filters_to_neighborhoods():
         st.session_state.filters['Nacionalidad'] = st.session_state.selected_nacionalidad
 
 
+def get_neighborhood_statistics(collection_name):
+    """
+    Retrieves the document and neighborhood counts of a neighborhoods' collection, by metadata value.
+
+    Parameters:
+    - collection_name (str): The name of the neighborhoods' collection.
+
+    Returns:
+    - dict: The statistics of the collection.
+    """
+    return neighborhood_statistics.get_statistics(collection_name)
+
+
+def term_matches_sequences(term, sequences_list):
+    """
+    Check if a term matches any of the sequences used to collect neighborhoods. Sequences between double quotes
+    must appear as whole words in the term, any other sequence just needs to be part of it. This is the reference
+    implementation of the rules, neighborhoods are collected with the compiled sequence_matcher.SequencesMatcher.
+
+    Parameters:
+    - term (str): The term (token) to check.
+    - sequences_list (list): List of sequences.
+
+    Returns:
+    - bool: True if the term matches any sequence.
+    """
+    for sequence in sequences_list:
+        if (sequence.startswith('"') and sequence.endswith('"') and
+            re.search(rf'\b{re.escape(sequence[1:-1])}\b', term)) or (
+                sequence not in {'"', "'"} and sequence in term):
+            return True
+    return False
+
+
 def extract_neighborhoods(key, value, sequences_list, size):
     """
     Extract neighborhoods from a document based on given sequences.
 
     Parameters:
     - key (str): Document key.
-    - value (dict): Document content.
+    - value (dict): Document content. If it has a 'tokens' field those tokens are used instead of the 'text'.
     - sequences_list (list): List of sequences to search for neighborhoods.
     - size (int): The size of neighborhoods.
 
@@ -124,36 +179,70 @@ def extract_neighborhoods(key, value, sequences_list, size):
     - tuple: Document key, extracted neighborhoods, metadata, and unique terms.
     """
     # Tokenize the content
-    tokenized_content = tokenize(value['text'])
-    unique_terms = set()
+    if 'tokens' in value:
+        tokenized_content = value['tokens']
+    else:
+        tokenized_content = tokenize_document(value['text'])
 
-    neighborhoods = []
-    for i, term in enumerate(tokenized_content):
-        for sequence in sequences_list:
-            if (sequence.startswith('"') and sequence.endswith('"') and
-                re.search(rf'\b{re.escape(sequence[1:-1])}\b', term)) or (
-                    sequence not in {'"', "'"} and sequence in term):
-                # Calculate the indices for the neighborhood
-                start_index = max(0, i - size)
-                end_index = min(len(tokenized_content), i + size + 1)
+    # Compiled once per process for the sequences of the current collection request
+    matcher = corrected_matcher(sequence_matcher.get_sequences_matcher(tuple(sequences_list)))
+    neighborhoods, unique_terms = extract_neighborhoods_from_tokens(tokenized_content, matcher, size)
 
-                # Extract the neighborhood
-                neighborhood = " ".join(tokenized_content[start_index:end_index])
+    return key, neighborhoods, {'doc_total_words': len(tokenized_content),
+                                **value.get('metadata', {})}, unique_terms
 
-                neighborhoods.append({
-                    'neighborhood': neighborhood,
-                    'start_index': start_index,
-                    'end_index': end_index,
-                    'edited': False
-                })
 
-                # Add the term to unique_terms
-                unique_terms.add(term)
+def corrected_matcher(matcher):
+    """
+    Match the tokens as they are once corrected, when the corrections are applied as an overlay. The neighborhoods
+    keep the original tokens and are only corrected where they are read, so the corrections are applied once.
 
-                break
+    Parameters:
+    - matcher (SequencesMatcher): Matcher of the sequences to search for neighborhoods.
 
-    return key, neighborhoods, {'doc_total_words': len(tokenized_content),
-                                **value.get('metadata', {})}, unique_terms
+    Returns:
+    - callable: The matcher of the corrected tokens.
+    """
+    overlay = corrections_overlay.get_corrections_overlay()
+    if not overlay:
+        return matcher
+    return lambda term: matcher(overlay.correct_token(term))
+
+
+def extract_neighborhoods_from_tokens(tokenized_content, matcher, size):
+    """
+    Extract the neighborhoods around the tokens matched by a sequences matcher.
+
+    Parameters:
+    - tokenized_content (list): Tokens of the document.
+    - matcher (SequencesMatcher): Matcher of the sequences to search for neighborhoods.
+    - size (int): The size of neighborhoods.
+
+    Returns:
+    - tuple: Extracted neighborhoods and the set of matched terms.
+    """
+    unique_terms = set()
+    neighborhoods = []
+    for i, term in enumerate(tokenized_content):
+        if matcher(term):
+            # Calculate the indices for the neighborhood
+            start_index = max(0, i - size)
+            end_index = min(len(tokenized_content), i + size + 1)
+
+            # Extract the neighborhood
+            neighborhood = " ".join(tokenized_content[start_index:end_index])
+
+            neighborhoods.append({
+                'neighborhood': neighborhood,
+                'start_index': start_index,
+                'end_index': end_index,
+                'edited': False
+            })
+
+            # Add the term to unique_terms
+            unique_terms.add(term)
+
+    return neighborhoods, unique_terms
 
 
 def process_document(document, sequences_list, size):
@@ -161,7 +250,8 @@ def process_document(document, sequences_list, size):
     Process a document, extracting neighborhoods based on given sequences.
 
     Parameters:
-    - document (dict): The document to process.
+    - document (dict): The document to process. If it comes without its 'text' the tokens are read from the
+                       token store.
     - sequences_list (list): List of sequences to search for neighborhoods.
     - size (int): The size of neighborhoods.
 
@@ -169,54 +259,400 @@ def process_document(document, sequences_list, size):
     - tuple: Extracted neighborhoods and related information.
     """
     key, value = document['_id'], document
+    if 'text' not in value:
+        value = {**value, 'tokens': token_store.get_token_store().get_tokens(key)}
     return extract_neighborhoods(key, value, sequences_list, size)
 
 
+def find_index_hits(sequences_list, document_ids=None):
+    """
+    Find the positions of the sequences in the documents through the positional inverted index. Only the
+    vocabulary is matched against the sequences, so the cost depends on the number of hits and not on the size of
+    the corpus.
+
+    Parameters:
+    - sequences_list (list): List of sequences to search for.
+    - document_ids (list, optional): Only find the hits of these documents. Every one of them is included, with no
+                                     positions if it has no hits, so its old neighborhoods are removed.
+
+    Returns:
+    - tuple: The token store and the positions of the hits by document ID.
+    """
+    store = token_store.get_token_store()
+    if document_ids:
+        store.sync_with_corpus(document_ids)
+    else:
+        store.sync_missing_from_corpus()
+
+    index = inverted_index.get_inverted_index()
+    overlay = corrections_overlay.get_corrections_overlay()
+    # The terms matching the sequences depend on the corrections too
+    term_ids = index.matching_term_ids(corrected_matcher(sequence_matcher.SequencesMatcher(sequences_list)),
+                                       key=('sequences', tuple(sequences_list), overlay.version if overlay else None))
+    hits = index.positions(term_ids)
+
+    if document_ids:
+        selected_ids = {str(document_id) for document_id in document_ids}
+        hits = {document_id: positions for document_id, positions in hits.items() if document_id in selected_ids}
+        # Selected documents without hits are kept without neighborhoods, so the ones they had are removed
+        for document_id in selected_ids - hits.keys():
+            hits[document_id] = np.empty(0, dtype=np.int32)
+
+    return store, hits
+
+
+def neighborhoods_from_hits(store, hits, sequences_list, size):
+    """
+    Slice the neighborhoods around the hits of some documents from the token store.
+
+    Parameters:
+    - store (token_store.TokenStore): The token store.
+    - hits (dict): Positions of the hits by document ID.
+    - sequences_list (list): List of sequences the hits were found for.
+    - size (int): The size of neighborhoods.
+
+    Returns:
+    - dict: Extracted neighborhoods, unique terms and metadata by document key, as produced by extract_neighborhoods.
+    """
+    documents_collection = db.corpus_collection()
+    documents_metadata = {str(document['_id']): (document['_id'], document.get('metadata', {}))
+                          for document in documents_collection.find({'_id': {'$in': list(hits.keys())}},
+                                                                    {'_id': 1, 'metadata': 1})}
+
+    neighborhoods = {}
+    for document_id, positions in hits.items():
+        progress.advance()
+        if document_id not in documents_metadata or document_id not in store:
+            continue
+        key, metadata = documents_metadata[document_id]
+        token_ids = store.get_ids(document_id)
+        document_length = len(token_ids)
+
+        document_neighborhoods = []
+        unique_terms = set()
+        for position in positions.tolist():
+            start_index = max(0, position - size)
+            end_index = min(document_length, position + size + 1)
+            document_neighborhoods.append({
+                'neighborhood': " ".join(store.decode(token_ids[start_index:end_index])),
+                'start_index': start_index,
+                'end_index': end_index,
+                'edited': False
+            })
+            unique_terms.add(store.decode(token_ids[position:position + 1])[0])
+
+        neighborhoods[key] = {
+            'neighborhoods': document_neighborhoods,
+            'unique_terms': list(unique_terms),
+            'metadata': {'doc_total_words': document_length, **metadata},
+            'hoods_sequences': sequences_list,
+            'hoods_size': size
+        }
+
+    return neighborhoods
+
+
+def collect_neighborhoods_from_index(sequences_list, size, document_ids=None):
+    """
+    Collect neighborhoods using the positional inverted index. The windows around the hits are sliced from the
+    token store, so the cost depends on the number of hits and not on the size of the corpus.
+
+    Parameters:
+    - sequences_list (list): List of sequences to search for neighborhoods.
+    - size (int): The size of neighborhoods.
+    - document_ids (list, optional): Only collect the neighborhoods of these documents.
+
+    Returns:
+    - dict: Extracted neighborhoods, unique terms and metadata by document key, as produced by extract_neighborhoods.
+    """
+    store, hits = find_index_hits(sequences_list, document_ids)
+    progress.stage('Collecting neighborhoods', len(hits))
+    return neighborhoods_from_hits(store, hits, sequences_list, size)
+
+
+def collect_neighborhoods_from_hits(hits, sequences_list, size, neighborhood_collection_name):
+    """
+    Slice the neighborhoods around the hits of a batch of documents from the token store and insert them into the
+    staging collection of the neighborhoods' collection being rebuilt, in a process of the worker pool.
+
+    Parameters:
+    - hits (dict): Positions of the hits by document ID.
+    - sequences_list (list): List of sequences the hits were found for.
+    - size (int): The size of neighborhoods.
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection being rebuilt.
+
+    Returns:
+    - tuple: Number of documents read and of documents inserted.
+    """
+    neighborhoods = neighborhoods_from_hits(token_store.get_token_store(), hits, sequences_list, size)
+    return len(hits), write_neighborhoods_to_staging(neighborhoods, neighborhood_collection_name)
+
+
+def stream_neighborhoods_from_index(neighborhood_collection_name, sequences_list, size):
+    """
+    Rebuild a neighborhoods' collection using the positional inverted index, writing the neighborhoods of every
+    config.neighborhoods_batch_size documents with hits to the staging collection as soon as they are sliced, so
+    the neighborhoods of the whole corpus are never held in memory at once. With config.workers_read_documents the
+    batches are sliced and written by the worker pool, and this process only finds the hits.
+
+    Parameters:
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection being rebuilt.
+    - sequences_list (list): List of sequences to search for neighborhoods.
+    - size (int): The size of neighborhoods.
+
+    Returns:
+    - int: Number of documents written.
+    """
+    start_time = time.time()
+    store, hits = find_index_hits(sequences_list)
+    hits = list(hits.items())
+    batch_size = config.neighborhoods_batch_size
+
+    progress.stage('Collecting neighborhoods', len(hits))
+    if config.workers_read_documents:
+        # The workers read the tokens from their own token store, so only the positions of the hits are sent
+        batches = ((dict(hits[start:start + batch_size]), sequences_list, size, neighborhood_collection_name)
+                   for start in range(0, len(hits), batch_size))
+        _, written = rebuild_neighborhoods_in_workers(neighborhood_collection_name, collect_neighborhoods_from_hits,
+                                                      batches)
+    else:
+        begin_neighborhoods_rebuild(neighborhood_collection_name)
+        try:
+            written = 0
+            for start in range(0, len(hits), batch_size):
+                neighborhoods = neighborhoods_from_hits(store, dict(hits[start:start + batch_size]), sequences_list,
+                                                        size)
+                written += write_neighborhoods_to_staging(neighborhoods, neighborhood_collection_name)
+        except Exception:
+            abort_neighborhoods_rebuild(neighborhood_collection_name)
+            raise
+        finish_neighborhoods_rebuild(neighborhood_collection_name)
+
+    elapsed_time = time.time() - start_time
+    print(f"Inserted {written} documents in collection {neighborhood_collection_name} in {elapsed_time:.2f} seconds "
+          f"({written / max(elapsed_time, 1e-9):.1f} documents/second).")
+    return written
+
+
+def keyword_in_context(term, size=config.keyword_in_context_size, whole_word=False):
+    """
+    Find the occurrences of a term in the corpus together with their context, using the positional inverted index.
+    The search ignores case.
+
+    Parameters:
+    - term (str): The term to search for.
+    - size (int): Number of tokens to show at each side of the term.
+    - whole_word (bool): Only match tokens that are exactly the term instead of tokens that contain it.
+
+    Returns:
+    - list: Dictionaries with the 'document', 'position', matched 'term' and 'neighborhood' of every occurrence.
+    """
+    store = token_store.get_token_store()
+    store.sync_missing_from_corpus()
+    index = inverted_index.get_inverted_index()
+
+    term = term.lower()
+    if whole_word:
+        term_ids = index.matching_term_ids(lambda vocabulary_term: vocabulary_term.lower() == term,
+                                           key=('whole_word', term))
+    else:
+        term_ids = index.matching_term_ids(lambda vocabulary_term: term in vocabulary_term.lower(),
+                                           key=('substring', term))
+
+    occurrences = []
+    for document_id, positions in sorted(index.positions(term_ids).items()):
+        token_ids = store.get_ids(document_id)
+        for position in positions.tolist():
+            start_index = max(0, position - size)
+            occurrences.append({
+                'document': document_id,
+                'position': position,
+                'term': store.vocabulary[token_ids[position]],
+                'neighborhood': " ".join(store.decode(token_ids[start_index:position + size + 1]))
+            })
+
+    return occurrences
+
+
+def staging_collection_name(neighborhood_collection_name):
+    """
+    Get the name of the collection where a neighborhoods' collection is rebuilt before replacing it. The name
+    doesn't end with 'neighborhoods', so the staging collection is never listed as a neighborhoods' collection.
+
+    Parameters:
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection.
+
+    Returns:
+    - str: Name of the staging collection.
+    """
+    return f'{neighborhood_collection_name}__staging'
+
+
+def neighborhoods_document(key, result):
+    """
+    Build the MongoDB document of the neighborhoods of a corpus document.
+
+    Parameters:
+    - key (str): Document key.
+    - result (dict): Extracted neighborhoods, unique terms and metadata of the document.
+
+    Returns:
+    - dict: The document without its '_id'.
+    """
+    return {
+        'neighborhoods': result['neighborhoods'],
+        'unique_terms': result['unique_terms'],
+        'metadata': result['metadata'],
+        'hoods_sequences': result['hoods_sequences'],
+        'hoods_size': result['hoods_size']
+    }
+
+
+def bulk_write_in_batches(collection, operations, batch_size=None):
+    """
+    Send write operations to a collection as unordered bulk writes of a limited number of operations.
+
+    Parameters:
+    - collection (pymongo.collection.Collection): The collection.
+    - operations (iterable): pymongo write operations (InsertOne, UpdateOne...).
+    - batch_size (int, optional): Operations per bulk write. Defaults to config.bulk_write_batch_size.
+
+    Returns:
+    - int: Number of operations sent.
+    """
+    batch_size = batch_size or config.bulk_write_batch_size
+    sent = 0
+    batch = []
+    for operation in operations:
+        batch.append(operation)
+        if len(batch) == batch_size:
+            collection.bulk_write(batch, ordered=False)
+            sent += len(batch)
+            batch = []
+    if batch:
+        collection.bulk_write(batch, ordered=False)
+        sent += len(batch)
+    return sent
+
+
+def begin_neighborhoods_rebuild(neighborhood_collection_name):
+    """
+    Prepare an empty staging collection to rebuild a neighborhoods' collection into.
+
+    Parameters:
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection.
+    """
+    db.get_collection(staging_collection_name(neighborhood_collection_name)).drop()
+
+
+def write_neighborhoods_to_staging(neighborhoods, neighborhood_collection_name):
+    """
+    Insert neighborhoods into the staging collection of a neighborhoods' collection being rebuilt.
+
+    Parameters:
+    - neighborhoods (dict): Extracted neighborhoods.
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection.
+
+    Returns:
+    - int: Number of documents inserted.
+    """
+    staging_collection = db.get_collection(staging_collection_name(neighborhood_collection_name))
+
+    # Only documents with neighborhoods are inserted
+    return bulk_write_in_batches(staging_collection,
+                                 (InsertOne({'_id': key, **neighborhoods_document(key, result)})
+                                  for key, result in neighborhoods.items() if result['neighborhoods']))
+
+
+def finish_neighborhoods_rebuild(neighborhood_collection_name):
+    """
+    Replace a neighborhoods' collection with its completely written staging collection in a single rename, so
+    readers see either the old or the new collection but never a partial one.
+
+    Parameters:
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection.
+    """
+    database = db.get_database()
+    staging_name = staging_collection_name(neighborhood_collection_name)
+
+    # The saved co-occurrence matrices and the edits of the collection are no longer valid
+    co_occurrence_store.get_co_occurrence_artifacts().invalidate_collection(neighborhood_collection_name)
+    edit_journal.remove_edits(collection_name=neighborhood_collection_name)
+
+    if staging_name in database.list_collection_names():
+        database[staging_name].rename(neighborhood_collection_name, dropTarget=True)
+        # The staging collection is written without indexes, they are built once it is complete
+        db.ensure_neighborhoods_indexes(neighborhood_collection_name, force=True)
+    else:
+        # No document had neighborhoods
+        db.neighborhoods_collection(neighborhood_collection_name).drop()
+
+
+def abort_neighborhoods_rebuild(neighborhood_collection_name):
+    """
+    Drop the staging collection of a failed rebuild, leaving the neighborhoods' collection untouched.
+
+    Parameters:
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection.
+    """
+    begin_neighborhoods_rebuild(neighborhood_collection_name)
+
+
 def insert_neighborhoods_to_mongo(neighborhoods, neighborhood_collection_name, document_ids=None):
     """
     Insert or update neighborhoods into the MongoDB collection.
 
+    The updated documents are sent as unordered bulk upserts. A full insertion rebuilds the collection in a
+    staging collection that replaces it once complete.
+
     Parameters:
     - neighborhoods (dict): Extracted neighborhoods.
     - neighborhood_collection_name (str): Name of the MongoDB collection to store neighborhoods.
     - document_ids (list): List of document IDs to update.
-    """
-    client = MongoClient(mongo_connection)
-    db = client[mongo_database]
 
-    neighborhood_coll = db[neighborhood_collection_name]
+    Returns:
+    - int: Number of documents written.
+    """
+    neighborhood_coll = db.neighborhoods_collection(neighborhood_collection_name)
+    start_time = time.time()
 
     if document_ids:
-        for key in tqdm(neighborhoods, desc="Updating Document"):
-            result = neighborhoods[key]
-            # Check if neighborhoods are present before updating
-            if result['neighborhoods']:
-                neighborhood_coll.update_one({'_id': key}, {
-                    '$set': {
-                        'neighborhoods': result['neighborhoods'],
-                        'unique_terms': result['unique_terms'],
-                        'metadata': result['metadata'],
-                        'hoods_sequences': result['hoods_sequences'],
-                        'hoods_size': result['hoods_size']
-                    }
-                })
+        # Old neighborhoods of the updated documents, to update the saved co-occurrence matrices incrementally
+        updated_keys = [key for key in neighborhoods if neighborhoods[key]['neighborhoods']]
+        old_documents = {document['_id']: document for document in
+                         neighborhood_coll.find({'_id': {'$in': list(neighborhoods.keys())}},
+                                                {'neighborhoods.neighborhood': 1, 'metadata': 1})}
+
+        # Documents that no longer have neighborhoods are removed from the collection
+        operations = [UpdateOne({'_id': key}, {'$set': neighborhoods_document(key, neighborhoods[key])}, upsert=True)
+                      for key in updated_keys]
+        operations += [DeleteOne({'_id': key}) for key in neighborhoods
+                       if not neighborhoods[key]['neighborhoods'] and key in old_documents]
+        written = bulk_write_in_batches(neighborhood_coll, operations)
+
+        removed_neighborhoods = [(document.get('metadata', {}), hood['neighborhood'])
+                                 for document in old_documents.values() for hood in document.get('neighborhoods', [])]
+        added_neighborhoods = [(neighborhoods[key]['metadata'], hood['neighborhood'])
+                               for key in updated_keys for hood in neighborhoods[key]['neighborhoods']]
+        co_occurrences.get_co_occurrences().update_co_occurrences(neighborhood_collection_name,
+                                                                  removed_neighborhoods, added_neighborhoods)
+        # The collected neighborhoods replace the edited ones
+        edit_journal.remove_edits(list(neighborhoods.keys()), neighborhood_collection_name)
+        mode = 'Updated'
     else:
-        # Drop the existing collection if it exists for replacement
-        neighborhood_coll.drop()
-
-        # Insert neighborhoods into the collection
-        for key in tqdm(neighborhoods, desc="Inserting Neighborhoods"):
-            result = neighborhoods[key]
-            # Check if neighborhoods are present before inserting
-            if result['neighborhoods']:
-                neighborhood_coll.insert_one({
-                    '_id': key,
-                    'neighborhoods': result['neighborhoods'],
-                    'unique_terms': result['unique_terms'],
-                    'metadata': result['metadata'],
-                    'hoods_sequences': result['hoods_sequences'],
-                    'hoods_size': result['hoods_size']
-                })
+        begin_neighborhoods_rebuild(neighborhood_collection_name)
+        try:
+            written = write_neighborhoods_to_staging(neighborhoods, neighborhood_collection_name)
+        except Exception:
+            abort_neighborhoods_rebuild(neighborhood_collection_name)
+            raise
+        finish_neighborhoods_rebuild(neighborhood_collection_name)
+        mode = 'Inserted'
+
+    elapsed_time = time.time() - start_time
+    print(f"{mode} {written} documents in collection {neighborhood_collection_name} in {elapsed_time:.2f} seconds "
+          f"({written / max(elapsed_time, 1e-9):.1f} documents/second).")
+    return written
 
 
 def collect_neighborhoods_mongo_parallel(sequences_list, size, document_ids=None, all_collections=False, info=True):
@@ -237,96 +673,81 @@ def collect_neighborhoods_mongo_parallel(sequences_list, size, document_ids=None
     import time
     start_time = time.time()  # Record start time
 
-    client = MongoClient(mongo_connection)
-    db = client[mongo_database]
-    documents_collection = db[mongo_collection]
-
-    collections_names = []
-
     if all_collections:
-        # Get all collections
-        all_collections = db.list_collection_names()
-
-        # Iterate over collections
-        for collection_name in all_collections:
-            if collection_name.endswith('neighborhoods'):
-                neighborhoods_collection = db[collection_name]
-
-                # Extract sequences_list and size from one of the documents
-                query = {"_id": {"$in": [doc_id for doc_id in document_ids]}}
-                collection_info = neighborhoods_collection.find_one(query,
-                                                                    {'hoods_sequences': 1, 'hoods_size': 1})
-
-                if collection_info:
-                    current_sequences_list = collection_info.get('hoods_sequences', [])
-                    current_size = collection_info.get('hoods_size', size)
+        # Every document is read and tokenized once for all the collections
+        collections_names = refresh_neighborhoods_all_collections(document_ids or [], size)
+        print(f"Total time taken: {time.time() - start_time} seconds.")
+        # Maybe there is no collection to refresh so return None
+        return collections_names[0] if collections_names else None
 
-                    collections_names.append({
-                        'collection_name': collection_name,
-                        'sequences_list': current_sequences_list,
-                        'size': current_size
-                    })
+    documents_collection = db.corpus_collection()
 
-    else:
-        # Modify collection_suffix based on the presence of whole word sequences
-        collection_suffix = '_'.join(
-            [f'ww_{seq.strip()[1:-1]}' if seq.strip().startswith('"') and seq.strip().endswith('"') else seq.strip()
-             for seq in sequences_list])
+    # Modify collection_suffix based on the presence of whole word sequences
+    collection_suffix = '_'.join(
+        [f'ww_{seq.strip()[1:-1]}' if seq.strip().startswith('"') and seq.strip().endswith('"') else seq.strip()
+         for seq in sequences_list])
 
-        # Create a new collection for neighborhoods
-        collections_names = [{'collection_name': f'{collection_suffix}_neighborhoods'}]
+    # Create a new collection for neighborhoods
+    collections_names = [{'collection_name': f'{collection_suffix}_neighborhoods'}]
 
     for collection_info in collections_names:
         neighborhood_collection_name = collection_info['collection_name']
         current_sequences_list = collection_info.get('sequences_list', sequences_list)
         current_size = collection_info.get('size', size)
-
-        # Retrieve documents from MongoDB
-        if document_ids:
-            documents_content = []
-            for document_id in document_ids:
-                documents_content.append(
-                    documents_collection.find_one({'_id': document_id},
-                                                  {'_id': 1, 'text': 1, 'metadata': 1}))
-                if info:
-                    st.info(f"Collecting neighborhoods for document {document_id} "
-                            f"on collection {neighborhood_collection_name}...")
-                    print(f"Collecting neighborhoods for document {document_id} "
-                          f"on collection {neighborhood_collection_name}...")
-        else:
-            documents_content = list(documents_collection.find({}, {'_id': 1, 'text': 1, 'metadata': 1}))
-            st.info("Collecting neighborhoods...")
-            print("Collecting neighborhoods...")
-
         current_sequences_list = [seq.strip() for seq in current_sequences_list]
-        # Parallelize processing using ProcessPoolExecutor
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-            futures = [executor.submit(process_document, document, current_sequences_list, current_size)
-                       for document in documents_content]
 
-            neighborhoods = {}
+        # The inverted index takes precedence, the documents are only scanned (by the workers or the pipeline) when
+        # it is disabled. Its rebuilds are written by the workers too with config.workers_read_documents
+        if config.use_token_store and config.use_inverted_index and config.stream_neighborhoods and not document_ids:
+            if info:
+                st.info(f"Collecting and inserting neighborhoods on collection {neighborhood_collection_name}...")
+                print(f"Collecting and inserting neighborhoods on collection {neighborhood_collection_name}...")
+            # The neighborhoods are written in batches as they are sliced from the token store
+            stream_neighborhoods_from_index(neighborhood_collection_name, current_sequences_list, current_size)
+            neighborhoods = None
+        elif config.use_token_store and config.use_inverted_index:
+            if info:
+                st.info(f"Collecting neighborhoods on collection {neighborhood_collection_name}...")
+                print(f"Collecting neighborhoods on collection {neighborhood_collection_name}...")
+            neighborhoods = collect_neighborhoods_from_index(current_sequences_list, current_size, document_ids)
+        elif config.workers_read_documents and not document_ids:
+            if info:
+                st.info(f"Collecting and inserting neighborhoods on collection {neighborhood_collection_name}...")
+                print(f"Collecting and inserting neighborhoods on collection {neighborhood_collection_name}...")
+            # The workers read the documents and insert the neighborhoods themselves
+            collect_neighborhoods_in_workers(documents_collection, neighborhood_collection_name,
+                                             current_sequences_list, current_size)
+            neighborhoods = None
+        elif config.stream_neighborhoods:
+            if info:
+                st.info(f"Collecting and inserting neighborhoods on collection {neighborhood_collection_name}...")
+                print(f"Collecting and inserting neighborhoods on collection {neighborhood_collection_name}...")
+            # The pipeline inserts the neighborhoods itself as every batch is finished
+            stream_neighborhoods_to_mongo(documents_collection, neighborhood_collection_name,
+                                          current_sequences_list, current_size, document_ids)
+            neighborhoods = None
+        else:
+            neighborhoods = collect_neighborhoods_from_documents(documents_collection, neighborhood_collection_name,
+                                                                 current_sequences_list, current_size,
+                                                                 document_ids, info)
 
-            for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures),
-                               desc=f"Processing Documents for collection {neighborhood_collection_name}"):
-                key, result, document_metadata, unique_terms = future.result()
-                neighborhoods[key] = {
-                    'neighborhoods': result,
-                    'unique_terms': list(unique_terms),
-                    'metadata': document_metadata,
-                    'hoods_sequences': current_sequences_list,
-                    'hoods_size': current_size
-                }
         if info:
             st.success("Finished collecting neighborhoods.")
             print("Finished collecting neighborhoods.")
 
-            st.info(f"Inserting neighborhoods to the collection {neighborhood_collection_name}.")
-            print(f"Inserting neighborhoods to the collection {neighborhood_collection_name}.")
-        # Insert neighborhoods into MongoDB collection
-        insert_neighborhoods_to_mongo(neighborhoods, neighborhood_collection_name, document_ids)
-        if info:
-            st.success("Finished inserting neighborhoods.")
-            print("Finished inserting neighborhoods.")
+        if neighborhoods is not None:
+            if info:
+                st.info(f"Inserting neighborhoods to the collection {neighborhood_collection_name}.")
+                print(f"Inserting neighborhoods to the collection {neighborhood_collection_name}.")
+            # Insert neighborhoods into MongoDB collection
+            insert_neighborhoods_to_mongo(neighborhoods, neighborhood_collection_name, document_ids)
+            if info:
+                st.success("Finished inserting neighborhoods.")
+                print("Finished inserting neighborhoods.")
+
+        # Counts shown by the filters and the summary of the collection
+        neighborhood_statistics.update_statistics(neighborhood_collection_name)
+
         end_time = time.time()  # Record end time
         elapsed_time = end_time - start_time
         print(f"Total time taken: {elapsed_time} seconds.")
@@ -337,6 +758,486 @@ def collect_neighborhoods_mongo_parallel(sequences_list, size, document_ids=None
         return None
 
 
+def tokenize_documents(documents, executor=None):
+    """
+    Tokenize the texts of some documents.
+
+    Parameters:
+    - documents (list): Documents with their '_id' and 'text'.
+    - executor (worker_pool.WorkerPool, optional): Pool of processes to tokenize the texts in parallel.
+
+    Returns:
+    - dict: Tokens of every document by ID.
+    """
+    texts = [document.get('text', '') for document in documents]
+    if executor is not None:
+        tokens_list = list(executor.map(tokenize_document, texts, chunksize=max(1, len(texts) // 64)))
+    else:
+        tokens_list = [tokenize_document(text) for text in texts]
+    return {document['_id']: tokens for document, tokens in zip(documents, tokens_list)}
+
+
+def refresh_neighborhoods_all_collections(document_ids, size=None, batch_size=None):
+    """
+    Refresh the neighborhoods of some documents in all the neighborhoods' collections, after their text changed.
+    The documents are read from the corpus in batches with a single query and tokenized once, the sequences of every
+    collection are matched against the same tokens, and the neighborhoods of every collection are written in bulk.
+
+    Parameters:
+    - document_ids (list): IDs of the changed documents.
+    - size (int, optional): Size of the neighborhoods for collections that don't record it.
+    - batch_size (int, optional): Number of documents read at once. Defaults to config.neighborhoods_batch_size.
+
+    Returns:
+    - list: Names, sequences and size of the refreshed collections.
+    """
+    collections_names = []
+    for collection_name in db.neighborhoods_collection_names():
+        # Extract sequences_list and size from one of the documents
+        collection_info = db.neighborhoods_collection(collection_name).find_one(
+            {'hoods_sequences': {'$exists': True}}, {'hoods_sequences': 1, 'hoods_size': 1})
+        if collection_info:
+            collections_names.append({
+                'collection_name': collection_name,
+                'sequences_list': [seq.strip() for seq in collection_info.get('hoods_sequences', [])],
+                'size': collection_info.get('hoods_size', size)
+            })
+
+    if not collections_names or not document_ids:
+        return collections_names
+
+    # The token store tokenizes the changed documents itself, in parallel
+    if config.use_token_store:
+        token_store.get_token_store().sync_with_corpus(document_ids)
+    executor = None if config.use_token_store or len(document_ids) < 2 else worker_pool.get_worker_pool()
+
+    start_time = time.time()
+    batch_size = batch_size or config.neighborhoods_batch_size
+    documents_collection = db.corpus_collection()
+    progress.stage('Refreshing neighborhoods', len(document_ids))
+    for start in range(0, len(document_ids), batch_size):
+        documents = list(documents_collection.find({'_id': {'$in': list(document_ids[start:start + batch_size])}},
+                                                   {'text': 1, 'metadata': 1}))
+        documents_tokens = tokenize_documents(documents, executor)
+
+        for collection_info in collections_names:
+            sequences_list, current_size = collection_info['sequences_list'], collection_info['size']
+            matcher = corrected_matcher(sequence_matcher.get_sequences_matcher(tuple(sequences_list)))
+
+            neighborhoods = {}
+            for document in documents:
+                tokens = documents_tokens[document['_id']]
+                document_neighborhoods, unique_terms = extract_neighborhoods_from_tokens(tokens, matcher, current_size)
+                neighborhoods[document['_id']] = {
+                    'neighborhoods': document_neighborhoods,
+                    'unique_terms': list(unique_terms),
+                    'metadata': {'doc_total_words': len(tokens), **document.get('metadata', {})},
+                    'hoods_sequences': sequences_list,
+                    'hoods_size': current_size
+                }
+            insert_neighborhoods_to_mongo(neighborhoods, collection_info['collection_name'],
+                                          [document['_id'] for document in documents])
+        progress.advance(len(document_ids[start:start + batch_size]))
+
+    for collection_info in collections_names:
+        neighborhood_statistics.update_statistics(collection_info['collection_name'])
+
+    print(f"Refreshed {len(document_ids)} documents in {len(collections_names)} collections in "
+          f"{time.time() - start_time:.2f} seconds.")
+    return collections_names
+
+
+def collect_neighborhoods_from_documents(documents_collection, neighborhood_collection_name, sequences_list, size,
+                                         document_ids=None, info=True):
+    """
+    Collect neighborhoods by scanning the documents of the corpus in parallel.
+
+    Parameters:
+    - documents_collection (pymongo.collection.Collection): The corpus collection.
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection being collected.
+    - sequences_list (list): List of sequences to search for neighborhoods.
+    - size (int): The size of neighborhoods.
+    - document_ids (list, optional): Only collect the neighborhoods of these documents.
+    - info (bool): Show progress messages.
+
+    Returns:
+    - dict: Extracted neighborhoods, unique terms and metadata by document key.
+    """
+    # When the token store is used, bring it up to date and let the workers read the tokens from it
+    # instead of sending them the text of every document
+    if config.use_token_store:
+        token_store.get_token_store().sync_with_corpus(document_ids)
+        projection = {'_id': 1, 'metadata': 1}
+    else:
+        projection = {'_id': 1, 'text': 1, 'metadata': 1}
+
+    # Retrieve documents from MongoDB
+    if document_ids:
+        documents_content = []
+        for document_id in document_ids:
+            documents_content.append(
+                documents_collection.find_one({'_id': document_id}, projection))
+            if info:
+                st.info(f"Collecting neighborhoods for document {document_id} "
+                        f"on collection {neighborhood_collection_name}...")
+                print(f"Collecting neighborhoods for document {document_id} "
+                      f"on collection {neighborhood_collection_name}...")
+    else:
+        documents_content = list(documents_collection.find({}, projection))
+        st.info("Collecting neighborhoods...")
+        print("Collecting neighborhoods...")
+
+    # Parallelize processing with the shared worker pool
+    executor = worker_pool.get_worker_pool()
+    futures = [executor.submit(process_document, document, sequences_list, size)
+               for document in documents_content]
+
+    neighborhoods = {}
+
+    progress.stage('Collecting neighborhoods', len(futures))
+    for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures),
+                       desc=f"Processing Documents for collection {neighborhood_collection_name}"):
+        key, result, document_metadata, unique_terms = future.result()
+        progress.advance()
+        neighborhoods[key] = {
+            'neighborhoods': result,
+            'unique_terms': list(unique_terms),
+            'metadata': document_metadata,
+            'hoods_sequences': sequences_list,
+            'hoods_size': size
+        }
+
+    return neighborhoods
+
+
+def document_batches(documents_collection, batch_size, document_ids=None):
+    """
+    Split the documents of the corpus into batches described by their IDs, for the worker processes to read them
+    themselves. Only the IDs are read, and a batch of the whole corpus is sent as the range of its IDs, so neither
+    the memory used nor the size of a batch depend on the size of the documents.
+
+    Parameters:
+    - documents_collection (pymongo.collection.Collection): The corpus collection.
+    - batch_size (int): Number of documents in every batch.
+    - document_ids (list, optional): Only these documents. Defaults to the whole corpus.
+
+    Returns:
+    - iterator: (query, number of documents) tuples, with the query selecting the documents of every batch.
+    """
+    if document_ids is not None:
+        document_ids = list(document_ids)
+        for start in range(0, len(document_ids), batch_size):
+            batch_ids = document_ids[start:start + batch_size]
+            yield {'_id': {'$in': batch_ids}}, len(batch_ids)
+        return
+
+    first_id, last_id, count = None, None, 0
+    for document in documents_collection.find({}, {'_id': 1}).sort('_id', 1).batch_size(10_000):
+        if count == 0:
+            first_id = document['_id']
+        last_id = document['_id']
+        count += 1
+        if count == batch_size:
+            yield {'_id': {'$gte': first_id, '$lte': last_id}}, count
+            count = 0
+    if count:
+        yield {'_id': {'$gte': first_id, '$lte': last_id}}, count
+
+
+def collect_neighborhoods_from_batch(batch_query, sequences_list, size, neighborhood_collection_name):
+    """
+    Read a batch of documents, extract their neighborhoods and insert them into the staging collection of the
+    neighborhoods' collection being rebuilt, in a process of the worker pool.
+
+    Parameters:
+    - batch_query (dict): Query selecting the documents of the batch.
+    - sequences_list (list): List of sequences to search for neighborhoods.
+    - size (int): The size of neighborhoods.
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection being rebuilt.
+
+    Returns:
+    - tuple: Number of documents read and of documents inserted.
+    """
+    # With the token store the tokens are read from it instead of the text of every document
+    projection = {'_id': 1, 'metadata': 1} if config.use_token_store else {'_id': 1, 'text': 1, 'metadata': 1}
+    documents = list(db.corpus_collection().find(batch_query, projection))
+    neighborhoods = process_documents_batch(documents, sequences_list, size)
+    return len(documents), write_neighborhoods_to_staging(neighborhoods, neighborhood_collection_name)
+
+
+def collect_neighborhoods_in_workers(documents_collection, neighborhood_collection_name, sequences_list, size):
+    """
+    Rebuild a neighborhoods' collection with the worker pool, sending every process only the IDs of a batch of
+    documents. The processes read the documents, extract their neighborhoods and insert them into the staging
+    collection, and only report counts back, so this process neither reads the texts nor receives the
+    neighborhoods.
+
+    Parameters:
+    - documents_collection (pymongo.collection.Collection): The corpus collection.
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection being collected.
+    - sequences_list (list): List of sequences to search for neighborhoods.
+    - size (int): The size of neighborhoods.
+
+    Returns:
+    - int: Number of documents processed.
+    """
+    if config.use_token_store:
+        # Bring the token store up to date before the workers read the tokens from it
+        token_store.get_token_store().sync_missing_from_corpus()
+
+    start_time = time.time()
+    progress.stage('Collecting neighborhoods', documents_collection.estimated_document_count())
+    batches = ((batch_query, sequences_list, size, neighborhood_collection_name)
+               for batch_query, _ in document_batches(documents_collection, config.neighborhoods_batch_size))
+    documents, written = rebuild_neighborhoods_in_workers(neighborhood_collection_name,
+                                                          collect_neighborhoods_from_batch, batches)
+
+    elapsed_time = time.time() - start_time
+    print(f"Processed {documents} documents and inserted {written} in {elapsed_time:.2f} seconds "
+          f"({documents / max(elapsed_time, 1e-9):.1f} documents/second).")
+    return documents
+
+
+def rebuild_neighborhoods_in_workers(neighborhood_collection_name, function, batches):
+    """
+    Rebuild a neighborhoods' collection with the worker pool, running a function on every batch in a process that
+    inserts the neighborhoods into the staging collection itself. Only a few batches are kept in flight, and the
+    processes only report counts back.
+
+    Parameters:
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection being rebuilt.
+    - function (callable): Function run on every batch, returning the number of documents read and of documents
+                           inserted.
+    - batches (iterable): Arguments of the function for every batch.
+
+    Returns:
+    - tuple: Number of documents read and of documents inserted.
+    """
+    executor = worker_pool.get_worker_pool()
+    statistics = {'documents': 0, 'written': 0}
+
+    def add_results(future):
+        documents_count, written = future.result()
+        statistics['documents'] += documents_count
+        statistics['written'] += written
+        progress.advance(documents_count)
+
+    begin_neighborhoods_rebuild(neighborhood_collection_name)
+    pending = deque()
+    try:
+        for arguments in batches:
+            pending.append(executor.submit(function, *arguments))
+            # Keep only a few batches in flight
+            while len(pending) > 2 * executor.max_workers or (pending and pending[0].done()):
+                add_results(pending.popleft())
+        while pending:
+            add_results(pending.popleft())
+    except Exception:
+        for future in pending:
+            future.cancel()
+        concurrent.futures.wait(pending)
+        abort_neighborhoods_rebuild(neighborhood_collection_name)
+        raise
+    finish_neighborhoods_rebuild(neighborhood_collection_name)
+    return statistics['documents'], statistics['written']
+
+
+def process_documents_batch(documents, sequences_list, size):
+    """
+    Process a batch of documents, extracting their neighborhoods based on given sequences.
+
+    Parameters:
+    - documents (list): The documents to process.
+    - sequences_list (list): List of sequences to search for neighborhoods.
+    - size (int): The size of neighborhoods.
+
+    Returns:
+    - dict: Extracted neighborhoods, unique terms and metadata by document key.
+    """
+    neighborhoods = {}
+    for document in documents:
+        key, result, document_metadata, unique_terms = process_document(document, sequences_list, size)
+        neighborhoods[key] = {
+            'neighborhoods': result,
+            'unique_terms': list(unique_terms),
+            'metadata': document_metadata,
+            'hoods_sequences': sequences_list,
+            'hoods_size': size
+        }
+    return neighborhoods
+
+
+def _put_until_stopped(pipeline_queue, item, stop):
+    """
+    Put an item in a bounded queue of the pipeline, waiting for room unless the pipeline is stopped.
+
+    Returns:
+    - bool: True if the item was put in the queue.
+    """
+    while not stop.is_set():
+        try:
+            pipeline_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get_until_stopped(pipeline_queue, stop):
+    """
+    Get an item from a queue of the pipeline, waiting for one unless the pipeline is stopped.
+
+    Returns:
+    - object: The item, or None if the pipeline was stopped.
+    """
+    while not stop.is_set():
+        try:
+            return pipeline_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+
+def stream_neighborhoods_to_mongo(documents_collection, neighborhood_collection_name, sequences_list, size,
+                                  document_ids=None):
+    """
+    Collect neighborhoods by scanning the documents of the corpus as a pipeline of three stages working at the
+    same time: a reader thread takes batches of documents from a MongoDB cursor, a process pool extracts the
+    neighborhoods of every batch and a writer thread inserts the finished batches into the collection.
+
+    The stages are connected by bounded queues and only a few batches are processed at once, so the memory used
+    depends on config.neighborhoods_batch_size and config.neighborhoods_queue_size and not on the size of the
+    corpus.
+
+    Parameters:
+    - documents_collection (pymongo.collection.Collection): The corpus collection.
+    - neighborhood_collection_name (str): Name of the neighborhoods' collection being collected.
+    - sequences_list (list): List of sequences to search for neighborhoods.
+    - size (int): The size of neighborhoods.
+    - document_ids (list, optional): Only collect (and update) the neighborhoods of these documents.
+
+    Returns:
+    - int: Number of documents processed.
+    """
+    batch_size = config.neighborhoods_batch_size
+    read_queue = queue.Queue(maxsize=config.neighborhoods_queue_size)
+    write_queue = queue.Queue(maxsize=config.neighborhoods_queue_size)
+    stop = threading.Event()
+    errors = []
+
+    query = {'_id': {'$in': list(document_ids)}} if document_ids else {}
+    total_documents = documents_collection.count_documents(query)
+
+    def read_batches():
+        cursor = None
+        try:
+            batch = []
+            cursor = documents_collection.find(query, {'_id': 1, 'text': 1, 'metadata': 1}).batch_size(batch_size)
+            for document in cursor:
+                batch.append(document)
+                if len(batch) == batch_size:
+                    if not _put_until_stopped(read_queue, batch, stop):
+                        return
+                    batch = []
+            if batch:
+                _put_until_stopped(read_queue, batch, stop)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            if cursor is not None:
+                cursor.close()
+            _put_until_stopped(read_queue, None, stop)
+
+    write_statistics = {'documents': 0, 'seconds': 0.0}
+
+    def write_batches():
+        try:
+            while True:
+                neighborhoods = _get_until_stopped(write_queue, stop)
+                if neighborhoods is None:
+                    return
+                write_start_time = time.time()
+                if document_ids:
+                    written = insert_neighborhoods_to_mongo(neighborhoods, neighborhood_collection_name,
+                                                            document_ids)
+                else:
+                    written = write_neighborhoods_to_staging(neighborhoods, neighborhood_collection_name)
+                write_statistics['documents'] += written
+                write_statistics['seconds'] += time.time() - write_start_time
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    if not document_ids:
+        # The collection is rebuilt in a staging collection that replaces it once every batch is written
+        begin_neighborhoods_rebuild(neighborhood_collection_name)
+
+    start_time = time.time()
+    reader = threading.Thread(target=read_batches, daemon=True)
+    writer = threading.Thread(target=write_batches, daemon=True)
+    reader.start()
+    writer.start()
+
+    processed_documents = 0
+    executor = worker_pool.get_worker_pool()
+    max_workers = executor.max_workers
+    progress.stage('Collecting neighborhoods', total_documents)
+    # Batches being processed, written in the order they were read
+    pending = deque()
+    failed = True
+    try:
+        with tqdm(total=total_documents, desc=f"Processing Documents for collection {neighborhood_collection_name}") \
+                as progress_bar:
+            while not stop.is_set():
+                batch = _get_until_stopped(read_queue, stop)
+                if batch is None:
+                    break
+                pending.append((len(batch), executor.submit(process_documents_batch, batch, sequences_list, size)))
+                del batch
+
+                while len(pending) > max_workers or (pending and pending[0][1].done()):
+                    batch_length, future = pending.popleft()
+                    _put_until_stopped(write_queue, future.result(), stop)
+                    processed_documents += batch_length
+                    progress_bar.update(batch_length)
+                    progress.advance(batch_length)
+
+            while pending and not stop.is_set():
+                batch_length, future = pending.popleft()
+                _put_until_stopped(write_queue, future.result(), stop)
+                processed_documents += batch_length
+                progress_bar.update(batch_length)
+                progress.advance(batch_length)
+
+        # The writer finishes the batches left in its queue
+        _put_until_stopped(write_queue, None, stop)
+        writer.join()
+        failed = bool(errors)
+    finally:
+        # Also when a batch failed, so the threads don't wait on the queues and the cursor is closed
+        stop.set()
+        for _, future in pending:
+            future.cancel()
+        concurrent.futures.wait([future for _, future in pending])
+        writer.join()
+        reader.join()
+        if failed and not document_ids:
+            abort_neighborhoods_rebuild(neighborhood_collection_name)
+
+    if errors:
+        raise errors[0]
+    if not document_ids:
+        finish_neighborhoods_rebuild(neighborhood_collection_name)
+
+    elapsed_time = time.time() - start_time
+    print(f"Processed {processed_documents} documents in {elapsed_time:.2f} seconds "
+          f"({processed_documents / max(elapsed_time, 1e-9):.1f} documents/second). "
+          f"Wrote {write_statistics['documents']} documents in {write_statistics['seconds']:.2f} seconds "
+          f"({write_statistics['documents'] / max(write_statistics['seconds'], 1e-9):.1f} documents/second).")
+    return processed_documents
+
+
 def update_neighborhood_in_collection():
     """
     Update the edited neighborhood in the MongoDB collection.
@@ -344,40 +1245,36 @@ def update_neighborhood_in_collection():
     collection_name = st.session_state.selected_collection
     current_document_id = st.session_state.filtered_keys[st.session_state.docs_count]
     current_neighborhood_index = st.session_state.hoods_count
+    current_document = st.session_state.navigator.document(st.session_state.docs_count, prefetch=False)
+    current_hood = current_document['neighborhoods'][current_neighborhood_index]
     edited_text = st.session_state.editor_content
 
     # Check if the text has been edited
-    if (edited_text !=
-            st.session_state.filtered_docs[current_document_id]['neighborhoods'][current_neighborhood_index]
-            ['neighborhood']):
-
-        # Check if the document has been edited in any other collection or neighborhood
-        for edited_doc in st.session_state.edited_documents:
-            if edited_doc['Document'] == current_document_id and edited_doc['Collection name'] != collection_name:
-                st.session_state.hood_saved = (f"Document {current_document_id} has an edited neighborhood "
-                                               f"#{edited_doc['Neighborhood index']} in this collection {edited_doc[
-                                                   'Collection name']}. "
-                                               f"Please update the corpus before editing another neighborhood from "
-                                               f"this document.")
-
-                return  # Stop the update if the document has been edited in another collection or neighborhood
-            elif edited_doc['Document'] == current_document_id and edited_doc[
-                'Neighborhood index'] != current_neighborhood_index:
-                st.session_state.hood_saved = (f"Document {current_document_id} has an edited neighborhood "
-                                               f"#{edited_doc['Neighborhood index']} in this collection {edited_doc[
-                                                   'Collection name']}. "
-                                               f"Please update the corpus before editing another neighborhood from "
-                                               f"this document.")
-
-                return  # Stop the update if the document has been edited in another collection or neighborhood
+    if edited_text != current_hood['neighborhood']:
+
+        # Edits of the same document can be pending in any collection, as long as they don't overlap
+        overlapping = [entry for entry in edit_journal.overlapping_edits(current_document_id,
+                                                                         current_hood['start_index'],
+                                                                         current_hood['end_index'])
+                       if (entry['collection_name'], entry['start_index']) !=
+                       (collection_name, current_hood['start_index'])]
+        if overlapping:
+            st.session_state.hood_saved = (f"Document {current_document_id} has an edited neighborhood "
+                                           f"#{overlapping[0]['neighborhood_index']} in the collection "
+                                           f"{overlapping[0]['collection_name']} that overlaps this one. Please "
+                                           f"update the corpus before editing this neighborhood.")
+            return  # Stop the update if the neighborhood overlaps another pending edit
+
+        # The edit is recorded in the journal first, so an edited neighborhood is never missing from it
+        edited_hood = {**current_hood, 'neighborhood': edited_text}
+        edit_journal.record_edit(collection_name, current_document_id, current_neighborhood_index, edited_hood)
 
         # Update the MongoDB collection with the edited text
         update_query = {
             '_id': current_document_id,
             'neighborhoods': {
                 '$elemMatch': {
-                    'start_index': st.session_state.filtered_docs[current_document_id]['neighborhoods'][
-                        current_neighborhood_index]['start_index']
+                    'start_index': current_hood['start_index']
                 }
             }
         }
@@ -388,20 +1285,25 @@ def update_neighborhood_in_collection():
             }
         }
 
-        client = MongoClient(config.mongo_connection)
-        db = client[config.mongo_database]
-        neighborhood_collection = db[collection_name]
-
-        neighborhood_collection.update_one(update_query, update_operation)
-        hoods_docs_index = st.session_state.hoods_docs[current_document_id]['neighborhoods'].index(
-            st.session_state.filtered_docs[current_document_id]['neighborhoods'][current_neighborhood_index])
-        st.session_state.hoods_docs[current_document_id]['neighborhoods'][hoods_docs_index]['neighborhood'] = \
-            edited_text
-        st.session_state.hoods_docs[current_document_id]['neighborhoods'][hoods_docs_index]['edited'] = True
-        st.session_state.filtered_docs[current_document_id]['neighborhoods'][current_neighborhood_index][
-            'neighborhood'] = edited_text
-        st.session_state.filtered_docs[current_document_id]['neighborhoods'][current_neighborhood_index][
-            'edited'] = True
+        neighborhood_collection = db.neighborhoods_collection(collection_name)
+
+        if not neighborhood_collection.update_one(update_query, update_operation).matched_count:
+            # The neighborhood was collected again meanwhile
+            edit_journal.remove_edits([current_document_id], collection_name)
+            st.session_state.hood_saved = (f"The neighborhood #{current_neighborhood_index} of document "
+                                           f"{current_document_id} no longer exists in {collection_name}.")
+            return
+
+        # Replace the counts of the old text of the neighborhood in the saved co-occurrence matrices
+        metadata = current_document.get('metadata', {})
+        co_occurrences.get_co_occurrences().update_co_occurrences(collection_name,
+                                                                  [(metadata, current_hood['neighborhood'])],
+                                                                  [(metadata, edited_text)])
+
+        # Update the copies of the document kept by the navigators
+        for documents_navigator in (st.session_state.navigator, st.session_state.collection_navigator):
+            documents_navigator.update_neighborhood(current_document_id, current_hood['start_index'],
+                                                    {'neighborhood': edited_text, 'edited': True})
 
         # Control if neighbor was successfully saved to show message when rerun
         st.session_state.hood_saved = True
@@ -411,99 +1313,75 @@ def update_neighborhood_in_collection():
             st.warning("The original text and the text in the text area are the same.")
 
 
-def save_edited_neighborhoods_to_corpus_mongo(neighborhoods_collection_name):
+def pending_edits(document_ids=None):
     """
-    Save edited neighborhoods to the corpus collection in MongoDB.
+    Gather the edits of neighborhoods recorded in the edit journal into a piece table per document. The edits of a
+    document from every collection are in the same table, since their ranges all refer to the tokens of its text
+    in the corpus.
 
     Parameters:
-    - neighborhoods_collection_name (str): Name of the neighborhoods' collection.
-    """
-    # Connect to MongoDB
-    client = MongoClient(config.mongo_connection)
-    db = client[config.mongo_database]
-
-    # Access the collections
-    corpus_collection = db[config.mongo_collection]
-    neighborhoods_collection = db[neighborhoods_collection_name]
-
-    # Retrieve documents from MongoDB, filtering only those with edited neighborhoods
-    query = {'neighborhoods': {'$elemMatch': {'edited': True}}}
-    neighborhoods_documents = list(neighborhoods_collection.find(query, {'_id': 1, 'neighborhoods': 1}))
-
-    # Create an update list to store all updates
-    update_list = []
-
-    # Iterate through neighborhoods and update corpus
-    for neighborhoods_doc in neighborhoods_documents:
-        document_id = neighborhoods_doc['_id']
-        neighborhoods = neighborhoods_doc.get('neighborhoods', [])
-        # Use MongoDB query to filter only documents with edited neighborhoods
-        corpus_document = corpus_collection.find_one({'_id': document_id, 'text': {'$exists': True}})
-        if corpus_document:
-            tokenized_content = tokenize(corpus_document['text'])
-            updated_content = tokenized_content  # Create a copy of tokenized_content
+    - document_ids (list, optional): IDs of the documents. Defaults to all the documents with pending edits.
 
-            for neighborhood in neighborhoods:
-                if neighborhood['edited']:
-                    start_index = neighborhood['start_index']
-                    end_index = neighborhood['end_index']
-                    updated_content[start_index:end_index] = tokenize(neighborhood['neighborhood'])
-                    # Mark neighborhood as not edited anymore
-                    neighborhood['edited'] = False
-
-            update_list.append({
-                'filter': {'_id': document_id},
-                'update': {'$set': {'text': ' '.join(updated_content)}}
-            })
-
-        # Update the neighborhoods_collection
-        neighborhoods_collection.update_one({'_id': document_id},
-                                            {'$set': {'neighborhoods': neighborhoods}})
+    Returns:
+    - dict: Piece tables by document ID, with (collection name, start index) as the source of every edit.
+    """
+    piece_tables = {}
+    for entry in edit_journal.pending_edits(document_ids):
+        document_piece_table = piece_tables.setdefault(entry['document_id'], piece_table.PieceTable())
+        try:
+            document_piece_table.add(entry['start_index'], entry['end_index'],
+                                     tokenizers.tokenize(entry['neighborhood']),
+                                     (entry['collection_name'], entry['start_index']))
+        except ValueError:
+            print(f"Skipping the edited neighborhood starting at token {entry['start_index']} of document "
+                  f"{entry['document_id']} in {entry['collection_name']}, it overlaps another pending edit.")
+    return piece_tables
+
+
+def save_edited_neighborhoods_to_corpus_mongo(neighborhoods_collection_name=None):
+    """
+    Save the pending edits of neighborhoods to the corpus collection in MongoDB. All the edits of a document, from
+    every collection, are applied to its text in a single pass, the texts are written in bulk and the neighborhoods
+    of the edited documents are then collected again in every collection.
 
-    # Update the corpus_collection with a single update operation
-    for update_operation in update_list:
-        corpus_collection.update_one(**update_operation)
+    Parameters:
+    - neighborhoods_collection_name (str, optional): Only save the documents with edits in this neighborhoods'
+                                                     collection. Defaults to all the documents with edits.
+    """
+    document_ids = None
+    if neighborhoods_collection_name is not None:
+        document_ids = {entry['document_id'] for entry in
+                        edit_journal.pending_edits(collection_name=neighborhoods_collection_name)}
+    piece_tables = pending_edits(document_ids)
+    if not piece_tables:
+        find_edited_neighborhoods()
+        return
+
+    corpus_collection = db.corpus_collection()
+    update_operations = []
+    for document in corpus_collection.find({'_id': {'$in': list(piece_tables)}, 'text': {'$exists': True}},
+                                           {'text': 1}):
+        tokens = tokenize_document(document['text'])
+        updated_content = piece_tables[document['_id']].apply(tokens)
+        update_operations.append(UpdateOne({'_id': document['_id']}, {'$set': {'text': ' '.join(updated_content)}}))
+    bulk_write_in_batches(corpus_collection, update_operations)
+
+    # Collecting the neighborhoods of the edited documents again also clears their edits, since the ranges of the
+    # neighborhoods moved with the edited texts
+    refresh_neighborhoods_all_collections(list(piece_tables))
+    edit_journal.remove_edits(list(piece_tables))
     find_edited_neighborhoods()
 
 
 def find_edited_neighborhoods():
     """
-    Finds and populates the edited_documents session state variable with information about edited neighborhoods.
+    Finds and populates the edited_documents session state variable with information about edited neighborhoods,
+    from the edit journal.
     """
-    # Connect to MongoDB
-    client = MongoClient(config.mongo_connection)
-    db = client[config.mongo_database]
-
-    # Initialize session state variables as a list
-    st.session_state.edited_documents = []
-
-    # Get all collections
-    all_collections = db.list_collection_names()
-
-    # Iterate over collections
-    for collection_name in all_collections:
-        if collection_name.endswith('neighborhoods'):
-            neighborhoods_collection = db[collection_name]
-
-            # Search for neighborhoods with 'edited' True
-            query = {'neighborhoods': {'$elemMatch': {'edited': True}}}
-            edited_neighborhoods = neighborhoods_collection.find(query, {'_id': 1, 'neighborhoods': 1})
-
-            # Iterate over documents with edited neighborhoods
-            for doc in edited_neighborhoods:
-                document_id = doc['_id']
-                neighborhoods = doc.get('neighborhoods', [])
-
-                # Iterate over neighborhoods
-                for idx, neighborhood in enumerate(neighborhoods):
-                    if neighborhood['edited']:
-                        # Append information to the session state list
-                        st.session_state.edited_documents.append({
-                            'Document': document_id,
-                            'Neighborhood index': idx,
-                            'Collection name': collection_name
-                        })
-                        break  # Stop searching after finding the first edited neighborhood
+    st.session_state.edited_documents = [{'Document': entry['document_id'],
+                                          'Neighborhood index': entry['neighborhood_index'],
+                                          'Collection name': entry['collection_name']}
+                                         for entry in edit_journal.pending_edits()]
 
 
 def add_correction_entry_to_mongo(original_term, corrected_term):
@@ -514,9 +1392,7 @@ def add_correction_entry_to_mongo(original_term, corrected_term):
     - original_term (str): The original term to be corrected.
     - corrected_term (str): The corrected term.
     """
-    client = MongoClient(mongo_connection)
-    db = client[mongo_database]
-    corrections_collection = db[corrections_collection_name]
+    corrections_collection = db.corrections_collection()
 
     existing_entry = corrections_collection.find_one({"Original term": original_term})
 
@@ -527,10 +1403,9 @@ def add_correction_entry_to_mongo(original_term, corrected_term):
     else:
         new_entry = {"Original term": original_term, "Correct term": corrected_term}
         corrections_collection.insert_one(new_entry)
+        refresh_corrections_overlay()
         st.success("Entry added successfully!")
 
-    client.close()
-
 
 def delete_correction_entry_from_mongo(selected_entry):
     """
@@ -539,17 +1414,23 @@ def delete_correction_entry_from_mongo(selected_entry):
     Parameters:
     - selected_entry (str): The original term of the entry to be deleted.
     """
-    client = MongoClient(mongo_connection)
-    db = client[mongo_database]
-    corrections_collection = db[corrections_collection_name]
+    corrections_collection = db.corrections_collection()
 
     if selected_entry:
         corrections_collection.delete_one({"Original term": selected_entry})
+        refresh_corrections_overlay()
         st.success("Entry deleted successfully!")
     else:
         st.warning("Choose a valid entry from the dropdown.")
 
-    client.close()
+
+def refresh_corrections_overlay():
+    """
+    Makes a change in the corrections take effect right away when they are applied as an overlay. The saved
+    co-occurrence matrices were counted with the previous corrections, so they are generated again when needed.
+    """
+    if corrections_overlay.get_corrections_overlay(refresh=True) is not None:
+        co_occurrence_store.get_co_occurrence_artifacts().invalidate_all()
 
 
 def get_corrections_from_mongo():
@@ -559,45 +1440,206 @@ def get_corrections_from_mongo():
     Returns:
     - pd.DataFrame: DataFrame containing corrections data.
     """
-    client = MongoClient(mongo_connection)
-    db = client[mongo_database]
-    corrections_collection = db[corrections_collection_name]
+    corrections_collection = db.corrections_collection()
 
     # Fetch corrections and convert to DataFrame
     corrections_data = list(corrections_collection.find())
     corrections_df = pd.DataFrame(corrections_data, columns=['Original term', 'Correct term'])
 
-    client.close()
-
     return corrections_df
 
 
-def apply_corrections_to_document(document, corrections_dict):
+def apply_corrections_to_chunk(documents, corrections_version, corrections_dict=None):
     """
-    Applies corrections to the 'text' field of a document based on a corrections' dictionary.
+    Applies corrections to a chunk of documents in a process of the worker pool.
 
     Parameters:
-    - document (dict): The document to apply corrections to.
-    - corrections_dict (dict): Dictionary mapping original terms to corrected terms.
+    - documents (list): Documents with their '_id' and 'text'.
+    - corrections_version (str): Version of the corrections.
+    - corrections_dict (dict, optional): The corrections, only sent if they aren't the saved ones, which the
+                                         processes already loaded.
 
     Returns:
-    - dict or None: If corrections are applied, returns a dictionary with the updated document, else returns None.
+    - tuple: The corrected documents, as (document ID, corrected text) pairs, and the number of corrected tokens.
     """
-    if 'text' in document:
-        # For the general collection
-        tokenized_text = tokenize(document['text'])
-
-        # Apply the corrections using set intersection
+    corrections_dict = worker_pool.worker_corrections(corrections_version, corrections_dict)
+    corrected_documents = []
+    changed_tokens = 0
+    for document in documents:
+        if 'text' not in document:
+            print(f"Unknown document structure for document {document['_id']}. Skipping corrections.")
+            continue
+        tokenized_text = tokenize_document(document['text'])
         corrected_tokens = [corrections_dict.get(token, token) for token in tokenized_text]
+        document_changed_tokens = sum(1 for token, corrected_token in zip(tokenized_text, corrected_tokens)
+                                      if token != corrected_token)
+        if document_changed_tokens:
+            corrected_documents.append((document['_id'], ' '.join(corrected_tokens)))
+            changed_tokens += document_changed_tokens
+    return corrected_documents, changed_tokens
+
+
+def correct_documents_batch(batch_query, corrections_version, corrections_dict=None):
+    """
+    Read a batch of documents, apply corrections to them and write the corrected texts back, in a process of the
+    worker pool.
+
+    Parameters:
+    - batch_query (dict): Query selecting the documents of the batch.
+    - corrections_version (str): Version of the corrections.
+    - corrections_dict (dict, optional): The corrections, only sent if they aren't the saved ones.
+
+    Returns:
+    - tuple: Number of documents read, IDs of the corrected documents and the number of corrected tokens.
+    """
+    collection = db.corpus_collection()
+    documents = list(collection.find(batch_query, {'text': 1}))
+    corrected_documents, changed_tokens = apply_corrections_to_chunk(documents, corrections_version, corrections_dict)
+    if corrected_documents:
+        bulk_write_in_batches(collection, (UpdateOne({'_id': document_id}, {'$set': {'text': text}})
+                                           for document_id, text in corrected_documents))
+    return len(documents), [document_id for document_id, _ in corrected_documents], changed_tokens
+
 
-        # Save the updated text back to the JSON data
-        corrected_document = ' '.join(corrected_tokens)
-        if corrected_tokens != tokenized_text:
-            corrected_doc = {'_id': document['_id'], 'text': corrected_document}
-            return corrected_doc
+def apply_corrections_to_corpus(corrections_dict, document_ids=None, chunk_size=None):
+    """
+    Applies corrections to the documents of the corpus with the worker pool. The documents are split in ID order
+    into chunks, with a bounded number of chunks in flight. With config.workers_read_documents the processes only
+    get the IDs of every chunk and read and write the texts themselves, otherwise the texts are read here, sent to
+    the processes and the corrected texts written back with bulk writes.
+
+    Parameters:
+    - corrections_dict (dict): Dictionary mapping original terms to corrected terms.
+    - document_ids (list, optional): Only correct these documents. Defaults to the whole corpus.
+    - chunk_size (int, optional): Number of documents in every chunk. Defaults to config.corrections_chunk_size.
+
+    Returns:
+    - tuple: IDs of the corrected documents and a dictionary with the numbers of 'documents' read, 'changed_documents',
+             'changed_tokens' and the 'seconds' it took.
+    """
+    chunk_size = chunk_size or config.corrections_chunk_size
+    collection = db.corpus_collection()
+    start_time = time.time()
+
+    corrected_ids = []
+    statistics = {'documents': 0, 'changed_documents': 0, 'changed_tokens': 0, 'seconds': 0.0}
+    if document_ids is not None and not document_ids:
+        return corrected_ids, statistics
+
+    executor = worker_pool.get_worker_pool()
+    max_workers = executor.max_workers
+    # The processes already loaded the saved corrections, other corrections are sent with every chunk
+    version = corrections_overlay.corrections_version(corrections_dict)
+    sent_corrections = {'corrections': None if version == corrections_overlay.corrections_version(
+        worker_pool.load_saved_corrections()) else corrections_dict}
+
+    def submit(chunk):
+        if config.workers_read_documents:
+            return executor.submit(correct_documents_batch, chunk, version, sent_corrections['corrections'])
+        return executor.submit(apply_corrections_to_chunk, chunk, version, sent_corrections['corrections'])
+
+    def write_results(chunk, future):
+        try:
+            result = future.result()
+        except LookupError:
+            # The saved corrections changed meanwhile, so the processes can't load these anymore
+            sent_corrections['corrections'] = corrections_dict
+            result = submit(chunk).result()
+        if config.workers_read_documents:
+            # The process already wrote the corrected texts
+            documents_count, chunk_corrected_ids, changed_tokens = result
+        else:
+            corrected_documents, changed_tokens = result
+            documents_count = len(chunk)
+            if corrected_documents:
+                bulk_write_in_batches(collection, (UpdateOne({'_id': document_id}, {'$set': {'text': text}})
+                                                   for document_id, text in corrected_documents))
+            chunk_corrected_ids = [document_id for document_id, _ in corrected_documents]
+        progress.advance(documents_count)
+        corrected_ids.extend(chunk_corrected_ids)
+        statistics['documents'] += documents_count
+        statistics['changed_documents'] += len(chunk_corrected_ids)
+        statistics['changed_tokens'] += changed_tokens
+
+    def document_chunks():
+        query = {'_id': {'$in': list(document_ids)}} if document_ids is not None else {}
+        chunk = []
+        for document in collection.find(query, {'text': 1}).sort('_id', 1):
+            chunk.append(document)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    if config.workers_read_documents:
+        chunks = (batch_query for batch_query, _ in document_batches(collection, chunk_size, document_ids))
     else:
-        print(f"Unknown document structure for document {document}. Skipping corrections.")
-        return None
+        chunks = document_chunks()
+
+    progress.stage('Applying corrections',
+                   len(document_ids) if document_ids is not None else collection.estimated_document_count())
+    pending = deque()
+    for chunk in chunks:
+        pending.append((chunk, submit(chunk)))
+        # Keep only a few chunks in flight, so the memory used doesn't depend on the size of the corpus
+        while len(pending) > 2 * max_workers or (pending and pending[0][1].done()):
+            write_results(*pending.popleft())
+    while pending:
+        write_results(*pending.popleft())
+
+    statistics['seconds'] = time.time() - start_time
+    return corrected_ids, statistics
+
+
+def get_applied_corrections():
+    """
+    Retrieves the corrections that have already been applied to the corpus.
+
+    Returns:
+    - dict: Dictionary mapping original terms to the corrected terms they were replaced with.
+    """
+    return {entry['_id']: entry['Correct term'] for entry in db.applied_corrections_collection().find()}
+
+
+def save_applied_corrections(corrections_dict, applied_corrections):
+    """
+    Records the corrections as applied to the corpus, forgetting the applied corrections that were deleted so they
+    are applied again if they are added back.
+
+    Parameters:
+    - corrections_dict (dict): Dictionary mapping original terms to corrected terms, all of them applied.
+    - applied_corrections (dict): The corrections recorded as applied before.
+    """
+    applied_at = datetime.datetime.now(datetime.timezone.utc)
+    operations = [DeleteOne({'_id': original_term}) for original_term in applied_corrections
+                  if original_term not in corrections_dict]
+    operations += [UpdateOne({'_id': original_term},
+                             {'$set': {'Correct term': corrected_term, 'applied_at': applied_at}}, upsert=True)
+                   for original_term, corrected_term in corrections_dict.items()
+                   if applied_corrections.get(original_term) != corrected_term]
+    bulk_write_in_batches(db.applied_corrections_collection(), operations)
+
+
+def find_documents_to_correct(original_terms):
+    """
+    Finds the documents of the corpus that contain any of some terms, with the inverted index. The hashes of the
+    texts of all the documents are checked first, so documents changed outside the app are tokenized again instead
+    of being skipped, since the terms are recorded as applied to the whole corpus.
+
+    Parameters:
+    - original_terms (iterable): The terms to correct.
+
+    Returns:
+    - list: IDs of the documents containing any of the terms.
+    """
+    store = token_store.get_token_store()
+    store.sync_with_corpus()
+    index = inverted_index.get_inverted_index()
+    term_ids = [store.term_ids[term] for term in original_terms if term in store.term_ids]
+    if not term_ids:
+        return []
+    return sorted(index.documents_containing(term_ids))
 
 
 def apply_corrections_all_collections_mongo_parallel(corrections_df):
@@ -607,71 +1649,73 @@ def apply_corrections_all_collections_mongo_parallel(corrections_df):
     Parameters:
     - corrections_df (pandas.DataFrame): DataFrame containing 'Original term' and 'Correct term' columns.
     """
-    client = MongoClient(config.mongo_connection)
-    db = client[config.mongo_database]
     corrections_dict = dict(zip(corrections_df['Original term'], corrections_df['Correct term']))
 
-    collection = db[config.mongo_collection]
-
     st.info(f"Applying corrections to collection {config.mongo_collection}. Please wait, this might take a while.")
     print(f"Applying corrections to collection {config.mongo_collection}. Please wait, this might take a while.")
 
-    futures = []
-    documents_ids = []
+    # Only the corrections that were added or changed since the last time need to be applied
+    applied_corrections = get_applied_corrections()
+    pending_corrections = {original_term: corrected_term for original_term, corrected_term in corrections_dict.items()
+                           if applied_corrections.get(original_term) != corrected_term}
 
-    executor = concurrent.futures.ProcessPoolExecutor()
+    if not pending_corrections:
+        document_ids_to_correct = []
+    elif config.use_token_store and config.use_inverted_index:
+        # Only the documents where the new corrections occur are corrected
+        document_ids_to_correct = find_documents_to_correct(pending_corrections)
+    else:
+        document_ids_to_correct = None
 
-    for document in collection.find():
-        future = executor.submit(apply_corrections_to_document, document, corrections_dict)
-        futures.append(future)
+    documents_ids, statistics = apply_corrections_to_corpus(corrections_dict, document_ids_to_correct)
 
-    for i, future in enumerate(concurrent.futures.as_completed(futures)):
-        result = future.result()
-        if result is not None:
-            collection.update_one({'_id': result['_id']}, {'$set': result})
-            documents_ids.append(result['_id'])
+    if config.use_token_store and documents_ids:
+        # Keep the token store and the inverted index in step with the corrected texts
+        token_store.get_token_store().sync_with_corpus(documents_ids)
+    save_applied_corrections(corrections_dict, applied_corrections)
 
-    print(f"Finished applying all corrections.")
-    st.info(f"Corrections applied to collection {config.mongo_collection}.")
+    report = (f"Corrected {statistics['changed_tokens']} tokens in {statistics['changed_documents']} of "
+              f"{statistics['documents']} documents in {statistics['seconds']:.2f} seconds "
+              f"({statistics['documents'] / max(statistics['seconds'], 1e-9):.1f} documents/second).")
+    print(f"Finished applying all corrections. {report}")
+    st.info(f"Corrections applied to collection {config.mongo_collection}. {report}")
 
     st.success(f"Finished applying all corrections.")
 
-    print(documents_ids)
-    collect_neighborhoods_mongo_parallel(sequences_list=[], size=0, document_ids=documents_ids,
-                                         all_collections=True, info=False)
+    if documents_ids:
+        collect_neighborhoods_mongo_parallel(sequences_list=[], size=0, document_ids=documents_ids,
+                                             all_collections=True, info=False)
 
 
-def save_complete_text_to_mongo():
+def save_complete_text_to_mongo(document_id, text_to_save):
     """
-    Saves the complete text of a document to MongoDB.
-    """
-    document_id = st.session_state.complete_file_to_display
-    client = MongoClient(config.mongo_connection)
-    db = client[config.mongo_database]
-    documents_collection = db[config.mongo_collection]
+    Saves the complete text of a document to MongoDB and collects its neighborhoods again in every collection.
+
+    Parameters:
+    - document_id (str): The unique identifier of the document.
+    - text_to_save (str): The new text of the document.
 
-    text_to_save = st.session_state.editor_content
+    Returns:
+    - bool: Whether the document was found and saved.
+    """
+    documents_collection = db.corpus_collection()
 
-    # Fetch the document from MongoDB
-    document = documents_collection.find_one({"_id": document_id})
+    # Update the text field in the document
+    if not documents_collection.update_one({"_id": document_id}, {"$set": {"text": text_to_save}}).matched_count:
+        print(f"Document {document_id} not found in collection {config.mongo_collection}.")
+        return False
 
-    if document:
-        # Update the text field in the document
-        documents_collection.update_one(
-            {"_id": document_id},
-            {"$set": {"text": text_to_save}}
-        )
-        with st.session_state.col8:
-            st.success(f"Text successfully saved for document {document_id}.")
-    else:
-        with st.session_state.col8:
-            st.error(f"Document {document_id} not found in collection {config.mongo_collection}.")
+    if config.use_token_store:
+        # Keep the token store and the inverted index in step with the corpus
+        token_store.get_token_store().sync_with_corpus([document_id])
+    print(f"Text successfully saved for document {document_id}.")
 
     # Recollect and insert the neighborhoods of the saved document
-    with st.session_state.col8:
-        st.info('Recollecting neighborhoods from edited documents.')
-        collect_neighborhoods_mongo_parallel(sequences_list=[], size=0, document_ids=[document_id], all_collections=True)
-        st.success('Finished recollecting neighborhoods successfully.')
+    print('Recollecting neighborhoods from edited documents.')
+    collect_neighborhoods_mongo_parallel(sequences_list=[], size=0, document_ids=[document_id], all_collections=True,
+                                         info=False)
+    print('Finished recollecting neighborhoods successfully.')
+    return True
 
 
 def get_neighborhood_collections():
@@ -681,10 +1725,8 @@ def get_neighborhood_collections():
     Returns:
     - list: A list of neighborhood collection names.
     """
-    client = MongoClient(config.mongo_connection)
-    db = client[config.mongo_database]
-    collection_names = db.list_collection_names()
-    neighborhood_collections = [name for name in collection_names if name.endswith("_neighborhoods")]
+    neighborhood_collections = [name for name in db.neighborhoods_collection_names()
+                                if name.endswith("_neighborhoods")]
     return neighborhood_collections
 
 
@@ -698,9 +1740,7 @@ def get_documents_from_collection(collection_name):
     Returns:
     - dict: A dictionary where keys are document IDs, and values are the corresponding document content.
     """
-    client = MongoClient(config.mongo_connection)
-    db = client[config.mongo_database]
-    collection = db[collection_name]
+    collection = db.neighborhoods_collection(collection_name)
     documents_content = list(collection.find({}))
     documents_dict = {str(doc['_id']): doc for doc in documents_content}
     return documents_dict
@@ -713,10 +1753,7 @@ def get_corrections_from_collection():
     Returns:
     - pymongo.collection.Collection: The corrections MongoDB collection.
     """
-    client = MongoClient(config.mongo_connection)
-    database = client[config.mongo_database]
-    corrections_collection = database[corrections_collection_name]
-    return corrections_collection
+    return db.corrections_collection()
 
 
 def get_complete_text_from_document(document_id):
@@ -729,9 +1766,7 @@ def get_complete_text_from_document(document_id):
     Returns:
     - dict: The document content, including the complete text.
     """
-    client = MongoClient(config.mongo_connection)
-    db = client[config.mongo_database]
-    documents_collection = db[config.mongo_collection]
+    documents_collection = db.corpus_collection()
     # Fetch the document from MongoDB
     document = documents_collection.find_one({"_id": document_id})
     return document
@@ -0,0 +1,227 @@
+import os
+import threading
+
+from pymongo import MongoClient, monitoring
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+import src.config as config
+
+NEIGHBORHOODS_SUFFIX = 'neighborhoods'
+CO_OCCURRENCES_SUFFIX = '_co_occurrences'
+
+
+class CommandTimings(monitoring.CommandListener):
+    """
+    Records how many times every MongoDB command ran against every collection and how long it took, as reported
+    by the driver. Commands slower than config.mongo_slow_command_ms are printed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statistics = {}
+        self.running = {}
+
+    def started(self, event):
+        collection_name = event.command.get(event.command_name)
+        if not isinstance(collection_name, str):
+            collection_name = ''
+        with self.lock:
+            self.running[(event.connection_id, event.request_id)] = collection_name
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def _record(self, event, failed):
+        milliseconds = event.duration_micros / 1000
+        with self.lock:
+            collection_name = self.running.pop((event.connection_id, event.request_id), '')
+            key = (event.command_name, collection_name)
+            statistics = self.statistics.setdefault(key, {'calls': 0, 'failures': 0, 'total_ms': 0.0,
+                                                          'max_ms': 0.0})
+            statistics['calls'] += 1
+            statistics['failures'] += failed
+            statistics['total_ms'] += milliseconds
+            statistics['max_ms'] = max(statistics['max_ms'], milliseconds)
+
+        if milliseconds >= config.mongo_slow_command_ms:
+            print(f"Slow MongoDB command {event.command_name} {collection_name}: {milliseconds:.1f} ms.")
+
+    def summary(self):
+        """
+        Returns:
+        - list: Dictionaries with the 'command', 'collection', number of 'calls' and 'failures', and the total,
+                mean and maximum milliseconds, from the most to the least total time.
+        """
+        with self.lock:
+            rows = [{'command': command, 'collection': collection_name, **statistics,
+                     'mean_ms': statistics['total_ms'] / statistics['calls']}
+                    for (command, collection_name), statistics in self.statistics.items()]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def reset(self):
+        with self.lock:
+            self.statistics = {}
+
+
+command_timings = CommandTimings()
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+# Metadata fields the neighborhoods are filtered by
+NEIGHBORHOODS_INDEXED_FIELDS = ('metadata.periodo', 'metadata.nacionalidad', 'metadata.entidad territorial')
+_indexed_collections = set()
+
+
+def get_client() -> MongoClient:
+    """
+    Get the MongoDB client of this process. The client keeps a pool of connections and is safe to share between
+    threads, so it is created once and reused by every module and Streamlit session. A process created with fork
+    gets a client of its own, since pymongo clients can't be used across a fork.
+
+    Returns:
+    - MongoClient: The shared client.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = MongoClient(config.mongo_connection,
+                                  maxPoolSize=config.mongo_max_pool_size,
+                                  minPoolSize=config.mongo_min_pool_size,
+                                  maxIdleTimeMS=config.mongo_max_idle_time_ms,
+                                  connectTimeoutMS=config.mongo_connect_timeout_ms,
+                                  serverSelectionTimeoutMS=config.mongo_server_selection_timeout_ms,
+                                  socketTimeoutMS=config.mongo_socket_timeout_ms,
+                                  event_listeners=[command_timings])
+            _client_pid = os.getpid()
+        return _client
+
+
+def get_database() -> Database:
+    """
+    Returns:
+    - Database: The database of the application.
+    """
+    return get_client()[config.mongo_database]
+
+
+def get_collection(collection_name) -> Collection:
+    """
+    Parameters:
+    - collection_name (str): Name of the collection.
+
+    Returns:
+    - Collection: Any collection of the database of the application.
+    """
+    return get_database()[collection_name]
+
+
+def corpus_collection() -> Collection:
+    """
+    Returns:
+    - Collection: The collection with the text and metadata of the corpus documents.
+    """
+    return get_collection(config.mongo_collection)
+
+
+def corrections_collection() -> Collection:
+    """
+    Returns:
+    - Collection: The collection with the corrections of the corpus terms.
+    """
+    return get_collection(config.corrections_collection_name)
+
+
+def applied_corrections_collection() -> Collection:
+    """
+    Returns:
+    - Collection: The collection with the corrections already applied to the corpus.
+    """
+    return get_collection(config.applied_corrections_collection_name)
+
+
+def neighborhood_statistics_collection() -> Collection:
+    """
+    Returns:
+    - Collection: The collection with the statistics of every neighborhoods' collection.
+    """
+    return get_collection(config.neighborhood_statistics_collection_name)
+
+
+def edit_journal_collection() -> Collection:
+    """
+    Returns:
+    - Collection: The collection with the edits of neighborhoods not yet saved to the corpus.
+    """
+    return get_collection(config.edit_journal_collection_name)
+
+
+def jobs_collection() -> Collection:
+    """
+    Returns:
+    - Collection: The collection with the queued, running and finished jobs.
+    """
+    return get_collection(config.jobs_collection_name)
+
+
+def neighborhoods_collection(collection_name) -> Collection:
+    """
+    Parameters:
+    - collection_name (str): Name of the neighborhoods' collection, ending with 'neighborhoods'.
+
+    Returns:
+    - Collection: The neighborhoods' collection.
+    """
+    if not collection_name.endswith(NEIGHBORHOODS_SUFFIX):
+        raise ValueError(f"{collection_name} is not the name of a neighborhoods' collection.")
+    return get_collection(collection_name)
+
+
+def ensure_neighborhoods_indexes(collection_name, force=False):
+    """
+    Create the indexes on the metadata fields of a neighborhoods' collection, once per collection and process.
+
+    Parameters:
+    - collection_name (str): Name of the neighborhoods' collection.
+    - force (bool): Create them even if they were already created, for example after the collection was replaced.
+    """
+    if not force and collection_name in _indexed_collections:
+        return
+    collection = neighborhoods_collection(collection_name)
+    for field in NEIGHBORHOODS_INDEXED_FIELDS:
+        collection.create_index(field)
+    _indexed_collections.add(collection_name)
+
+
+def co_occurrences_collection(collection_name) -> Collection:
+    """
+    Parameters:
+    - collection_name (str): Name of the top co-occurrences' collection, ending with '_co_occurrences'.
+
+    Returns:
+    - Collection: The top co-occurrences' collection.
+    """
+    if not collection_name.endswith(CO_OCCURRENCES_SUFFIX):
+        raise ValueError(f"{collection_name} is not the name of a co-occurrences' collection.")
+    return get_collection(collection_name)
+
+
+def neighborhoods_collection_names():
+    """
+    Returns:
+    - list: Names of the neighborhoods' collections.
+    """
+    return [name for name in get_database().list_collection_names() if name.endswith(NEIGHBORHOODS_SUFFIX)]
+
+
+def co_occurrences_collection_names():
+    """
+    Returns:
+    - list: Names of the top co-occurrences' collections.
+    """
+    return [name for name in get_database().list_collection_names() if name.endswith(CO_OCCURRENCES_SUFFIX)]
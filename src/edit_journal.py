@@ -0,0 +1,131 @@
+import datetime
+import threading
+
+from pymongo import ASCENDING
+
+import src.config as config
+import src.db as db
+
+_journal_ready = False
+_journal_lock = threading.Lock()
+
+
+def ensure_journal():
+    """
+    Create the indexes of the edit journal, once per process. When the journal doesn't exist yet, it is first filled
+    with the neighborhoods marked as edited before the journal was kept.
+    """
+    global _journal_ready
+    with _journal_lock:
+        if _journal_ready:
+            return
+        journal = db.edit_journal_collection()
+        if config.edit_journal_collection_name not in db.get_database().list_collection_names():
+            entries = []
+            for collection_name in db.neighborhoods_collection_names():
+                for document in db.neighborhoods_collection(collection_name).find({'neighborhoods.edited': True},
+                                                                                  {'neighborhoods': 1}):
+                    for index, hood in enumerate(document.get('neighborhoods', [])):
+                        if hood.get('edited'):
+                            entries.append(journal_entry(collection_name, document['_id'], index, hood))
+            if entries:
+                journal.insert_many(entries)
+        journal.create_index([('document_id', ASCENDING), ('collection_name', ASCENDING),
+                              ('start_index', ASCENDING)], unique=True)
+        journal.create_index([('collection_name', ASCENDING), ('document_id', ASCENDING)])
+        _journal_ready = True
+
+
+def journal_entry(collection_name, document_id, neighborhood_index, hood):
+    """
+    Parameters:
+    - collection_name (str): Name of the neighborhoods' collection.
+    - document_id (str): ID of the document.
+    - neighborhood_index (int): Position of the neighborhood in the document.
+    - hood (dict): The edited neighborhood.
+
+    Returns:
+    - dict: The journal entry of the edit.
+    """
+    return {'collection_name': collection_name,
+            'document_id': document_id,
+            'neighborhood_index': neighborhood_index,
+            'start_index': hood['start_index'],
+            'end_index': hood['end_index'],
+            'neighborhood': hood['neighborhood'],
+            'edited_at': datetime.datetime.now(datetime.timezone.utc)}
+
+
+def record_edit(collection_name, document_id, neighborhood_index, hood):
+    """
+    Record the edit of a neighborhood, replacing an earlier edit of the same neighborhood.
+
+    Parameters:
+    - collection_name (str): Name of the neighborhoods' collection.
+    - document_id (str): ID of the document.
+    - neighborhood_index (int): Position of the neighborhood in the document.
+    - hood (dict): The neighborhood with its edited text.
+    """
+    ensure_journal()
+    entry = journal_entry(collection_name, document_id, neighborhood_index, hood)
+    db.edit_journal_collection().update_one({key: entry[key] for key in ('document_id', 'collection_name',
+                                                                          'start_index')},
+                                            {'$set': entry}, upsert=True)
+
+
+def overlapping_edits(document_id, start_index, end_index):
+    """
+    Find the recorded edits of a document overlapping a range of its tokens, in any collection.
+
+    Parameters:
+    - document_id (str): ID of the document.
+    - start_index (int): Index of the first token of the range.
+    - end_index (int): Index after the last token of the range.
+
+    Returns:
+    - list: The overlapping journal entries.
+    """
+    ensure_journal()
+    return list(db.edit_journal_collection().find({'document_id': document_id,
+                                                   'start_index': {'$lt': end_index},
+                                                   'end_index': {'$gt': start_index}}))
+
+
+def pending_edits(document_ids=None, collection_name=None):
+    """
+    Get the recorded edits, ordered by document, collection and position.
+
+    Parameters:
+    - document_ids (list, optional): Only the edits of these documents.
+    - collection_name (str, optional): Only the edits of this neighborhoods' collection.
+
+    Returns:
+    - list: The journal entries.
+    """
+    ensure_journal()
+    return list(db.edit_journal_collection().find(_query(document_ids, collection_name)).sort(
+        [('document_id', ASCENDING), ('collection_name', ASCENDING), ('start_index', ASCENDING)]))
+
+
+def remove_edits(document_ids=None, collection_name=None):
+    """
+    Remove recorded edits, once they were saved to the corpus or their neighborhoods were collected again.
+
+    Parameters:
+    - document_ids (list, optional): Only the edits of these documents.
+    - collection_name (str, optional): Only the edits of this neighborhoods' collection.
+
+    Returns:
+    - int: Number of removed edits.
+    """
+    ensure_journal()
+    return db.edit_journal_collection().delete_many(_query(document_ids, collection_name)).deleted_count
+
+
+def _query(document_ids, collection_name):
+    query = {}
+    if document_ids is not None:
+        query['document_id'] = {'$in': list(document_ids)}
+    if collection_name is not None:
+        query['collection_name'] = collection_name
+    return query
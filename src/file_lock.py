@@ -0,0 +1,48 @@
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (Windows) the lock only protects the threads of a process
+    fcntl = None
+
+
+class FileLock:
+    """
+    Exclusive lock on a directory shared by the processes of the server, like the Streamlit process and the job
+    worker, held with flock on a lock file inside it. The lock is reentrant for the thread holding it, so methods
+    holding it can call each other.
+    """
+
+    LOCK_FILE_NAME = '.lock'
+
+    def __init__(self, directory):
+        self.path = directory / self.LOCK_FILE_NAME
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.lock_file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.lock_file = open(self.path, 'a')
+                if fcntl is not None:
+                    fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            except Exception:
+                if self.lock_file is not None:
+                    self.lock_file.close()
+                    self.lock_file = None
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if self.depth == 0:
+            # Closing the file releases the flock
+            self.lock_file.close()
+            self.lock_file = None
+        self.thread_lock.release()
@@ -0,0 +1,140 @@
+import hashlib
+import html
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import src.config as config
+
+
+def colorize_word(word, color):
+    return f'<span style="color: {color}; font-weight: bold;">{word}</span>'
+
+
+class Highlighter:
+    """
+    Counts and colors some terms in a text with a single regular expression, compiled once for the terms.
+
+    Terms are matched ignoring case, as substrings of the words or, if marked as whole words, only where they are
+    not preceded or followed by a word character. Where several terms match at the same position the longest one
+    is colored, and the shorter terms it contains are counted too.
+
+    Compared to coloring the tokens of the text one by one, the text is kept as it is instead of being joined
+    back from its tokens with spaces, the colored terms keep their case, the text is escaped as HTML, a term is
+    counted once per occurrence instead of once per token that contains it, and every whole word term is matched
+    in the whole text instead of only in its first token.
+
+    Parameters:
+    - terms (tuple): Terms to highlight, as (term, color, whole_word) tuples. Terms that only differ in case are the
+                     same term, and a substring term takes precedence over the same whole word term.
+    """
+
+    def __init__(self, terms):
+        self.terms = {}
+        for term, color, whole_word in terms:
+            term = term.lower()
+            if term and (term not in self.terms or not whole_word):
+                self.terms[term] = (color, whole_word)
+        self.term_list = list(self.terms)
+
+        # Longest terms first, so they are preferred where several terms start at the same position
+        alternatives = []
+        for index, term in sorted(enumerate(self.term_list), key=lambda item: -len(item[1])):
+            pattern = re.escape(term)
+            if self.terms[term][1]:
+                pattern = rf'(?<!\w){pattern}(?!\w)'
+            alternatives.append(f'(?P<t{index}>{pattern})')
+        self.pattern = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+
+        self.substring_terms = [term for term in self.term_list if not self.terms[term][1]]
+        self.contained_terms = {}
+
+    def _contained_counts(self, term, matched_text):
+        """
+        Count the substring terms found inside the text matched by a term, including the term itself.
+
+        Returns:
+        - tuple: (term, count) pairs.
+        """
+        key = (term, matched_text.lower())
+        counts = self.contained_terms.get(key)
+        if counts is None:
+            counts = ((term, 1),) + tuple((other, key[1].count(other)) for other in self.substring_terms
+                                          if other != term and other in key[1])
+            self.contained_terms[key] = counts
+        return counts
+
+    def __call__(self, text):
+        """
+        Count and color the terms in a text.
+
+        Parameters:
+        - text (str): The text.
+
+        Returns:
+        - tuple: Dictionary with the number of occurrences of every term, and the text as HTML with the terms
+                 colored.
+        """
+        terms_counts = dict.fromkeys(self.term_list, 0)
+        if self.pattern is None:
+            return terms_counts, html.escape(text, quote=False)
+
+        pieces = []
+        position = 0
+        for match in self.pattern.finditer(text):
+            term = self.term_list[int(match.lastgroup[1:])]
+            for contained_term, count in self._contained_counts(term, match.group()):
+                terms_counts[contained_term] += count
+            pieces.append(html.escape(text[position:match.start()], quote=False))
+            pieces.append(colorize_word(html.escape(match.group(), quote=False), self.terms[term][0]))
+            position = match.end()
+        pieces.append(html.escape(text[position:], quote=False))
+        return terms_counts, ''.join(pieces)
+
+
+@lru_cache(maxsize=config.highlighter_terms_cache_size)
+def get_highlighter(terms):
+    """
+    Get the compiled highlighter for some terms, compiling it only the first time it is requested in this process.
+    The highlighters of the last config.highlighter_terms_cache_size sets of terms are kept.
+
+    Parameters:
+    - terms (tuple): Terms to highlight, as (term, color, whole_word) tuples.
+
+    Returns:
+    - Highlighter: The compiled highlighter.
+    """
+    return Highlighter(terms)
+
+
+_rendered = OrderedDict()
+_rendered_lock = threading.Lock()
+
+
+def count_and_color_text(text, terms):
+    """
+    Count and color some terms in a text. The results are kept for the last config.highlighter_cache_size texts
+    and terms, so displaying the same text again doesn't go through it again.
+
+    Parameters:
+    - text (str): The text.
+    - terms (tuple): Terms to highlight, as (term, color, whole_word) tuples.
+
+    Returns:
+    - tuple: Dictionary with the number of occurrences of every term, and the text as HTML with the terms colored.
+    """
+    key = (hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest(), terms)
+    with _rendered_lock:
+        rendered = _rendered.get(key)
+        if rendered is not None:
+            _rendered.move_to_end(key)
+            return dict(rendered[0]), rendered[1]
+
+    terms_counts, colored_text = get_highlighter(terms)(text)
+
+    with _rendered_lock:
+        _rendered[key] = (terms_counts, colored_text)
+        while len(_rendered) > config.highlighter_cache_size:
+            _rendered.popitem(last=False)
+    return dict(terms_counts), colored_text
@@ -0,0 +1,344 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import src.config as config
+import src.file_lock as file_lock
+import src.token_store as token_store
+
+
+class InvertedIndex:
+    """
+    Positional postings index (term -> document -> token positions) over the documents of the token store.
+
+    The postings of the main segment are kept in three memory-mapped arrays: for every term id, a range of
+    (document, position) pairs sorted by document and position. Documents that changed in the token store after
+    the main segment was built are excluded from it and searched directly in the token store until there are
+    enough of them to make rebuilding the main segment worthwhile.
+
+    The main segment is built reading the token store in chunks and written straight into memory-mapped files, so
+    building it never holds a copy of the corpus in memory. The vocabulary only grows, so the terms matching a query
+    are kept and only the terms added since then are matched against it again.
+    """
+
+    TERM_OFFSETS_FILE_NAME = 'term_offsets.npy'
+    POSTING_DOCUMENTS_FILE_NAME = 'posting_documents.npy'
+    POSTING_POSITIONS_FILE_NAME = 'posting_positions.npy'
+    INDEX_FILE_NAME = 'index.json'
+
+    def __init__(self, store, directory=config.INVERTED_INDEX_DIR):
+        self.store = store
+        self.directory = directory
+        self.lock = threading.RLock()
+        # The Streamlit process and the job worker can both build the index
+        self.file_lock = file_lock.FileLock(directory)
+
+        self.document_ids = []
+        self.hashes = {}
+        self.vocabulary_size = 0
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.posting_documents = np.empty(0, dtype=np.int32)
+        self.posting_positions = np.empty(0, dtype=np.int32)
+
+        # Documents whose postings in the main segment are out of date
+        self.dirty_documents = set()
+        self.excluded_documents = np.zeros(0, dtype=bool)
+        self._store_generation = None
+
+        # Matching term ids by query key, with the size and last term of the vocabulary they were matched in
+        self.matches = OrderedDict()
+
+        self.load()
+
+    def load(self):
+        """
+        Load the main segment of the index from disk if it has already been built.
+        """
+        index_path = self.directory / self.INDEX_FILE_NAME
+        if not index_path.is_file():
+            return
+
+        # The arrays and the index file of a build in another process are only read once it finished
+        with self.file_lock:
+            with open(index_path, 'r', encoding='utf-8') as index_file:
+                index = json.load(index_file)
+
+            if index.get('tokenizer') != token_store.TOKENIZER_NAME:
+                return
+
+            self.document_ids = index['document_ids']
+            self.hashes = index['hashes']
+            self.vocabulary_size = index['vocabulary_size']
+            self.term_offsets = np.load(self.directory / self.TERM_OFFSETS_FILE_NAME, mmap_mode='r')
+            self.posting_documents = np.load(self.directory / self.POSTING_DOCUMENTS_FILE_NAME, mmap_mode='r')
+            self.posting_positions = np.load(self.directory / self.POSTING_POSITIONS_FILE_NAME, mmap_mode='r')
+            self._store_generation = None
+
+    def update(self):
+        """
+        Bring the index in step with the token store. Changed documents are marked as dirty and the main segment
+        is only rebuilt when the dirty documents hold a large share of the corpus tokens.
+        """
+        with self.lock:
+            self.store.refresh()
+            if self._store_generation == self.store.generation:
+                return
+
+            store_documents = self.store.documents
+            dirty_documents = {document_id for document_id, entry in store_documents.items()
+                               if self.hashes.get(document_id) != entry['hash']}
+            dirty_documents.update(document_id for document_id in self.hashes
+                                   if document_id not in store_documents)
+
+            dirty_tokens = sum(store_documents[document_id]['length'] for document_id in dirty_documents
+                               if document_id in store_documents)
+            total_tokens = max(1, sum(entry['length'] for entry in store_documents.values()))
+
+            if not self.document_ids or dirty_tokens > config.inverted_index_rebuild_ratio * total_tokens:
+                self.build()
+                return
+
+            self.dirty_documents = dirty_documents
+            self.excluded_documents = np.array([document_id in dirty_documents for document_id in self.document_ids],
+                                               dtype=bool)
+            self._store_generation = self.store.generation
+
+    def build(self):
+        """
+        Build the main segment of the index from all the documents of the token store and save it to disk.
+        """
+        with self.lock, self.file_lock:
+            store = self.store
+            document_ids = store.document_ids()
+            vocabulary_size = len(store.vocabulary)
+            chunks = self._document_chunks(document_ids)
+
+            # First pass: the number of postings of every term gives where its range starts
+            term_counts = np.zeros(vocabulary_size, dtype=np.int64)
+            for first_document, chunk_ids in chunks:
+                term_counts += np.bincount(self._chunk_token_ids(chunk_ids), minlength=vocabulary_size)
+            term_offsets = np.zeros(vocabulary_size + 1, dtype=np.int64)
+            np.cumsum(term_counts, out=term_offsets[1:])
+
+            # Second pass: the postings of every chunk are written after the ones of the previous chunks
+            self.directory.mkdir(parents=True, exist_ok=True)
+            total_postings = int(term_offsets[-1])
+            documents_path, posting_documents = self._open_array(self.POSTING_DOCUMENTS_FILE_NAME, total_postings)
+            positions_path, posting_positions = self._open_array(self.POSTING_POSITIONS_FILE_NAME, total_postings)
+            next_postings = term_offsets[:-1].copy()
+            for first_document, chunk_ids in chunks:
+                token_ids = self._chunk_token_ids(chunk_ids)
+                lengths = np.array([store.document_length(document_id) for document_id in chunk_ids], dtype=np.int64)
+                documents = np.repeat(np.arange(first_document, first_document + len(chunk_ids), dtype=np.int32),
+                                      lengths)
+                starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+                positions = (np.arange(len(token_ids), dtype=np.int64) - starts).astype(np.int32)
+
+                # A stable sort keeps the postings of every term ordered by document and position
+                order = np.argsort(token_ids, kind='stable')
+                sorted_token_ids = token_ids[order]
+                chunk_terms, term_starts, chunk_counts = np.unique(sorted_token_ids, return_index=True,
+                                                                   return_counts=True)
+                ranks = np.arange(len(order), dtype=np.int64) - np.repeat(term_starts, chunk_counts)
+                destinations = next_postings[sorted_token_ids] + ranks
+                posting_documents[destinations] = documents[order]
+                posting_positions[destinations] = positions[order]
+                next_postings[chunk_terms] += chunk_counts
+
+            self._save_array(self.TERM_OFFSETS_FILE_NAME, term_offsets)
+            self._close_array(documents_path, posting_documents)
+            self._close_array(positions_path, posting_positions)
+
+            index_path = self.directory / self.INDEX_FILE_NAME
+            temporary_path = index_path.with_name(index_path.name + '.tmp')
+            with open(temporary_path, 'w', encoding='utf-8') as index_file:
+                json.dump({'tokenizer': token_store.TOKENIZER_NAME,
+                           'document_ids': document_ids,
+                           'hashes': {document_id: store.documents[document_id]['hash']
+                                      for document_id in document_ids},
+                           'vocabulary_size': vocabulary_size}, index_file)
+            os.replace(temporary_path, index_path)
+
+            self.load()
+            self.dirty_documents = set()
+            self.excluded_documents = np.zeros(len(self.document_ids), dtype=bool)
+            self._store_generation = store.generation
+
+    def _document_chunks(self, document_ids):
+        """
+        Split the documents into consecutive chunks of at most config.inverted_index_build_chunk_tokens tokens, or
+        a single document if it is longer.
+
+        Parameters:
+        - document_ids (list): IDs of the documents, in the order of the index.
+
+        Returns:
+        - list: (index of the first document, IDs of the documents) tuples.
+        """
+        chunks = []
+        first_document = 0
+        chunk_tokens = 0
+        for document_index, document_id in enumerate(document_ids):
+            length = self.store.document_length(document_id)
+            if document_index > first_document and chunk_tokens + length > config.inverted_index_build_chunk_tokens:
+                chunks.append((first_document, document_ids[first_document:document_index]))
+                first_document, chunk_tokens = document_index, 0
+            chunk_tokens += length
+        if first_document < len(document_ids):
+            chunks.append((first_document, document_ids[first_document:]))
+        return chunks
+
+    def _chunk_token_ids(self, chunk_ids):
+        """
+        Parameters:
+        - chunk_ids (list): IDs of the documents of a chunk.
+
+        Returns:
+        - numpy.ndarray: The token ids of the documents one after another.
+        """
+        return np.concatenate([self.store.get_ids(document_id) for document_id in chunk_ids])
+
+    def _open_array(self, file_name, length):
+        """
+        Create the memory-mapped file of a new version of an array of the index.
+
+        Parameters:
+        - file_name (str): Name of the file.
+        - length (int): Length of the array.
+
+        Returns:
+        - tuple: The path the array is written to and the writable array.
+        """
+        temporary_path = self.directory / (file_name + '.tmp')
+        return temporary_path, np.lib.format.open_memmap(temporary_path, mode='w+', dtype=np.int32, shape=(length,))
+
+    def _close_array(self, temporary_path, array):
+        """
+        Flush an array opened with _open_array and replace the previous version with it.
+
+        Parameters:
+        - temporary_path (Path): The path the array was written to.
+        - array (numpy.memmap): The array.
+        """
+        array.flush()
+        os.replace(temporary_path, temporary_path.with_suffix(''))
+
+    def _save_array(self, file_name, array):
+        """
+        Save an array next to the index, replacing the previous version only once it is completely written.
+
+        Parameters:
+        - file_name (str): Name of the file.
+        - array (numpy.ndarray): The array to save.
+        """
+        path = self.directory / file_name
+        temporary_path = path.with_name(path.name + '.tmp')
+        with open(temporary_path, 'wb') as array_file:
+            np.save(array_file, array)
+        os.replace(temporary_path, path)
+
+    def matching_term_ids(self, predicate, key=None):
+        """
+        Find the ids of the vocabulary terms accepted by a predicate.
+
+        Parameters:
+        - predicate (callable): Function receiving a term and returning True if it matches.
+        - key (hashable, optional): Identifies what the predicate matches, such as the sequences and the version of
+                                    the corrections. The matching terms are then kept for the key, and later queries
+                                    only match the terms added to the vocabulary since.
+
+        Returns:
+        - numpy.ndarray: Array of matching term ids.
+        """
+        vocabulary = self.store.vocabulary
+        if key is None:
+            return np.array([term_id for term_id, term in enumerate(vocabulary) if predicate(term)], dtype=np.int32)
+
+        with self.lock:
+            checked, last_term, matching = self.matches.pop(key, (0, None, []))
+            # A vocabulary that isn't an extension of the one matched before is matched again from the start
+            if checked > len(vocabulary) or (checked and vocabulary[checked - 1] != last_term):
+                checked, matching = 0, []
+            vocabulary_size = len(vocabulary)
+            matching = matching + [term_id for term_id in range(checked, vocabulary_size)
+                                   if predicate(vocabulary[term_id])]
+            self.matches[key] = (vocabulary_size, vocabulary[vocabulary_size - 1] if vocabulary_size else None,
+                                 matching)
+            while len(self.matches) > config.inverted_index_matches_cache_size:
+                self.matches.popitem(last=False)
+            return np.array(matching, dtype=np.int32)
+
+    def positions(self, term_ids):
+        """
+        Find the positions where any of the given terms occurs in every document.
+
+        Parameters:
+        - term_ids (iterable): Ids of the terms.
+
+        Returns:
+        - dict: Mapping of document IDs to sorted arrays of token positions.
+        """
+        with self.lock:
+            self.update()
+            term_ids = np.unique(np.asarray(term_ids, dtype=np.int32))
+            hits = {}
+
+            # Postings from the main segment, skipping documents that changed since it was built
+            indexed_term_ids = term_ids[term_ids < self.vocabulary_size]
+            ranges = [(self.term_offsets[term_id], self.term_offsets[term_id + 1]) for term_id in indexed_term_ids]
+            ranges = [(start, end) for start, end in ranges if end > start]
+            if ranges:
+                documents = np.concatenate([self.posting_documents[start:end] for start, end in ranges])
+                positions = np.concatenate([self.posting_positions[start:end] for start, end in ranges])
+                if self.dirty_documents:
+                    keep = ~self.excluded_documents[documents]
+                    documents, positions = documents[keep], positions[keep]
+                order = np.lexsort((positions, documents))
+                documents, positions = documents[order], positions[order]
+                if len(documents):
+                    boundaries = np.flatnonzero(np.diff(documents)) + 1
+                    for document_index, document_positions in zip(documents[np.r_[0, boundaries]],
+                                                                  np.split(positions, boundaries)):
+                        hits[self.document_ids[document_index]] = document_positions
+
+            # Documents that changed since the main segment was built are searched directly
+            for document_id in self.dirty_documents:
+                if document_id not in self.store:
+                    continue
+                document_positions = np.flatnonzero(np.isin(self.store.get_ids(document_id), term_ids))
+                if len(document_positions):
+                    hits[document_id] = document_positions.astype(np.int32)
+
+            return hits
+
+    def documents_containing(self, term_ids):
+        """
+        Parameters:
+        - term_ids (iterable): Ids of the terms.
+
+        Returns:
+        - set: IDs of the documents where any of the terms occurs.
+        """
+        return set(self.positions(term_ids).keys())
+
+
+_inverted_index = None
+_inverted_index_lock = threading.Lock()
+
+
+def get_inverted_index():
+    """
+    Get the inverted index of this process, opening it the first time it is needed.
+
+    Returns:
+    - InvertedIndex: The inverted index, in step with the token store.
+    """
+    global _inverted_index
+    with _inverted_index_lock:
+        if _inverted_index is None:
+            _inverted_index = InvertedIndex(token_store.get_token_store())
+        _inverted_index.update()
+        return _inverted_index
@@ -0,0 +1,265 @@
+import argparse
+import datetime
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+import src.config as config
+import src.co_occurrences as co_occurrences
+import src.data_utils as data_utils
+import src.db as db
+import src.navigator as navigator
+import src.progress as progress
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def collect_neighborhoods_job(parameters):
+    """
+    Parameters:
+    - parameters (dict): The 'sequences' and 'size' of the neighborhoods.
+
+    Returns:
+    - str: Name of the collected neighborhoods' collection.
+    """
+    collection_info = data_utils.collect_neighborhoods_mongo_parallel(sequences_list=parameters['sequences'],
+                                                                      size=parameters['size'], info=False)
+    return collection_info['collection_name'] if collection_info else None
+
+
+def apply_corrections_job(parameters):
+    """
+    Apply the corrections saved when the job runs to the corpus and the neighborhoods.
+    """
+    data_utils.apply_corrections_all_collections_mongo_parallel(data_utils.get_corrections_from_mongo())
+
+
+def save_complete_text_job(parameters):
+    """
+    Parameters:
+    - parameters (dict): The 'document_id' and the new 'text' of the document.
+
+    Returns:
+    - bool: Whether the document was found and saved.
+    """
+    return data_utils.save_complete_text_to_mongo(parameters['document_id'], parameters['text'])
+
+
+def save_edited_neighborhoods_job(parameters):
+    """
+    Save the edits of neighborhoods pending when the job runs to the texts of their documents.
+    """
+    data_utils.save_edited_neighborhoods_to_corpus_mongo()
+
+
+def generate_co_occurrences_job(parameters):
+    """
+    Parameters:
+    - parameters (dict): The 'collection_name', the 'metadata_filters' and 'term' the neighborhoods are filtered by,
+                         the 'window_size', the 'filters' as described to the user and the 'target_words'.
+    """
+    collection_name = parameters['collection_name']
+    documents_navigator = navigator.NeighborhoodsNavigator.from_collection(
+        collection_name, data_utils.metadata_query(parameters['metadata_filters']), parameters['term'])
+    progress.stage('Generating co-occurrences', documents_navigator.total_neighborhoods())
+
+    coo = co_occurrences.get_co_occurrences()
+    query_engine = coo.get_co_occurrences_query_engine(collection_name, documents_navigator.iter_documents(),
+                                                       parameters['window_size'], parameters['filters'],
+                                                       parameters['target_words'])
+    top_co_occurrences = query_engine.top_co_occurrences(parameters['target_words'])
+    coo.store_top_co_occurrences_in_mongodb(top_co_occurrences, parameters['window_size'], parameters['filters'],
+                                            parameters['target_words'])
+
+
+# Operations that can run as jobs, by job type
+JOB_TYPES = {
+    'collect_neighborhoods': collect_neighborhoods_job,
+    'apply_corrections': apply_corrections_job,
+    'save_complete_text': save_complete_text_job,
+    'save_edited_neighborhoods': save_edited_neighborhoods_job,
+    'generate_co_occurrences': generate_co_occurrences_job,
+}
+
+_indexed = False
+_worker_process = None
+_worker_lock = threading.Lock()
+
+
+def ensure_indexes():
+    """
+    Create the indexes of the jobs collection used to claim and list jobs, once per process.
+    """
+    global _indexed
+    if not _indexed:
+        jobs_collection = db.jobs_collection()
+        jobs_collection.create_index([('status', ASCENDING), ('created_at', ASCENDING)])
+        jobs_collection.create_index([('created_at', DESCENDING)])
+        _indexed = True
+
+
+def submit(job_type, parameters=None, description=None):
+    """
+    Queue a job, starting a worker process to run it if config.jobs_start_worker and there is none.
+
+    Parameters:
+    - job_type (str): Type of the job, one of JOB_TYPES.
+    - parameters (dict, optional): Parameters of the job.
+    - description (str, optional): Description of the job shown to the user.
+
+    Returns:
+    - str: ID of the job.
+    """
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"Unknown job type {job_type}.")
+    ensure_indexes()
+    job_id = db.jobs_collection().insert_one({
+        'type': job_type,
+        'parameters': parameters or {},
+        'description': description or job_type,
+        'status': QUEUED,
+        'created_at': datetime.datetime.now(datetime.timezone.utc),
+        'attempts': 0,
+        'progress': {'stage': 'Queued', 'processed': 0, 'total': None, 'rate': 0.0, 'eta_seconds': None}
+    }).inserted_id
+    if config.jobs_start_worker:
+        ensure_worker()
+    return str(job_id)
+
+
+def get_jobs(job_ids):
+    """
+    Parameters:
+    - job_ids (list): IDs of the jobs.
+
+    Returns:
+    - dict: The jobs by ID, without their parameters.
+    """
+    jobs = db.jobs_collection().find({'_id': {'$in': [ObjectId(job_id) for job_id in job_ids]}},
+                                     {'parameters': 0})
+    return {str(job['_id']): job for job in jobs}
+
+
+def claim_job(worker_id):
+    """
+    Claim the oldest queued job. Jobs are claimed with a single atomic update, so a job is only run by one worker
+    even with several of them. Running jobs abandoned by their worker are queued again first, or marked as failed
+    once they were started config.jobs_max_attempts times.
+
+    Parameters:
+    - worker_id (str): ID of the worker claiming the job.
+
+    Returns:
+    - dict or None: The claimed job, or None if no job is queued.
+    """
+    jobs_collection = db.jobs_collection()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    stale_query = {'status': RUNNING,
+                   'heartbeat_at': {'$lt': now - datetime.timedelta(seconds=config.jobs_stale_seconds)}}
+    jobs_collection.update_many(
+        {**stale_query, 'attempts': {'$gte': config.jobs_max_attempts}},
+        {'$set': {'status': FAILED, 'finished_at': now,
+                  'error': f"The job was abandoned by its worker {config.jobs_max_attempts} times."},
+         '$unset': {'worker': ''}})
+    jobs_collection.update_many(stale_query, {'$set': {'status': QUEUED}, '$unset': {'worker': ''}})
+    return jobs_collection.find_one_and_update(
+        {'status': QUEUED},
+        {'$set': {'status': RUNNING, 'worker': worker_id, 'started_at': now, 'heartbeat_at': now},
+         '$inc': {'attempts': 1}},
+        sort=[('created_at', ASCENDING)], return_document=ReturnDocument.AFTER)
+
+
+def run_job(job):
+    """
+    Run a claimed job, writing its progress while it runs and its result or error once it finishes.
+
+    Parameters:
+    - job (dict): The claimed job.
+    """
+    jobs_collection = db.jobs_collection()
+    job_progress = progress.track(job['_id'])
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        # Long stages don't always report progress, but the job must not look abandoned
+        while not stop_heartbeat.wait(config.jobs_stale_seconds / 10):
+            job_progress.flush()
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    start_time = time.time()
+    print(f"Running job {job['_id']}: {job.get('description', job['type'])}.")
+    try:
+        result = JOB_TYPES[job['type']](job.get('parameters', {}))
+        update = {'status': DONE, 'result': result}
+    except Exception as e:
+        print(f"Job {job['_id']} failed: {e}")
+        update = {'status': FAILED, 'error': ''.join(traceback.format_exception(e))}
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join()
+        progress.untrack()
+
+    update['finished_at'] = datetime.datetime.now(datetime.timezone.utc)
+    update['seconds'] = time.time() - start_time
+    jobs_collection.update_one({'_id': job['_id']}, {'$set': update})
+    print(f"Job {job['_id']} {update['status']} in {update['seconds']:.2f} seconds.")
+
+
+def run_worker(once=False, poll_seconds=None):
+    """
+    Run queued jobs one after another.
+
+    Parameters:
+    - once (bool): Stop when no job is queued instead of waiting for new ones.
+    - poll_seconds (float, optional): Seconds between checks for queued jobs. Defaults to config.jobs_poll_seconds.
+    """
+    ensure_indexes()
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    poll_seconds = poll_seconds or config.jobs_poll_seconds
+    print(f"Worker {worker_id} waiting for jobs.")
+    while True:
+        job = claim_job(worker_id)
+        if job is not None:
+            run_job(job)
+        elif once:
+            break
+        else:
+            time.sleep(poll_seconds)
+
+
+def ensure_worker():
+    """
+    Start a worker process if this process hasn't started one or it exited.
+    """
+    global _worker_process
+    with _worker_lock:
+        if _worker_process is None or _worker_process.poll() is not None:
+            _worker_process = subprocess.Popen([sys.executable, '-m', 'src.jobs'],
+                                               cwd=Path(__file__).resolve().parent.parent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the queued jobs of the corpus.")
+    parser.add_argument('--once', action='store_true', help="Stop when no job is queued.")
+    parser.add_argument('--poll-seconds', type=float, default=None, help="Seconds between checks for queued jobs.")
+    arguments = parser.parse_args()
+    # The operations show messages in the interface too, which only warn outside of it
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    run_worker(arguments.once, arguments.poll_seconds)
+
+
+if __name__ == '__main__':
+    main()
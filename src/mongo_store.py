@@ -1,12 +1,12 @@
 import json
 from pathlib import Path
-from config import JSON_DIR, CSV_DIR, mongo_connection, mongo_database
+from config import JSON_DIR, CSV_DIR
 import utils
 import gzip
-from pymongo import MongoClient
 import csv
 import pandas as pd
 import data_utils
+import db
 
 
 def add_num_pages(name_file_no_num_pages, name_file_num_pages):
@@ -61,9 +61,7 @@ def add_whole_corpus_to_mongo_db(gzipped_file_path, metadata_file_name, collecti
         quality_file_path = Path('../csv/', quality_file_name)
         metadata_dict = add_quality_info(metadata_dict, quality_file_path)
 
-    client = MongoClient(mongo_connection)
-    db = client[mongo_database]
-    collection = db[collection]
+    collection = db.get_collection(collection)
 
     for key, text_content in json_content.items():
         document = {
@@ -75,33 +73,22 @@ def add_whole_corpus_to_mongo_db(gzipped_file_path, metadata_file_name, collecti
         collection.insert_one(document)
 
 
-def search_term(search_term="taturaleza"):
-    client = MongoClient(mongo_connection)
-    db = client[mongo_database]
-    collection = db["neighborhoods_naturaleza"]
+def search_term(search_term="taturaleza", size=10):
+    # Find the occurrences of the term in the corpus through the positional inverted index instead of scanning
+    # a neighborhoods collection with a regular expression
+    occurrences = data_utils.keyword_in_context(search_term, size)
 
-    # Construct a query using $elemMatch to search in all neighborhoods of all documents
-    query = {
-        "neighborhoods.neighborhood": {"$regex": search_term, "$options": "i"}
-    }
+    # Iterate over the occurrences grouped by document
+    current_document = None
+    for occurrence in occurrences:
+        if occurrence['document'] != current_document:
+            current_document = occurrence['document']
+            print("Matching Document:")
+            print(current_document)
 
-    # Find documents matching the query
-    matching_documents = collection.find(query)
-
-    # Iterate over matching documents
-    for document in matching_documents:
-        print("Matching Document:")
-        print(document['_id'])  # Assuming '_id' is the document name field
-
-        # Loop through neighborhoods in the matching document
-        for neighborhood in document['neighborhoods']:
-            if "neighborhood" in neighborhood and \
-                    search_term.lower() in neighborhood["neighborhood"].lower():
-                print("Found in neighborhood:")
-                print(neighborhood["neighborhood"])
-                print("Text of the neighborhood:")
-                print(neighborhood.get("text", "No text available"))
-                print("\n")
+        print(f"Found {occurrence['term']} at position {occurrence['position']}:")
+        print(occurrence['neighborhood'])
+        print("\n")
 
 
 def add_corrections_to_mongo(corrections_file_name):
@@ -112,12 +99,8 @@ def add_corrections_to_mongo(corrections_file_name):
     # Read CSV file into a DataFrame
     df = pd.read_csv(Path('../csv/', corrections_file_name), names=['Original term', 'Correct term'])
 
-    # Connect to MongoDB
-    client = MongoClient(mongo_connection)  # Replace 'your_mongodb_uri' with your MongoDB connection URI
-    db = client[mongo_database]  # Specify the database
-
     # Create or get the corrections collection
-    corrections_collection = db['corrections']
+    corrections_collection = db.corrections_collection()
 
     # Convert DataFrame to a list of dictionaries (each row as a dictionary)
     corrections_data = df.to_dict(orient='records')
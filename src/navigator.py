@@ -0,0 +1,233 @@
+import concurrent.futures
+import copy
+import re
+import threading
+from collections import OrderedDict
+
+import src.config as config
+import src.corrections_overlay as corrections_overlay
+import src.db as db
+
+# Background threads that fetch the documents next to the displayed one, shared by all the sessions
+_prefetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.navigator_prefetch_workers,
+                                                           thread_name_prefix='navigator_prefetch')
+
+
+def neighborhoods_expression(term=None):
+    """
+    Aggregation expression for the neighborhoods of a document, keeping only those that contain a term.
+
+    Parameters:
+    - term (str, optional): Text the neighborhoods must contain. All the neighborhoods are kept without it.
+
+    Returns:
+    - str or dict: The expression.
+    """
+    neighborhoods = {'$ifNull': ['$neighborhoods', []]}
+    if not term:
+        return neighborhoods
+    return {'$filter': {'input': neighborhoods, 'as': 'hood',
+                        'cond': {'$gte': [{'$indexOfCP': ['$$hood.neighborhood', term]}, 0]}}}
+
+
+class NeighborhoodsNavigator:
+    """
+    Navigates the documents of a neighborhoods' collection, or of a filtered part of it, without loading it.
+
+    Only the ordered document IDs and the number of neighborhoods of every document are kept. The neighborhoods
+    and metadata of a document are fetched when it is displayed, filtered by MongoDB, and the documents before and
+    after it are fetched in the background so moving to them doesn't wait for the database. A few fetched
+    documents are kept in a small cache.
+    """
+
+    def __init__(self, collection_name, document_ids, neighborhoods_counts, query=None, term=None):
+        self.collection_name = collection_name
+        self.document_ids = list(document_ids)
+        self.neighborhoods_counts = list(neighborhoods_counts)
+        self.query = query or {}
+        self.term = term or None
+
+        self.cache = OrderedDict()
+        self.prefetching = {}
+        self.lock = threading.Lock()
+        # Increased on invalidation, so documents fetched before it are not cached
+        self.generation = 0
+
+    @classmethod
+    def from_collection(cls, collection_name, query=None, term=None):
+        """
+        Create a navigator over the documents of a collection that match a query, sorted by ID. The documents are
+        filtered and their neighborhoods counted by MongoDB, so only their IDs and counts are transferred.
+
+        Parameters:
+        - collection_name (str): Name of the neighborhoods' collection.
+        - query (dict, optional): MongoDB query on the documents, for example on their metadata.
+        - term (str, optional): Only navigate the neighborhoods that contain this text.
+
+        Returns:
+        - NeighborhoodsNavigator: The navigator.
+        """
+        db.ensure_neighborhoods_indexes(collection_name)
+        collection = db.neighborhoods_collection(collection_name)
+
+        match = dict(query or {})
+        if term:
+            # Skip the documents without the term before their neighborhoods are filtered one by one
+            match['neighborhoods.neighborhood'] = {'$regex': re.escape(term)}
+        pipeline = [{'$match': match},
+                    {'$project': {'count': {'$size': neighborhoods_expression(term)}}},
+                    {'$match': {'count': {'$gt': 0}}} if term else None,
+                    {'$sort': {'_id': 1}}]
+
+        document_ids, neighborhoods_counts = [], []
+        for document in collection.aggregate([stage for stage in pipeline if stage is not None]):
+            document_ids.append(document['_id'])
+            neighborhoods_counts.append(document['count'])
+
+        return cls(collection_name, document_ids, neighborhoods_counts, query, term)
+
+    def __len__(self):
+        return len(self.document_ids)
+
+    def total_neighborhoods(self):
+        """
+        Returns:
+        - int: Number of neighborhoods of all the navigated documents.
+        """
+        return sum(self.neighborhoods_counts)
+
+    def neighborhoods_count(self, index):
+        """
+        Parameters:
+        - index (int): Position of the document in the navigator.
+
+        Returns:
+        - int: Number of neighborhoods of the document.
+        """
+        return self.neighborhoods_counts[index]
+
+    def document(self, index, prefetch=True):
+        """
+        Get a document with its metadata and the navigated neighborhoods.
+
+        Parameters:
+        - index (int): Position of the document in the navigator.
+        - prefetch (bool): Fetch the previous and next documents in the background.
+
+        Returns:
+        - dict: The document, with its '_id', 'metadata' and 'neighborhoods'.
+        """
+        document_id = self.document_ids[index]
+        with self.lock:
+            document = self.cache.get(document_id)
+            future = self.prefetching.get(document_id)
+            if document is not None:
+                self.cache.move_to_end(document_id)
+
+        if document is None:
+            document = future.result() if future is not None else self._fetch(document_id)
+
+        if prefetch and len(self.document_ids) > 1:
+            for neighbor_index in ((index + 1) % len(self.document_ids), (index - 1) % len(self.document_ids)):
+                self._prefetch(self.document_ids[neighbor_index])
+        return document
+
+    def _prefetch(self, document_id):
+        with self.lock:
+            if document_id in self.cache or document_id in self.prefetching:
+                return
+            self.prefetching[document_id] = _prefetch_executor.submit(self._fetch, document_id)
+
+    def _fetch(self, document_id):
+        """
+        Read a document from the database and keep it in the cache.
+
+        Parameters:
+        - document_id: ID of the document.
+
+        Returns:
+        - dict: The document, with only the navigated neighborhoods.
+        """
+        generation = self.generation
+        try:
+            documents = list(self._aggregate({'_id': document_id}))
+            document = documents[0] if documents else {'_id': document_id, 'metadata': {}, 'neighborhoods': []}
+
+            with self.lock:
+                if generation == self.generation:
+                    self.cache[document_id] = document
+                    self.cache.move_to_end(document_id)
+                    while len(self.cache) > config.navigator_cache_size:
+                        self.cache.popitem(last=False)
+            return document
+        finally:
+            with self.lock:
+                self.prefetching.pop(document_id, None)
+
+    def iter_documents(self, batch_size=None):
+        """
+        Read all the navigated documents from the database in batches, without keeping them.
+
+        Parameters:
+        - batch_size (int, optional): Number of documents read at once. Defaults to config.navigator_batch_size.
+
+        Returns:
+        - iterator: Documents with their '_id', 'metadata' and navigated 'neighborhoods', sorted by ID.
+        """
+        batch_size = batch_size or config.navigator_batch_size
+        for start in range(0, len(self.document_ids), batch_size):
+            yield from self._aggregate({'_id': {'$in': self.document_ids[start:start + batch_size]}})
+
+    def _aggregate(self, match):
+        """
+        Read documents with their metadata and only the navigated neighborhoods, filtered by MongoDB.
+
+        Parameters:
+        - match (dict): MongoDB query selecting the documents by ID.
+
+        Returns:
+        - iterator: The documents, sorted by ID.
+        """
+        collection = db.neighborhoods_collection(self.collection_name)
+        pipeline = [{'$match': match},
+                    {'$project': {'metadata': {'$ifNull': ['$metadata', {}]},
+                                  'neighborhoods': neighborhoods_expression(self.term)}},
+                    {'$sort': {'_id': 1}}]
+        overlay = corrections_overlay.get_corrections_overlay()
+        for document in collection.aggregate(pipeline):
+            if overlay:
+                # The neighborhoods are stored with their original tokens and shown corrected
+                for hood in document['neighborhoods']:
+                    hood['neighborhood'] = overlay.correct_text(hood['neighborhood'])
+            yield document
+
+    def update_neighborhood(self, document_id, start_index, changes):
+        """
+        Apply to the cached copy of a document the changes saved to one of its neighborhoods.
+
+        Parameters:
+        - document_id: ID of the document.
+        - start_index (int): Start index of the neighborhood in the document.
+        - changes (dict): New values of the neighborhood's fields.
+        """
+        with self.lock:
+            document = self.cache.get(document_id)
+            if document is None:
+                return
+            for hood in document['neighborhoods']:
+                if hood['start_index'] == start_index:
+                    hood.update(copy.deepcopy(changes))
+
+    def invalidate(self, document_id=None):
+        """
+        Forget the cached copy of a document, or of all the documents, so they are read again from the database.
+
+        Parameters:
+        - document_id (optional): ID of the document. Defaults to all the documents.
+        """
+        with self.lock:
+            self.generation += 1
+            if document_id is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(document_id, None)
@@ -0,0 +1,109 @@
+import datetime
+
+import src.db as db
+
+# Metadata fields the neighborhoods can be filtered by, with the names of their filters in the interface
+FACETS = {'periodo': 'Periodos', 'nacionalidad': 'Nacionalidad', 'entidad territorial': 'Entidad Territorial'}
+
+
+def compute_statistics(collection_name):
+    """
+    Count the documents and neighborhoods of a neighborhoods' collection, in total and for every value of the
+    metadata fields it can be filtered by. The counts are computed by MongoDB in a single aggregation.
+
+    Parameters:
+    - collection_name (str): Name of the neighborhoods' collection.
+
+    Returns:
+    - dict: The statistics document of the collection.
+    """
+    neighborhoods_count = {'$size': {'$ifNull': ['$neighborhoods', []]}}
+    facets = {'totals': [{'$group': {'_id': None, 'documents': {'$sum': 1},
+                                     'neighborhoods': {'$sum': neighborhoods_count}}}]}
+    for index, field in enumerate(FACETS):
+        facets[f'facet_{index}'] = [{'$group': {'_id': f'$metadata.{field}', 'documents': {'$sum': 1},
+                                                'neighborhoods': {'$sum': neighborhoods_count}}},
+                                    {'$match': {'_id': {'$ne': None}}},
+                                    {'$sort': {'_id': 1}}]
+
+    result = next(db.neighborhoods_collection(collection_name).aggregate([{'$facet': facets}]), {})
+    totals = result.get('totals') or [{'documents': 0, 'neighborhoods': 0}]
+    return {'_id': collection_name,
+            'documents': totals[0]['documents'],
+            'neighborhoods': totals[0]['neighborhoods'],
+            # Values are stored as a list since they can't always be used as field names
+            'facets': {field: [{'value': value['_id'], 'documents': value['documents'],
+                                'neighborhoods': value['neighborhoods']}
+                               for value in result.get(f'facet_{index}', [])]
+                       for index, field in enumerate(FACETS)},
+            'updated_at': datetime.datetime.now(datetime.timezone.utc)}
+
+
+def update_statistics(collection_name):
+    """
+    Compute and save the statistics of a neighborhoods' collection, after its neighborhoods were collected or
+    updated.
+
+    Parameters:
+    - collection_name (str): Name of the neighborhoods' collection.
+
+    Returns:
+    - dict: The statistics document of the collection.
+    """
+    statistics = compute_statistics(collection_name)
+    db.neighborhood_statistics_collection().replace_one({'_id': collection_name}, statistics, upsert=True)
+    return statistics
+
+
+def get_statistics(collection_name):
+    """
+    Get the saved statistics of a neighborhoods' collection, computing them for collections collected before the
+    statistics were kept.
+
+    Parameters:
+    - collection_name (str): Name of the neighborhoods' collection.
+
+    Returns:
+    - dict: The statistics document of the collection.
+    """
+    statistics = db.neighborhood_statistics_collection().find_one({'_id': collection_name})
+    return statistics if statistics is not None else update_statistics(collection_name)
+
+
+def facet_values(statistics, field):
+    """
+    Parameters:
+    - statistics (dict): The statistics document of a collection.
+    - field (str): The metadata field.
+
+    Returns:
+    - list: The sorted distinct values of the field in the collection.
+    """
+    return [value['value'] for value in statistics['facets'].get(field, [])]
+
+
+def filtered_counts(statistics, filters):
+    """
+    Get the number of documents and neighborhoods left by some filters from the statistics of the collection. This
+    is only possible without filters or with the values of a single metadata field, since the statistics don't
+    count combinations of values or terms.
+
+    Parameters:
+    - statistics (dict): The statistics document of a collection.
+    - filters (dict): Applied filters, as the lists of selected values by filter name.
+
+    Returns:
+    - tuple or None: The number of documents and neighborhoods, or None if they can't be known from the statistics.
+    """
+    filters = {name: values for name, values in filters.items() if values}
+    if not filters:
+        return statistics['documents'], statistics['neighborhoods']
+    if len(filters) > 1:
+        return None
+
+    (name, selected_values), = filters.items()
+    field = next((field for field, filter_name in FACETS.items() if filter_name == name), None)
+    if field is None:
+        return None
+    values = [value for value in statistics['facets'].get(field, []) if value['value'] in selected_values]
+    return sum(value['documents'] for value in values), sum(value['neighborhoods'] for value in values)
@@ -0,0 +1,89 @@
+import bisect
+
+
+class PieceTable:
+    """
+    Pending edits of a document, as replacements of ranges of its original tokens.
+
+    The edits are kept sorted by their start and can't overlap, so any number of them can be pending at once
+    whatever their order and lengths: their ranges always refer to the original tokens, and the edited document is
+    built in a single pass over them.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.edits = []
+
+    def __len__(self):
+        return len(self.edits)
+
+    def __iter__(self):
+        return iter(self.edits)
+
+    def overlapping(self, start, end):
+        """
+        Find the pending edits overlapping a range of the original tokens.
+
+        Parameters:
+        - start (int): Index of the first token of the range.
+        - end (int): Index after the last token of the range.
+
+        Returns:
+        - list: The overlapping edits, as dictionaries with their 'start', 'end', 'tokens' and 'source'.
+        """
+        index = bisect.bisect_left(self.starts, start)
+        # The edit starting before the range can still reach into it
+        if index > 0 and self.edits[index - 1]['end'] > start:
+            index -= 1
+        overlapping = []
+        while index < len(self.edits) and self.edits[index]['start'] < end:
+            if self.edits[index]['end'] > start or self.edits[index]['start'] == start:
+                overlapping.append(self.edits[index])
+            index += 1
+        return overlapping
+
+    def add(self, start, end, tokens, source=None):
+        """
+        Add an edit replacing a range of the original tokens. An edit of exactly the same range replaces it.
+
+        Parameters:
+        - start (int): Index of the first replaced token.
+        - end (int): Index after the last replaced token.
+        - tokens (list): The tokens replacing the range.
+        - source (optional): Where the edit comes from, for example its neighborhood.
+
+        Raises:
+        - ValueError: If the range overlaps another pending edit.
+        """
+        if not 0 <= start <= end:
+            raise ValueError(f"Invalid range of tokens [{start}, {end}).")
+        edit = {'start': start, 'end': end, 'tokens': list(tokens), 'source': source}
+        overlapping = self.overlapping(start, end)
+        if any(other['start'] != start or other['end'] != end for other in overlapping):
+            raise ValueError(f"Range of tokens [{start}, {end}) overlaps a pending edit.")
+
+        index = bisect.bisect_left(self.starts, start)
+        if overlapping:
+            self.edits[index] = edit
+        else:
+            self.starts.insert(index, start)
+            self.edits.insert(index, edit)
+
+    def apply(self, tokens):
+        """
+        Build the edited document in a single pass.
+
+        Parameters:
+        - tokens (list): The original tokens of the document.
+
+        Returns:
+        - list: The edited tokens.
+        """
+        edited_tokens = []
+        position = 0
+        for edit in self.edits:
+            edited_tokens.extend(tokens[position:edit['start']])
+            edited_tokens.extend(edit['tokens'])
+            position = max(position, edit['end'])
+        edited_tokens.extend(tokens[position:])
+        return edited_tokens
@@ -0,0 +1,121 @@
+import datetime
+import threading
+import time
+
+import src.config as config
+import src.db as db
+
+
+class JobProgress:
+    """
+    Progress of a running job, written to its document in the jobs collection: the current stage, the items
+    processed out of the total of the stage, the throughput and the estimated time left. Progress is written at most
+    every config.jobs_progress_interval_seconds, and the writes are also the heartbeat of the job.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.lock = threading.Lock()
+        self.stage_name = None
+        self.total = None
+        self.processed = 0
+        self.stage_started_at = time.monotonic()
+        self.written_at = 0.0
+
+    def start_stage(self, name, total=None):
+        """
+        Parameters:
+        - name (str): Description of the stage.
+        - total (int, optional): Number of items the stage processes, if known.
+        """
+        with self.lock:
+            self.stage_name = name
+            self.total = total
+            self.processed = 0
+            self.stage_started_at = time.monotonic()
+            self._write()
+
+    def advance(self, count=1):
+        """
+        Parameters:
+        - count (int): Number of items processed since the last call.
+        """
+        with self.lock:
+            self.processed += count
+            if time.monotonic() - self.written_at >= config.jobs_progress_interval_seconds:
+                self._write()
+
+    def snapshot(self):
+        """
+        Returns:
+        - dict: The 'stage', items 'processed' and 'total', 'rate' in items per second and 'eta_seconds' left.
+        """
+        elapsed_time = time.monotonic() - self.stage_started_at
+        rate = self.processed / elapsed_time if elapsed_time > 0 else 0.0
+        eta_seconds = None
+        if self.total is not None and rate > 0:
+            eta_seconds = max(self.total - self.processed, 0) / rate
+        return {'stage': self.stage_name, 'processed': self.processed, 'total': self.total, 'rate': rate,
+                'eta_seconds': eta_seconds}
+
+    def flush(self):
+        with self.lock:
+            self._write()
+
+    def _write(self):
+        self.written_at = time.monotonic()
+        db.jobs_collection().update_one({'_id': self.job_id},
+                                        {'$set': {'progress': self.snapshot(),
+                                                  'heartbeat_at': datetime.datetime.now(datetime.timezone.utc)}})
+
+
+# Progress of the job running in this process, if any
+_current_progress = None
+
+
+def track(job_id):
+    """
+    Report the progress of the operations run from now on to a job.
+
+    Parameters:
+    - job_id: ID of the job.
+
+    Returns:
+    - JobProgress: The progress of the job.
+    """
+    global _current_progress
+    _current_progress = JobProgress(job_id)
+    return _current_progress
+
+
+def untrack():
+    """
+    Write the last progress of the tracked job and stop reporting to it.
+    """
+    global _current_progress
+    if _current_progress is not None:
+        _current_progress.flush()
+    _current_progress = None
+
+
+def stage(name, total=None):
+    """
+    Start a new stage of the tracked job. Does nothing when no job is tracked, for example in the interface.
+
+    Parameters:
+    - name (str): Description of the stage.
+    - total (int, optional): Number of items the stage processes, if known.
+    """
+    if _current_progress is not None:
+        _current_progress.start_stage(name, total)
+
+
+def advance(count=1):
+    """
+    Count items processed in the current stage of the tracked job. Does nothing when no job is tracked.
+
+    Parameters:
+    - count (int): Number of items processed since the last call.
+    """
+    if _current_progress is not None:
+        _current_progress.advance(count)
@@ -0,0 +1,170 @@
+from collections import deque
+from functools import lru_cache
+
+
+def is_word_character(character):
+    """
+    Check if a character is a word character in the sense of the regular expression class \\w.
+
+    Parameters:
+    - character (str): A single character.
+
+    Returns:
+    - bool: True if the character is a letter, a digit or an underscore.
+    """
+    return character.isalnum() or character == '_'
+
+
+def is_word_boundary(text, index):
+    """
+    Check if there is a word boundary (the regular expression \\b) at a position of a text.
+
+    Parameters:
+    - text (str): The text.
+    - index (int): Position between two characters, from 0 to len(text).
+
+    Returns:
+    - bool: True if there is a word boundary at the position.
+    """
+    before = index > 0 and is_word_character(text[index - 1])
+    after = index < len(text) and is_word_character(text[index])
+    return before != after
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton finding the occurrences of many patterns in a text in a single pass over it.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+
+        # Trie of the patterns: transitions, failure links and the patterns ending at every state
+        self.transitions = [{}]
+        self.failures = [0]
+        self.outputs = [[]]
+
+        for pattern_index, pattern in enumerate(self.patterns):
+            state = 0
+            for character in pattern:
+                next_state = self.transitions[state].get(character)
+                if next_state is None:
+                    next_state = len(self.transitions)
+                    self.transitions[state][character] = next_state
+                    self.transitions.append({})
+                    self.failures.append(0)
+                    self.outputs.append([])
+                state = next_state
+            self.outputs[state].append(pattern_index)
+
+        # Breadth first computation of the failure links
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                failure = self.failures[state]
+                while failure and character not in self.transitions[failure]:
+                    failure = self.failures[failure]
+                failure_state = self.transitions[failure].get(character, 0)
+                self.failures[next_state] = failure_state if failure_state != next_state else 0
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.failures[next_state]]
+
+    def iter_matches(self, text):
+        """
+        Find the occurrences of the patterns in a text.
+
+        Parameters:
+        - text (str): The text to search.
+
+        Returns:
+        - iterator: (start, end, pattern index) tuples for every occurrence.
+        """
+        transitions, failures, outputs, patterns = self.transitions, self.failures, self.outputs, self.patterns
+        state = 0
+        for index, character in enumerate(text):
+            while state and character not in transitions[state]:
+                state = failures[state]
+            state = transitions[state].get(character, 0)
+            for pattern_index in outputs[state]:
+                yield index + 1 - len(patterns[pattern_index]), index + 1, pattern_index
+
+
+class SequencesMatcher:
+    """
+    Matcher compiled once for a list of neighborhood sequences, checking a term against all of them at once.
+
+    It follows the same rules as data_utils.term_matches_sequences: sequences between double quotes must appear as
+    whole words in the term and any sequence (other than a lone quote) matches if it is part of the term. Whole
+    words equal to the term are found in a hashed set, every other sequence is searched with a single Aho-Corasick
+    pass over the term. Results are memoized per term, since the same terms repeat all over the corpus.
+    """
+
+    def __init__(self, sequences_list, max_cache_size=1_000_000):
+        self.sequences_list = list(sequences_list)
+        self.max_cache_size = max_cache_size
+        self.cache = {}
+
+        substrings = [sequence for sequence in self.sequences_list if sequence not in {'"', "'"}]
+        whole_words = [sequence[1:-1] for sequence in self.sequences_list
+                       if sequence.startswith('"') and sequence.endswith('"')]
+
+        # An empty sequence is part of any term, and an empty whole word matches any term with a word character
+        self.match_all = '' in substrings
+        self.match_word_characters = '' in whole_words
+
+        # A term equal to a whole word that starts and ends with word characters always matches it
+        self.exact_whole_words = {word for word in whole_words
+                                  if word and is_word_character(word[0]) and is_word_character(word[-1])}
+
+        patterns = [(substring, False) for substring in set(substrings) if substring]
+        patterns += [(word, True) for word in set(whole_words) if word]
+        self.whole_word_patterns = [is_whole_word for _, is_whole_word in patterns]
+        self.automaton = AhoCorasick(pattern for pattern, _ in patterns)
+
+    def _match(self, term):
+        if self.match_all or term in self.exact_whole_words:
+            return True
+        if self.match_word_characters and any(is_word_character(character) for character in term):
+            return True
+
+        whole_word_patterns = self.whole_word_patterns
+        for start, end, pattern_index in self.automaton.iter_matches(term):
+            if not whole_word_patterns[pattern_index]:
+                return True
+            if is_word_boundary(term, start) and is_word_boundary(term, end):
+                return True
+        return False
+
+    def matches(self, term):
+        """
+        Check if a term matches any of the sequences.
+
+        Parameters:
+        - term (str): The term (token) to check.
+
+        Returns:
+        - bool: True if the term matches any sequence.
+        """
+        result = self.cache.get(term)
+        if result is None:
+            if len(self.cache) >= self.max_cache_size:
+                self.cache.clear()
+            result = self.cache[term] = self._match(term)
+        return result
+
+    __call__ = matches
+
+
+@lru_cache(maxsize=32)
+def get_sequences_matcher(sequences):
+    """
+    Get the compiled matcher for some sequences, compiling it only the first time it is requested in this process.
+
+    Parameters:
+    - sequences (tuple): The sequences to match.
+
+    Returns:
+    - SequencesMatcher: The compiled matcher.
+    """
+    return SequencesMatcher(sequences)
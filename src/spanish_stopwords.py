@@ -1,6 +1,6 @@
 import nltk
 from nltk.corpus import stopwords
-import src.data_utils as data_utils
+import src.tokenizers as tokenizers
 
 
 class StopWords:
@@ -206,7 +206,7 @@ class StopWords:
 
     def remove_stopwords(self, text):
         # Tokenize the text
-        words = data_utils.tokenize(text)
+        words = tokenizers.tokenize(text)
 
         # Get the stopwords
         stop_words = self.get_stopwords()
@@ -0,0 +1,92 @@
+import src.config as config
+import src.tokenizers as tokenizers
+import src.utils as utils
+
+
+class TextNormalizer:
+    """
+    Cleans neighborhoods into the words counted in the co-occurrences: lowercased, without stopwords, accents
+    (except in 'ñ') or characters other than letters, and with at least a minimum length.
+
+    The text is tokenized once and every distinct token is normalized only the first time it is seen, since the
+    same words repeat all over the corpus. The results are the same as removing the stopwords, accents and
+    non-letters from the whole text and tokenizing it again after every step, because the text is joined back
+    with spaces between those steps and the characters left after them are only letters and spaces.
+    """
+
+    def __init__(self, stop_words, min_length=3, max_cache_size=config.text_normalization_cache_size):
+        self.stop_words = set(stop_words)
+        self.min_length = min_length
+        self.max_cache_size = max_cache_size
+        self.cache = {}
+
+    def _normalize_token(self, token):
+        if token.lower() in self.stop_words:
+            return ()
+        if token.isascii():
+            normalized = ''.join(character for character in token if character.isalpha() or character.isspace())
+        else:
+            normalized = utils.remove_non_letters(utils.remove_accents(token))
+        # Transliterated characters can become several words
+        return tuple(word for word in normalized.split()
+                     if word.lower() not in self.stop_words and len(word) >= self.min_length)
+
+    def normalize_token(self, token):
+        """
+        Normalize a single token.
+
+        Parameters:
+        - token (str): A lowercase token.
+
+        Returns:
+        - tuple: The words the token becomes, usually one or none.
+        """
+        words = self.cache.get(token)
+        if words is None:
+            if len(self.cache) >= self.max_cache_size:
+                self.cache.clear()
+            words = self.cache[token] = self._normalize_token(token)
+        return words
+
+    def normalize_tokens(self, tokens):
+        """
+        Normalize the tokens of a lowercase text.
+
+        Parameters:
+        - tokens (list): The tokens.
+
+        Returns:
+        - list: The normalized words.
+        """
+        cache = self.cache
+        words = []
+        for token in tokens:
+            token_words = cache.get(token)
+            if token_words is None:
+                token_words = self.normalize_token(token)
+            words.extend(token_words)
+        return words
+
+    def normalize(self, text):
+        """
+        Normalize a text, such as a neighborhood.
+
+        Parameters:
+        - text (str): The text.
+
+        Returns:
+        - list: The normalized words.
+        """
+        return self.normalize_tokens(tokenizers.tokenize(text.lower()))
+
+    def normalize_many(self, texts):
+        """
+        Normalize many texts at once, sharing the normalized tokens between them.
+
+        Parameters:
+        - texts (iterable): The texts.
+
+        Returns:
+        - list: The list of normalized words of every text.
+        """
+        return [self.normalize(text) for text in texts]
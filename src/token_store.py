@@ -0,0 +1,425 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+import src.config as config
+import src.db as db
+import src.file_lock as file_lock
+import src.tokenizers as tokenizers
+import src.worker_pool as worker_pool
+
+# Identifies the tokenizer the stored tokens were produced with
+TOKENIZER_NAME = tokenizers.TOKENIZERS[config.tokenizer_backend].name
+
+
+def content_hash(text):
+    """
+    Compute the hash used to key the tokens of a document text in the token store.
+
+    Parameters:
+    - text (str): The text of the document.
+
+    Returns:
+    - str: Hexadecimal digest of the text.
+    """
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _write_json_atomically(path, content):
+    """
+    Write JSON content to a temporary file and move it over the target so readers never see a partial file.
+
+    Parameters:
+    - path (Path): Path of the file to write.
+    - content (dict or list): JSON content to write.
+    """
+    temporary_path = path.with_name(path.name + '.tmp')
+    with open(temporary_path, 'w', encoding='utf-8') as json_file:
+        json.dump(content, json_file, ensure_ascii=False)
+    os.replace(temporary_path, path)
+
+
+class TokenStore:
+    """
+    Persistent store holding the tokens of every document of the corpus collection.
+
+    Each document is kept once as a contiguous run of int32 token ids inside a memory-mapped file. A vocabulary
+    shared by all the documents maps ids back to tokens and an index keeps, for every document, the hash of the
+    text it was built from together with its offset and length in the tokens file. Documents are only tokenized
+    again when the hash of their text changes.
+
+    The Streamlit process and the job worker both write the store, so writers hold a lock on its directory from
+    reloading the latest version until the new one is saved. Readers hold it too while they load the index and map
+    the tokens file, so the offsets they read always belong to the file they map. A compacted tokens file replaces
+    the previous one, which stays mapped by the processes that loaded an older index.
+    """
+
+    TOKENS_FILE_NAME = 'tokens.i32'
+    VOCABULARY_FILE_NAME = 'vocabulary.json'
+    INDEX_FILE_NAME = 'index.json'
+
+    def __init__(self, directory=config.TOKEN_STORE_DIR):
+        self.directory = directory
+        self.tokens_path = directory / self.TOKENS_FILE_NAME
+        self.vocabulary_path = directory / self.VOCABULARY_FILE_NAME
+        self.index_path = directory / self.INDEX_FILE_NAME
+
+        self.lock = threading.RLock()
+        self.file_lock = file_lock.FileLock(directory)
+
+        self.vocabulary = []
+        self.term_ids = {}
+        self.documents = {}
+        self.hashes = {}
+        self.size = 0
+        self.generation = 0
+
+        self._token_ids = np.empty(0, dtype=np.int32)
+        self._index_version = None
+
+        self.load()
+
+    def load(self):
+        """
+        Load the vocabulary and the documents index from disk if the store has already been built.
+        """
+        with self.lock:
+            if not self.index_path.is_file() or self._version(self.index_path.stat()) == self._index_version:
+                return
+
+            with self.file_lock:
+                if not self.index_path.is_file():
+                    return
+                index_version = self._version(self.index_path.stat())
+
+                with open(self.index_path, 'r', encoding='utf-8') as index_file:
+                    index = json.load(index_file)
+                with open(self.vocabulary_path, 'r', encoding='utf-8') as vocabulary_file:
+                    vocabulary = json.load(vocabulary_file)
+
+                # A store built with a different tokenizer can't be reused
+                if index.get('tokenizer') != TOKENIZER_NAME:
+                    return
+
+                self.vocabulary = vocabulary
+                self.term_ids = {term: term_id for term_id, term in enumerate(vocabulary)}
+                self.documents = index['documents']
+                self.hashes = {entry['hash']: document_id for document_id, entry in self.documents.items()}
+                self.size = index['size']
+                self.generation = index.get('generation', 0)
+                self._map_tokens()
+                self._index_version = index_version
+
+    @staticmethod
+    def _version(index_stat):
+        # The index is replaced by every save, so its inode and modification time identify the version
+        return index_stat.st_ino, index_stat.st_mtime_ns
+
+    def refresh(self):
+        """
+        Reload the store if another process has written a newer version of it.
+        """
+        self.load()
+
+    def _map_tokens(self):
+        # Called with the file lock held, right after the offsets of the documents were read or written
+        if self.size == 0:
+            self._token_ids = np.empty(0, dtype=np.int32)
+        else:
+            self._token_ids = np.memmap(self.tokens_path, dtype=np.int32, mode='r', shape=(self.size,))
+
+    @property
+    def token_ids(self):
+        """
+        Memory-mapped array with the token ids of all the documents.
+        """
+        with self.lock:
+            return self._token_ids
+
+    def __contains__(self, document_id):
+        return str(document_id) in self.documents
+
+    def __len__(self):
+        return len(self.documents)
+
+    def document_ids(self):
+        """
+        Returns:
+        - list: IDs of the documents held in the store.
+        """
+        return list(self.documents.keys())
+
+    def document_length(self, document_id):
+        """
+        Parameters:
+        - document_id (str): The ID of the document.
+
+        Returns:
+        - int: Number of tokens of the document.
+        """
+        return self.documents[str(document_id)]['length']
+
+    def is_current(self, document_id, text):
+        """
+        Check if the store holds the tokens of the given text for a document.
+
+        Parameters:
+        - document_id (str): The ID of the document.
+        - text (str): Current text of the document.
+
+        Returns:
+        - bool: True if the stored tokens were built from the same text.
+        """
+        entry = self.documents.get(str(document_id))
+        return entry is not None and entry['hash'] == content_hash(text)
+
+    def get_ids(self, document_id, start=0, end=None):
+        """
+        Get the token ids of a document, or of a slice of it, without copying them from the memory-mapped file.
+
+        Parameters:
+        - document_id (str): The ID of the document.
+        - start (int): Index of the first token of the slice.
+        - end (int, optional): Index after the last token of the slice. Defaults to the end of the document.
+
+        Returns:
+        - numpy.ndarray: Array of int32 token ids.
+        """
+        entry = self.documents[str(document_id)]
+        length = entry['length']
+        end = length if end is None else min(end, length)
+        start = max(0, min(start, end))
+        return self.token_ids[entry['offset'] + start:entry['offset'] + end]
+
+    def get_tokens(self, document_id, start=0, end=None):
+        """
+        Get the tokens of a document, or of a slice of it.
+
+        Parameters:
+        - document_id (str): The ID of the document.
+        - start (int): Index of the first token of the slice.
+        - end (int, optional): Index after the last token of the slice. Defaults to the end of the document.
+
+        Returns:
+        - list: List of tokens.
+        """
+        return self.decode(self.get_ids(document_id, start, end))
+
+    def lookup(self, text):
+        """
+        Get the tokens of a text if a document with exactly the same text is held in the store.
+
+        Parameters:
+        - text (str): The text to look up.
+
+        Returns:
+        - list or None: List of tokens, or None if the text is not in the store.
+        """
+        document_id = self.hashes.get(content_hash(text))
+        if document_id is None:
+            return None
+        return self.get_tokens(document_id)
+
+    def decode(self, token_ids):
+        """
+        Parameters:
+        - token_ids (iterable): Token ids.
+
+        Returns:
+        - list: The tokens for the given ids.
+        """
+        vocabulary = self.vocabulary
+        return [vocabulary[token_id] for token_id in np.asarray(token_ids).tolist()]
+
+    def encode(self, tokens, add=True):
+        """
+        Map tokens to their ids in the shared vocabulary.
+
+        Parameters:
+        - tokens (list): List of tokens.
+        - add (bool): Add unknown tokens to the vocabulary. If False unknown tokens are mapped to -1.
+
+        Returns:
+        - numpy.ndarray: Array of int32 token ids.
+        """
+        term_ids = self.term_ids
+        if add:
+            vocabulary = self.vocabulary
+            token_ids = []
+            for token in tokens:
+                token_id = term_ids.get(token)
+                if token_id is None:
+                    token_id = len(vocabulary)
+                    term_ids[token] = token_id
+                    vocabulary.append(token)
+                token_ids.append(token_id)
+        else:
+            token_ids = [term_ids.get(token, -1) for token in tokens]
+        return np.asarray(token_ids, dtype=np.int32)
+
+    def sync(self, documents, remove_missing=False):
+        """
+        Tokenize and store the documents whose text changed since the store was last built.
+
+        Parameters:
+        - documents (iterable): Documents with '_id' and 'text' fields.
+        - remove_missing (bool): Remove from the store the documents that were not given.
+
+        Returns:
+        - list: IDs of the documents that were (re)tokenized.
+        """
+        with self.lock, self.file_lock:
+            self.refresh()
+
+            changed = {}
+            seen = set()
+            for document in documents:
+                document_id = str(document['_id'])
+                text = document.get('text')
+                if text is None:
+                    continue
+                seen.add(document_id)
+                text_hash = content_hash(text)
+                entry = self.documents.get(document_id)
+                if entry is None or entry['hash'] != text_hash:
+                    changed[document_id] = (text_hash, text)
+
+            removed = [document_id for document_id in self.documents if document_id not in seen] \
+                if remove_missing else []
+
+            if not changed and not removed:
+                return []
+
+            for document_id in removed:
+                del self.documents[document_id]
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.tokens_path, 'ab') as tokens_file:
+                # Drop anything written after the last committed size by an interrupted sync
+                tokens_file.truncate(self.size * np.dtype(np.int32).itemsize)
+                for document_id, tokens in self._tokenize_documents(changed):
+                    token_ids = self.encode(tokens)
+                    tokens_file.write(token_ids.tobytes())
+                    self.documents[document_id] = {'hash': changed[document_id][0], 'offset': self.size,
+                                                   'length': len(token_ids)}
+                    self.size += len(token_ids)
+
+            self.hashes = {entry['hash']: document_id for document_id, entry in self.documents.items()}
+            self._map_tokens()
+
+            live_tokens = sum(entry['length'] for entry in self.documents.values())
+            if self.size > 2 * live_tokens:
+                self.compact()
+            else:
+                self.save()
+
+            return list(changed.keys())
+
+    def sync_with_corpus(self, document_ids=None):
+        """
+        Bring the store up to date with the corpus collection in MongoDB.
+
+        Parameters:
+        - document_ids (list, optional): Only check these documents. Defaults to the whole collection, in which
+                                         case documents that no longer exist are removed from the store.
+
+        Returns:
+        - list: IDs of the documents that were (re)tokenized.
+        """
+        documents_collection = db.corpus_collection()
+
+        query = {'_id': {'$in': list(document_ids)}} if document_ids is not None else {}
+        documents = documents_collection.find(query, {'_id': 1, 'text': 1})
+        return self.sync(documents, remove_missing=document_ids is None)
+
+    def sync_missing_from_corpus(self):
+        """
+        Add to the store the documents of the corpus collection it doesn't hold yet. Documents already in the store
+        are kept in step by the operations that change their text.
+
+        Returns:
+        - list: IDs of the documents that were tokenized.
+        """
+        documents_collection = db.corpus_collection()
+
+        missing_ids = [document['_id'] for document in documents_collection.find({}, {'_id': 1})
+                       if str(document['_id']) not in self.documents]
+        if not missing_ids:
+            return []
+        return self.sync_with_corpus(missing_ids)
+
+    def compact(self):
+        """
+        Rewrite the tokens file keeping only the tokens of the current version of every document.
+        """
+        with self.lock, self.file_lock:
+            self.refresh()
+            token_ids = self.token_ids
+            temporary_path = self.tokens_path.with_name(self.tokens_path.name + '.tmp')
+            offset = 0
+            with open(temporary_path, 'wb') as tokens_file:
+                for entry in self.documents.values():
+                    tokens_file.write(np.asarray(token_ids[entry['offset']:entry['offset'] + entry['length']])
+                                      .tobytes())
+                    entry['offset'] = offset
+                    offset += entry['length']
+            os.replace(temporary_path, self.tokens_path)
+            self.size = offset
+            self._map_tokens()
+            self.save()
+
+    def save(self):
+        """
+        Write the vocabulary and the documents index to disk.
+        """
+        with self.lock, self.file_lock:
+            self.generation += 1
+            _write_json_atomically(self.vocabulary_path, self.vocabulary)
+            _write_json_atomically(self.index_path, {'tokenizer': TOKENIZER_NAME,
+                                                     'generation': self.generation,
+                                                     'size': self.size,
+                                                     'documents': self.documents})
+            self._index_version = self._version(self.index_path.stat())
+
+    @staticmethod
+    def _tokenize_documents(changed):
+        """
+        Tokenize the changed documents, in parallel when there are several of them.
+
+        Parameters:
+        - changed (dict): Mapping of document IDs to (hash, text) tuples.
+
+        Returns:
+        - iterator: (document ID, tokens) tuples.
+        """
+        if len(changed) <= 1:
+            for document_id, (_, text) in changed.items():
+                yield document_id, tokenizers.tokenize(text)
+            return
+
+        document_ids = list(changed.keys())
+        texts = (changed[document_id][1] for document_id in document_ids)
+        yield from zip(document_ids, worker_pool.get_worker_pool().map(tokenizers.tokenize, texts, chunksize=4))
+
+
+_token_store = None
+_token_store_lock = threading.Lock()
+
+
+def get_token_store():
+    """
+    Get the token store of this process, opening it the first time it is needed.
+
+    Returns:
+    - TokenStore: The token store.
+    """
+    global _token_store
+    with _token_store_lock:
+        if _token_store is None:
+            _token_store = TokenStore()
+        else:
+            _token_store.refresh()
+        return _token_store
@@ -0,0 +1,172 @@
+import re
+import threading
+
+import nltk
+
+import src.config as config
+
+# Joins the sentences of a text for the regex tokenizer, a private use character that isn't a word character nor
+# whitespace, so the rules anchored to the start or the end of a sentence can see where sentences meet
+SENTENCE_BOUNDARY = '\ue000'
+
+# Contractions split by the word tokenizer of NLTK
+_CONTRACTIONS = [r"\b(can)(not)\b", r"\b(d)('ye)\b", r"\b(gim)(me)\b", r"\b(gon)(na)\b", r"\b(got)(ta)\b",
+                 r"\b(lem)(me)\b", r"\b(more)('n)\b", r"\b(wan)(na)(?=\s)", r" ('t)(is)\b", r" ('t)(was)\b"]
+
+
+class NLTKTokenizer:
+    """
+    The word tokenizer of NLTK for Spanish: Punkt splits the text into sentences and every sentence is tokenized
+    with the improved Treebank tokenizer.
+    """
+
+    name = 'nltk_word_tokenize_spanish'
+
+    def __init__(self, language='spanish'):
+        self.language = language
+
+    def tokenize(self, text):
+        """
+        Parameters:
+        - text (str): Input text.
+
+        Returns:
+        - list: List of tokens.
+        """
+        return nltk.word_tokenize(text, language=self.language)
+
+
+class RegexTokenizer:
+    """
+    Gives the same tokens as NLTKTokenizer, applying the rules of the Treebank tokenizer of NLTK once to the whole
+    text instead of once per sentence.
+
+    Most of the time of nltk.word_tokenize goes into the thirty or so regular expressions run over every sentence,
+    not into the sentence splitting, so the sentences are still found by Punkt and joined with SENTENCE_BOUNDARY.
+    The rules anchored to the start or the end of a sentence match next to the boundaries instead, the others can't
+    match across them, so every sentence gets the same tokens as on its own. Rules are also skipped when the text
+    doesn't contain the characters they replace, which leaves out most of them for Spanish texts, like the English
+    contractions.
+
+    The rules are the ones of NLTKWordTokenizer in nltk 3.8. Texts containing SENTENCE_BOUNDARY are tokenized by
+    NLTK itself.
+    """
+
+    name = 'regex_word_tokenize_spanish'
+
+    def __init__(self, language='spanish'):
+        self.language = language
+        boundary = SENTENCE_BOUNDARY
+        sentence_end = rf'(?={boundary}|\Z)'
+        # Regular expression, replacement and the strings one of which must be in the text for the rule to apply. The
+        # rules start with the characters they replace and look behind them, which is faster than matching the
+        # character before them as NLTK does but gives the same result.
+        self.starting_quotes = [
+            (re.compile(r'([«“‘„]|[`]+)'), r' \1 ', ('«', '“', '‘', '„', '`')),
+            (re.compile(boundary + '"'), boundary + '``', ('"',)),
+            (re.compile(r'(``)'), r' \1 ', ('``',)),
+            (re.compile(r'"(?<=[ \(\[{<]")|\'\'(?<=[ \(\[{<]\'\')'), r' `` ', ('"', "''")),
+            (re.compile(r"(?i)(?<!\w)(\')(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)"), r'\1 ', ("'",)),
+        ]
+        self.punctuation = [
+            (re.compile(rf'\.(?<=[^\.{boundary}]\.)([\]\)}}>"\'»”’ ]*)\s*' + sentence_end), r' . \1 ', ('.',)),
+            (re.compile(r'([:,])([^\d])'), r' \1 \2', (':', ',')),
+            (re.compile(r'([:,])' + sentence_end), r' \1 ', (':', ',')),
+            (re.compile(r'\.{2,}'), r' \g<0> ', ('..',)),
+            (re.compile(r'[;@#$%&]'), r' \g<0> ', (';', '@', '#', '$', '%', '&')),
+            (re.compile(r'[\u2012-\u2015]'), r' \g<0> ', ('\u2012', '\u2013', '\u2014', '\u2015')),
+            (re.compile(rf'\.(?<=[^\.{boundary}]\.)([\]\)}}>"\']*)\s*' + sentence_end), r' .\1 ', ('.',)),
+            (re.compile(r'[?!]'), r' \g<0> ', ('?', '!')),
+            (re.compile(rf"([^'{boundary}])' "), r"\1 ' ", ("' ",)),
+            (re.compile(r'[*]'), r' \g<0> ', ('*',)),
+            (re.compile(r'[\]\[\(\)\{\}\<\>]'), r' \g<0> ', ('[', ']', '(', ')', '{', '}', '<', '>')),
+            (re.compile(r'--'), r' -- ', ('--',)),
+        ]
+        self.ending_quotes = [
+            (re.compile(r'([»”’])'), r' \1 ', ('»', '”', '’')),
+            (re.compile(r"''"), r" '' ", ("''",)),
+            (re.compile(r'"'), r" '' ", ('"',)),
+        ]
+        self.whitespace = re.compile(r'\s+')
+        self.ending_contractions = [
+            (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r'\1 \2 ', ("'",)),
+            (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r'\1 \2 ', ("'",)),
+        ]
+        self.contractions = [re.compile(contraction, re.IGNORECASE) for contraction in _CONTRACTIONS]
+        self.any_contraction = re.compile(r"cannot|d'ye|gimme|gonna|gotta|lemme|more'n|wanna|'tis|'twas",
+                                          re.IGNORECASE)
+
+    @staticmethod
+    def _apply(rules, text):
+        for regexp, substitution, triggers in rules:
+            if any(trigger in text for trigger in triggers):
+                text = regexp.sub(substitution, text)
+        return text
+
+    def tokenize(self, text):
+        """
+        Parameters:
+        - text (str): Input text.
+
+        Returns:
+        - list: List of tokens, the same as NLTKTokenizer.
+        """
+        if SENTENCE_BOUNDARY in text:
+            return nltk.word_tokenize(text, language=self.language)
+        # The text starts with a sentence too
+        text = SENTENCE_BOUNDARY + SENTENCE_BOUNDARY.join(nltk.sent_tokenize(text, language=self.language))
+
+        text = self._apply(self.starting_quotes, text)
+        text = self._apply(self.punctuation, text)
+        # Every sentence was padded with spaces
+        text = ' ' + text.replace(SENTENCE_BOUNDARY, ' ') + ' '
+        text = self._apply(self.ending_quotes, text)
+
+        # Only the rules of the apostrophes expect single spaces between the tokens, the split doesn't need them
+        if "'" in text:
+            text = self.whitespace.sub(' ', text)
+            text = self._apply(self.ending_contractions, text)
+        if self.any_contraction.search(text):
+            for regexp in self.contractions:
+                text = regexp.sub(r' \1 \2 ', text)
+        return text.split()
+
+
+# Tokenizer backends, by the name used in config.tokenizer_backend
+TOKENIZERS = {
+    'nltk': NLTKTokenizer,
+    'regex': RegexTokenizer,
+}
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """
+    Get the tokenizer of config.tokenizer_backend, creating it the first time it is requested.
+
+    Returns:
+    - NLTKTokenizer or RegexTokenizer: The tokenizer.
+    """
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            if config.tokenizer_backend not in TOKENIZERS:
+                raise ValueError(f"Unknown tokenizer backend {config.tokenizer_backend}.")
+            _tokenizer = TOKENIZERS[config.tokenizer_backend]()
+        return _tokenizer
+
+
+def tokenize(text):
+    """
+    Tokenize the input text with the tokenizer of config.tokenizer_backend, which gives the tokens of NLTK's
+    word_tokenize for the Spanish language.
+
+    Parameters:
+    - text (str): Input text.
+
+    Returns:
+    - list: List of tokens.
+    """
+    return get_tokenizer().tokenize(text)
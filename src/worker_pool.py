@@ -0,0 +1,189 @@
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import src.config as config
+import src.corrections_overlay as corrections_overlay
+import src.db as db
+import src.spanish_stopwords as spanish_stopwords
+import src.tokenizers as tokenizers
+
+
+def load_saved_corrections():
+    """
+    Returns:
+    - dict: The corrections saved in MongoDB, mapping original terms to corrected terms.
+    """
+    return {entry['Original term']: entry['Correct term']
+            for entry in db.corrections_collection().find({}, {'_id': 0, 'Original term': 1, 'Correct term': 1})}
+
+
+# Corrections of the worker process, with their version, set by the initializer of the pool
+_worker_corrections = (None, {})
+
+
+def init_worker(statistics_queue):
+    """
+    Initializer of the worker processes. The tokenizer, the stopwords and the saved corrections are loaded once per
+    process, and the time taken to start the process and to load them is reported to the pool.
+
+    Parameters:
+    - statistics_queue (multiprocessing.Queue): Queue the startup statistics are reported to.
+    """
+    global _worker_corrections
+    # CPU time used by the process so far, to start and import the modules
+    startup_seconds = time.process_time()
+
+    start_time = time.perf_counter()
+    tokenizers.tokenize("Carga del tokenizador.")
+    spanish_stopwords.StopWords().get_stopwords()
+    corrections_dict = load_saved_corrections()
+    _worker_corrections = (corrections_overlay.corrections_version(corrections_dict), corrections_dict)
+    preload_seconds = time.perf_counter() - start_time
+
+    statistics_queue.put({'pid': os.getpid(), 'startup_seconds': startup_seconds, 'preload_seconds': preload_seconds})
+
+
+def worker_corrections(version, corrections_dict=None):
+    """
+    Get the corrections of a version in a worker process. The saved corrections are read again when they changed
+    since the process loaded them, and other corrections are sent with the task.
+
+    Parameters:
+    - version (str): Version of the corrections, as returned by corrections_overlay.corrections_version.
+    - corrections_dict (dict, optional): The corrections, if they aren't the saved ones.
+
+    Returns:
+    - dict: The corrections, mapping original terms to corrected terms.
+    """
+    global _worker_corrections
+    if corrections_dict is not None:
+        _worker_corrections = (version, corrections_dict)
+    elif _worker_corrections[0] != version:
+        saved_corrections = load_saved_corrections()
+        saved_version = corrections_overlay.corrections_version(saved_corrections)
+        if saved_version != version:
+            raise LookupError(f"The saved corrections changed while corrections {version} were being applied.")
+        _worker_corrections = (saved_version, saved_corrections)
+    return _worker_corrections[1]
+
+
+class WorkerPool:
+    """
+    A pool of processes shared by all the corpus operations of the server, started the first time it is used.
+
+    The processes are kept between operations, so the cost of starting them and loading the tokenizer, stopwords
+    and corrections is only paid once instead of by every operation, and processes can be recycled after a number
+    of tasks to bound the memory they use. The startup and preload times reported by the processes are kept apart
+    from the time of the tasks.
+    """
+
+    def __init__(self, max_workers=None, max_tasks_per_child=None, start_method=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_tasks_per_child = max_tasks_per_child
+        # Processes recycled after some tasks can't be created with fork
+        if start_method is None and max_tasks_per_child is not None:
+            start_method = 'spawn'
+        self.context = multiprocessing.get_context(start_method)
+        self.statistics_queue = self.context.Queue()
+        self.startup_statistics = []
+        self.lock = threading.Lock()
+        self._executor = None
+
+    def executor(self):
+        """
+        Returns:
+        - concurrent.futures.ProcessPoolExecutor: The executor of the pool, started again if a process died.
+        """
+        with self.lock:
+            # An executor whose process died can't run tasks anymore
+            if self._executor is None or getattr(self._executor, '_broken', False):
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=self.context, initializer=init_worker,
+                    initargs=(self.statistics_queue,), max_tasks_per_child=self.max_tasks_per_child)
+            return self._executor
+
+    def submit(self, function, *args):
+        """
+        Parameters:
+        - function (callable): Function to run in a worker process, importable from it.
+        - args: Arguments of the function.
+
+        Returns:
+        - concurrent.futures.Future: The future of the result.
+        """
+        return self.executor().submit(function, *args)
+
+    def map(self, function, iterable, chunksize=1):
+        """
+        Parameters:
+        - function (callable): Function to run in the worker processes, importable from them.
+        - iterable (iterable): Arguments of every call.
+        - chunksize (int): Number of calls sent to a process at once.
+
+        Returns:
+        - iterator: The results, in order.
+        """
+        return self.executor().map(function, iterable, chunksize=chunksize)
+
+    def warm_up(self):
+        """
+        Start every process of the pool and wait until they have loaded everything.
+
+        Returns:
+        - float: Seconds it took.
+        """
+        start_time = time.perf_counter()
+        futures = [self.submit(os.getpid) for _ in range(self.max_workers)]
+        concurrent.futures.wait(futures)
+        while self.statistics()['processes'] < self.max_workers and \
+                time.perf_counter() - start_time < config.worker_pool_warm_up_timeout_seconds:
+            time.sleep(0.01)
+        return time.perf_counter() - start_time
+
+    def statistics(self):
+        """
+        Returns:
+        - dict: The number of 'processes' started, with the total CPU 'startup_seconds' they took to start and
+                import the modules and the total 'preload_seconds' they took to load the tokenizer, stopwords and
+                corrections.
+        """
+        while True:
+            try:
+                self.startup_statistics.append(self.statistics_queue.get_nowait())
+            except queue.Empty:
+                break
+        return {'processes': len(self.startup_statistics),
+                'startup_seconds': sum(statistics['startup_seconds'] for statistics in self.startup_statistics),
+                'preload_seconds': sum(statistics['preload_seconds'] for statistics in self.startup_statistics)}
+
+    def shutdown(self):
+        with self.lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """
+    Get the worker pool of this process, creating it the first time it is requested. The processes are only started
+    when the first task is submitted.
+
+    Returns:
+    - WorkerPool: The shared worker pool.
+    """
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = WorkerPool(config.worker_pool_size, config.worker_pool_max_tasks_per_child,
+                                      config.worker_pool_start_method)
+        return _worker_pool
@@ -0,0 +1,60 @@
+import pytest
+
+import src.data_utils as data_utils
+import src.sequence_matcher as sequence_matcher
+
+TERMS = ['agua', 'Agua', 'AGUA', 'aguas', 'paraguas', 'el-agua', 'agua-', '-agua', 'agua_', '_agua', 'agua1',
+         'año', 'años', 'Año', 'niño', 'niñez', 'él', 'aél', 'canción', 'cancion', 'Canción', 'a-b', 'xa-by', '-',
+         '--', '', '"', "'", '``', "''", '"agua"', "'agua'", '123', '_x', 'a_x', 'x', '.', 'á']
+
+SEQUENCES = [
+    [],
+    [''],
+    ['"'],
+    ["'"],
+    ['""'],
+    ['"', "'", 'agua'],
+    ['agua'],
+    ['"agua"'],
+    ['"agua"', 'agua'],
+    ['"año"', 'niñ'],
+    ['"él"'],
+    ['"ción"', 'ción'],
+    ['"a-b"'],
+    ['"-"'],
+    ['"-agua"', '"agua-"'],
+    ['"agua', 'agua"'],
+    ['"_x"', '"x"'],
+    ['"1"', '"agua1"'],
+    ['"á"', 'á'],
+]
+
+
+@pytest.mark.parametrize('sequences', SEQUENCES, ids=repr)
+def test_matcher_follows_the_reference_rules(sequences):
+    matcher = sequence_matcher.SequencesMatcher(sequences)
+    unmemoized = sequence_matcher.SequencesMatcher(sequences, max_cache_size=0)
+    for term in TERMS:
+        expected = data_utils.term_matches_sequences(term, sequences)
+        assert unmemoized._match(term) == expected, term
+        # The memoized result is the same the first and the second time
+        assert matcher(term) == expected, term
+        assert matcher(term) == expected, term
+
+
+def test_cache_is_bounded():
+    matcher = sequence_matcher.SequencesMatcher(['agua'], max_cache_size=2)
+    for term in TERMS:
+        matcher(term)
+    assert len(matcher.cache) <= 2
+
+
+@pytest.mark.parametrize('patterns, text, expected', [
+    (['he', 'she', 'his', 'hers'], 'ushers', [(1, 4, 1), (2, 4, 0), (2, 6, 3)]),
+    (['a', 'aa'], 'aaa', [(0, 1, 0), (1, 2, 0), (0, 2, 1), (2, 3, 0), (1, 3, 1)]),
+    (['ñ', 'añ'], 'año', [(1, 2, 0), (0, 2, 1)]),
+    (['agua'], 'fuego', []),
+])
+def test_aho_corasick_finds_every_occurrence(patterns, text, expected):
+    matches = list(sequence_matcher.AhoCorasick(patterns).iter_matches(text))
+    assert sorted(matches) == sorted(expected)
@@ -0,0 +1,59 @@
+import pytest
+from nltk.tokenize import NLTKWordTokenizer
+
+import src.benchmarks as benchmarks
+import src.spanish_stopwords as spanish_stopwords
+import src.text_normalization as text_normalization
+import src.tokenizers as tokenizers
+
+# Fixed stopwords, so the tests don't need the corpora of NLTK. 'mas' is only a stopword once its accent is removed
+STOP_WORDS = {'el', 'la', 'de', 'del', 'que', 'y', 'en', 'los', 'las', 'un', 'una', 'mas', 'asi', 'pag', 'num'}
+
+TEXTS = [
+    '',
+    'El agua del río',
+    'Canción del Niño y la NIÑA',
+    'más allá, así es',
+    'agua-fuego el-río de-la-mar',
+    'pág. 12, núm. 3 del tomo IV',
+    '«hola» "adiós" (paréntesis) [corchetes]',
+    "d'agua l'eau",
+    'señor-ñandú Ñoño',
+    'a1b2c3 123 año2024',
+    '½ kg de ﬁn œuvre',
+    'ÉL ÁRBOL Órgano Úrsula',
+    'mañana--tarde...noche',
+    'mas-allá así-asá',
+    'casa½grande el¼río',
+]
+
+
+@pytest.fixture
+def stop_words(monkeypatch):
+    # The Treebank word tokenizer doesn't need the Punkt models to split the sentences
+    monkeypatch.setattr(tokenizers, 'tokenize', NLTKWordTokenizer().tokenize)
+    stop_words = spanish_stopwords.StopWords()
+    stop_words.stop_words = set(STOP_WORDS)
+    return stop_words
+
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_normalizer_gives_the_words_of_cleaning_the_whole_text(stop_words, text):
+    normalizer = text_normalization.TextNormalizer(stop_words.get_stopwords())
+    expected = benchmarks.clean_tokenize_neighborhood_per_text(text, stop_words)
+    assert normalizer.normalize(text) == expected
+    # The second time the tokens come from the memo table
+    assert normalizer.normalize(text) == expected
+
+
+def test_normalize_many_shares_the_memo_table(stop_words):
+    normalizer = text_normalization.TextNormalizer(stop_words.get_stopwords())
+    expected = [benchmarks.clean_tokenize_neighborhood_per_text(text, stop_words) for text in TEXTS]
+    assert normalizer.normalize_many(TEXTS) == expected
+    assert normalizer.normalize_many(TEXTS) == expected
+
+
+def test_cache_is_bounded(stop_words):
+    normalizer = text_normalization.TextNormalizer(stop_words.get_stopwords(), max_cache_size=3)
+    normalizer.normalize_many(TEXTS)
+    assert len(normalizer.cache) <= 3